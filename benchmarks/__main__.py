@@ -0,0 +1,126 @@
+"""Run the benchmark suites and write their results as JSON.
+
+Run from the repository root::
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --quick --compare previous.json
+
+Every suite exposes ``main`` returning a dict of results. The JSON file
+records the commit, Python and platform next to them so results of
+different releases can be compared with ``--compare``.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import (
+    bench_controller,
+    bench_storage_layout,
+    bench_track_encoding,
+    bench_wire_payload,
+)
+
+SUITES = {
+    "controller": lambda args: bench_controller.main(args.rows, args.seed),
+    "storage_layout": lambda args: bench_storage_layout.main(args.layout_rows),
+    "track_encoding": lambda args: bench_track_encoding.main(seed=args.seed),
+    "wire_payload": lambda args: bench_wire_payload.main(),
+}
+QUICK_ROWS = (1000, 10_000)
+QUICK_LAYOUT_ROWS = 2000
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous: dict, current: dict) -> None:
+    """Print how throughput and latency figures changed since ``previous``."""
+    before = _flatten(previous["results"])
+    after = _flatten(current["results"])
+    print(f"\nCompared with {previous['meta'].get('commit', 'unknown')}:")
+    for name, value in after.items():
+        old = before.get(name)
+        if not old or not name.endswith(("per_second", "seconds")):
+            continue
+        change = (value - old) / old * 100
+        # Higher is better for rates, lower is better for durations
+        better = change > 0 if name.endswith("per_second") else change < 0
+        print(f"{name:>70}: {change:+7.1f}% {'better' if better else 'worse'}")
+
+
+def main(argv=None) -> dict:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks")
+    ap.add_argument("--output", help="Write the results to this JSON file")
+    ap.add_argument("--compare", help="Earlier results JSON file to compare against")
+    ap.add_argument(
+        "--suite",
+        action="append",
+        choices=sorted(SUITES),
+        help="Suite to run, can be repeated; all suites by default",
+    )
+    ap.add_argument(
+        "--rows",
+        type=bench_controller.parse_rows,
+        help="Table sizes get_telemetry is measured at, comma separated",
+        default=bench_controller.QUERY_ROWS,
+    )
+    ap.add_argument("--layout_rows", type=int, default=bench_storage_layout.ROWS)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--quick", action="store_true", help="Use small table sizes")
+    args = ap.parse_args(argv)
+    if args.quick:
+        args.rows = QUICK_ROWS
+        args.layout_rows = QUICK_LAYOUT_ROWS
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "rows": list(args.rows),
+            "layout_rows": args.layout_rows,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    for name in args.suite or sorted(SUITES):
+        print(f"== {name}")
+        report["results"][name] = SUITES[name](args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True))
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Throughput and latency of the telemetry controller's hot paths.
+
+Measures ``_deserialize_telemeter`` / ``_serialize_telemeter`` throughput,
+``save_telemetry`` inserts per second, ``get_telemetry`` latency at several
+table sizes (and of reading every row as ``iter_records``) and the time ``handle_command`` takes to build a response.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_controller --rows 10000,1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import timeit
+from datetime import timedelta
+from types import SimpleNamespace
+
+import RNS
+
+from benchmarks.generator import SidebandGenerator
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+CODEC_ROWS = 5000
+SAVE_ROWS = 2000
+QUERY_ROWS = (10_000, 1_000_000)
+# Loading every row is only measured up to this size
+FULL_SCAN_LIMIT = 100_000
+LOAD_BATCH = 5000
+
+
+def _rate(count: int, seconds: float) -> dict:
+    return {"count": count, "seconds": seconds, "per_second": count / seconds}
+
+
+def bench_codec(generator: SidebandGenerator, rows: int = CODEC_ROWS) -> dict:
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    records = list(generator.records(rows))
+
+    def deserialize():
+        return [
+            controller._deserialize_telemeter(record.tel_data, record.peer_dest, record.packed)
+            for record in records
+        ]
+
+    tels = deserialize()
+
+    def serialize():
+        for tel in tels:
+            controller._serialize_telemeter(tel)
+
+    return {
+        "deserialize": _rate(rows, min(timeit.repeat(deserialize, number=1, repeat=3))),
+        "serialize": _rate(rows, min(timeit.repeat(serialize, number=1, repeat=3))),
+    }
+
+
+def bench_save(generator: SidebandGenerator, tmp: str, rows: int = SAVE_ROWS) -> dict:
+    results = {}
+    for name, batch_ingest in (("direct", False), ("batched", True)):
+        controller = TelemetryController(
+            StorageConfig(db_path=os.path.join(tmp, f"save_{name}.db"))
+        )
+        controller.storage.engine  # Open the database outside of the timing
+        if batch_ingest:
+            controller.enable_batch_ingest()
+        records = list(generator.records(rows))
+        started = time.perf_counter()
+        for record in records:
+            controller.save_telemetry(record.tel_data, record.peer_dest, record.packed)
+        controller.flush()
+        results[name] = _rate(rows, time.perf_counter() - started)
+        controller.shutdown()
+    return results
+
+
+def populate(controller: TelemetryController, generator: SidebandGenerator, rows: int) -> None:
+    """Insert ``rows`` generated telemeters in large batches."""
+    batch = []
+    for record in generator.records(rows):
+        tel = controller._deserialize_telemeter(record.tel_data, record.peer_dest, record.packed)
+        tel.time = record.time
+        batch.append(tel)
+        if len(batch) >= LOAD_BATCH:
+            controller.save_telemeters(batch)
+            batch = []
+    if batch:
+        controller.save_telemeters(batch)
+
+
+def _latency(fn, repeat: int = 5) -> dict:
+    timings = []
+    returned = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        returned = len(fn())
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {"rows": returned, "min_seconds": timings[0], "median_seconds": timings[len(timings) // 2]}
+
+
+def bench_get_telemetry(generator: SidebandGenerator, tmp: str, rows: int) -> dict:
+    controller = TelemetryController(StorageConfig(db_path=os.path.join(tmp, f"query_{rows}.db")))
+    started = time.perf_counter()
+    populate(controller, generator, rows)
+    load_seconds = time.perf_counter() - started
+
+    end = generator.start + timedelta(seconds=rows * generator.interval)
+    recent = end - timedelta(seconds=rows * generator.interval / 100)
+    peer = generator.peers[0]
+    results = {
+        "load": _rate(rows, load_seconds),
+        "recent_1pct": _latency(lambda: controller.get_telemetry(start_time=recent)),
+        "one_peer_recent_1pct": _latency(
+            lambda: controller.get_telemetry(start_time=recent, peer_dest=peer)
+        ),
+    }
+    if rows <= FULL_SCAN_LIMIT:
+        results["all"] = _latency(controller.get_telemetry, repeat=3)
+        results["all_records"] = _latency(lambda: list(controller.iter_records()), repeat=3)
+    controller.shutdown()
+    return results
+
+
+def bench_handle_command(generator: SidebandGenerator, rows: int = SAVE_ROWS) -> dict:
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    command = {TelemetryController.TELEMETRY_REQUEST: int(generator.start.timestamp())}
+    results = {}
+    for name, chunk_bytes in (("single", None), ("chunked_16k", 16 * 1024)):
+        controller = TelemetryController(
+            StorageConfig(db_path=":memory:"), stream_chunk_bytes=chunk_bytes
+        )
+        populate(controller, generator, rows)
+        seconds = min(
+            timeit.repeat(
+                lambda: controller.handle_command(command, requester, hub_dest),
+                number=1,
+                repeat=5,
+            )
+        )
+        messages = controller.handle_command(command, requester, hub_dest)
+        results[name] = {"rows": rows, "messages": len(messages), "seconds": seconds}
+        controller.shutdown()
+    return results
+
+
+def main(query_rows=QUERY_ROWS, seed: int = 0) -> dict:
+    results = {
+        "codec": bench_codec(SidebandGenerator(seed)),
+        "handle_command": bench_handle_command(SidebandGenerator(seed)),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        results["save_telemetry"] = bench_save(SidebandGenerator(seed), tmp)
+        results["get_telemetry"] = {
+            str(rows): bench_get_telemetry(SidebandGenerator(seed), tmp, rows)
+            for rows in query_rows
+        }
+
+    codec = results["codec"]
+    print(f"deserialize: {codec['deserialize']['per_second']:10.0f} telemeters/s")
+    print(f"  serialize: {codec['serialize']['per_second']:10.0f} telemeters/s")
+    for name, result in results["save_telemetry"].items():
+        print(f"save {name:>8}: {result['per_second']:10.0f} inserts/s")
+    for rows, result in results["get_telemetry"].items():
+        for name, latency in result.items():
+            if "median_seconds" in latency:
+                print(
+                    f"get_telemetry {rows:>8} rows, {name:>20}: "
+                    f"{latency['median_seconds'] * 1000:9.2f} ms ({latency['rows']} rows)"
+                )
+    for name, result in results["handle_command"].items():
+        print(
+            f"handle_command {name:>12}: {result['seconds'] * 1000:9.2f} ms "
+            f"for {result['rows']} rows in {result['messages']} messages"
+        )
+    return results
+
+
+def parse_rows(value: str) -> tuple[int, ...]:
+    return tuple(int(rows) for rows in value.split(",") if rows)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--rows",
+        type=parse_rows,
+        help="Table sizes get_telemetry is measured at, comma separated",
+        default=QUERY_ROWS,
+    )
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(args.rows, args.seed)
@@ -0,0 +1,77 @@
+"""Insert and query throughput of the joined and compact storage layouts.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_storage_layout
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.storage import LAYOUTS, StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+ROWS = 20000
+BATCH = 500
+
+
+def bench_layout(layout: str, db_path: str, rows: int = ROWS) -> dict:
+    payload = SAMPLE.read_bytes()
+    tel_data = unpackb(payload, strict_map_key=False)
+    controller = TelemetryController(StorageConfig(db_path=db_path, layout=layout))
+
+    started = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        controller.save_telemeters(
+            [
+                controller._deserialize_telemeter(tel_data, f"{i % 50:032x}", payload)
+                for i in range(offset, min(offset + BATCH, rows))
+            ]
+        )
+    insert_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    loaded = controller.get_telemetry()
+    query_seconds = time.perf_counter() - started
+    assert len(loaded) == rows
+    # Keeping the loaded sensors alive would slow the next pass down with GC
+    del loaded
+
+    # The telemetry response path, which only needs the stored payload
+    started = time.perf_counter()
+    streamed = sum(1 for _ in controller.iter_telemetry(with_sensors=False))
+    stream_seconds = time.perf_counter() - started
+    assert streamed == rows
+    controller.shutdown()
+
+    return {
+        "rows": rows,
+        "insert_rows_per_second": rows / insert_seconds,
+        "get_telemetry_rows_per_second": rows / query_seconds,
+        "stream_rows_per_second": rows / stream_seconds,
+        "db_bytes": os.path.getsize(db_path),
+    }
+
+
+def main(rows: int = ROWS) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in LAYOUTS:
+            result = bench_layout(layout, os.path.join(tmp, f"{layout}.db"), rows)
+            results[layout] = result
+            print(
+                f"{layout:>8}: insert {result['insert_rows_per_second']:10.0f} rows/s, "
+                f"get_telemetry {result['get_telemetry_rows_per_second']:10.0f} rows/s, "
+                f"stream {result['stream_rows_per_second']:10.0f} rows/s, "
+                f"{result['db_bytes'] / 1024:8.0f} KiB"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare plain telemetry stream entries with the delta encoded track format.
+
+Measures the bytes a response takes in each format and how many entries per
+second the track codec encodes and decodes. The generated peers keep the
+other sensors of the sample constant, which is the best case for the track
+format; ``noisy_sensors`` changes the acceleration of every sample so each
+entry has to carry its remaining payload.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_track_encoding
+"""
+
+import timeit
+
+from msgpack import packb
+
+from benchmarks.generator import APPEARANCE, SidebandGenerator
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_ACCELERATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.track_codec import decode_track, encode_track
+
+ENTRIES = 5000
+
+
+def _noisy_entries(generator: SidebandGenerator, count: int) -> list:
+    entries = []
+    for record in generator.records(count):
+        tel_data = dict(record.tel_data)
+        tel_data[SID_ACCELERATION] = [
+            round(generator.random.gauss(0, 0.05), 6),
+            round(generator.random.gauss(0, 0.05), 6),
+            round(generator.random.gauss(9.81, 0.05), 6),
+        ]
+        entries.append(
+            [bytes.fromhex(record.peer_dest), tel_data[SID_TIME], packb(tel_data), APPEARANCE]
+        )
+    return entries
+
+
+def _measure(entries: list) -> dict:
+    plain = len(packb(entries))
+    track = encode_track(entries)
+    encode = min(timeit.repeat(lambda: encode_track(entries), number=1, repeat=3))
+    decode = min(timeit.repeat(lambda: decode_track(track), number=1, repeat=3))
+    return {
+        "entries": len(entries),
+        "plain_bytes": plain,
+        "track_bytes": len(track),
+        "ratio": plain / len(track),
+        "encode": {"seconds": encode, "per_second": len(entries) / encode},
+        "decode": {"seconds": decode, "per_second": len(entries) / decode},
+    }
+
+
+def main(entries: int = ENTRIES, seed: int = 0) -> dict:
+    results = {
+        "static_sensors": _measure(SidebandGenerator(seed).stream_entries(entries)),
+        "noisy_sensors": _measure(_noisy_entries(SidebandGenerator(seed), entries)),
+    }
+    for name, result in results.items():
+        print(
+            f"{name:>15}: {result['plain_bytes'] / result['entries']:6.1f} -> "
+            f"{result['track_bytes'] / result['entries']:5.1f} bytes/entry "
+            f"({result['ratio']:.1f}x), encode {result['encode']['per_second']:8.0f}/s, "
+            f"decode {result['decode']['per_second']:8.0f}/s"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
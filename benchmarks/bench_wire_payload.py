@@ -0,0 +1,52 @@
+"""Compare re-serializing stored telemetry with re-emitting the stored wire payload.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_wire_payload
+"""
+
+import timeit
+from pathlib import Path
+
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+ROWS = 2000
+
+
+def main(rows: int = ROWS) -> dict:
+    payload = SAMPLE.read_bytes()
+    tel_data = unpackb(payload, strict_map_key=False)
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    controller.save_telemeters(
+        [
+            controller._deserialize_telemeter(tel_data, f"{i % 50:032x}", payload)
+            for i in range(rows)
+        ]
+    )
+    tels = controller.get_telemetry()
+
+    def reserialize():
+        for tel in tels:
+            tel.packed, packed = None, tel.packed
+            controller._stream_entry(tel)
+            tel.packed = packed
+
+    def stored_payload():
+        for tel in tels:
+            controller._stream_entry(tel)
+
+    results = {}
+    for name, fn in (("reserialize", reserialize), ("stored_payload", stored_payload)):
+        seconds = min(timeit.repeat(fn, number=1, repeat=5))
+        results[name] = {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds}
+        print(f"{name:>15}: {rows / seconds:12.0f} entries/s")
+    controller.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    main()
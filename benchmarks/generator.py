@@ -0,0 +1,96 @@
+"""Synthetic Sideband telemetry seeded from ``sample.bin``.
+
+Every record keeps the sensors of the sample. Each peer walks randomly
+around the sample location and the time and location timestamps advance,
+so generated rows look like a fleet of Sideband clients reporting in.
+"""
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+APPEARANCE = ["account", b"\x00\x00\x00", b"\xff\xff\xff"]
+
+
+class SyntheticRecord:
+    __slots__ = ("peer_dest", "time", "tel_data", "packed")
+
+    def __init__(self, peer_dest: str, time: datetime, tel_data: dict, packed: bytes):
+        self.peer_dest = peer_dest
+        self.time = time
+        self.tel_data = tel_data
+        self.packed = packed
+
+
+class SidebandGenerator:
+    """Deterministic generator of Sideband style telemetry.
+
+    Args:
+        seed: Seed of the random walk and peer hashes.
+        peers: Number of distinct peers reporting.
+        start: Time of the first record.
+        interval: Seconds between two consecutive records.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        peers: int = 50,
+        start: datetime = datetime(2024, 8, 28, 12, 0, 0),
+        interval: float = 1.0,
+        sample: Path = SAMPLE,
+    ) -> None:
+        self.sample_payload = sample.read_bytes()
+        self.sample = unpackb(self.sample_payload, strict_map_key=False)
+        self.random = random.Random(seed)
+        self.start = start
+        self.interval = interval
+        self.peers = [f"{self.random.getrandbits(128):032x}" for _ in range(peers)]
+        location = LOCATION_CODEC.decode(self.sample[SID_LOCATION])
+        self._positions = {
+            peer: [location["latitude"], location["longitude"]] for peer in self.peers
+        }
+        self._template = location
+
+    def tel_data(self, peer_dest: str, timestamp: int) -> dict:
+        """Telemetry of ``peer_dest`` at ``timestamp``, one step further on its walk."""
+        position = self._positions[peer_dest]
+        position[0] += self.random.gauss(0, 1e-4)
+        position[1] += self.random.gauss(0, 1e-4)
+        location = dict(
+            self._template,
+            latitude=position[0],
+            longitude=position[1],
+            speed=round(abs(self.random.gauss(1.5, 0.5)), 2),
+            bearing=round(self.random.uniform(0, 359.99), 2),
+            last_update=timestamp,
+        )
+        tel_data = dict(self.sample)
+        tel_data[SID_TIME] = timestamp
+        tel_data[SID_LOCATION] = LOCATION_CODEC.encode(location)
+        return tel_data
+
+    def records(self, count: int) -> Iterator[SyntheticRecord]:
+        """Yield ``count`` records, peers taking turns."""
+        for i in range(count):
+            peer_dest = self.peers[i % len(self.peers)]
+            time = self.start + timedelta(seconds=i * self.interval)
+            tel_data = self.tel_data(peer_dest, int(time.timestamp()))
+            yield SyntheticRecord(peer_dest, time, tel_data, packb(tel_data))
+
+    def stream_entries(self, count: int) -> list:
+        """A ``FIELD_TELEMETRY_STREAM`` value holding ``count`` entries."""
+        return [
+            [bytes.fromhex(record.peer_dest), record.tel_data[SID_TIME], record.packed, APPEARANCE]
+            for record in self.records(count)
+        ]
@@ -0,0 +1,54 @@
+"""Cache of outbound LXMF delivery destinations keyed by identity hash.
+
+Building an ``RNS.Destination`` expands its name and hashes it on every call;
+replies and broadcasts to the same peers reuse the cached instances instead.
+"""
+
+import threading
+from collections import OrderedDict
+
+import LXMF
+import RNS
+
+DEFAULT_MAX_DESTINATIONS = 4096
+
+
+class DestinationCache:
+    """Least recently used map of identity hash to outbound delivery destination."""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_DESTINATIONS) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._destinations: OrderedDict[bytes, RNS.Destination] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._destinations)
+
+    def get(self, identity: RNS.Identity) -> RNS.Destination:
+        """Return the ``lxmf.delivery`` destination of ``identity``."""
+        with self._lock:
+            dest = self._destinations.get(identity.hash)
+            if dest is not None:
+                self._destinations.move_to_end(identity.hash)
+                self.hits += 1
+                return dest
+            self.misses += 1
+        dest = RNS.Destination(
+            identity,
+            RNS.Destination.OUT,
+            RNS.Destination.SINGLE,
+            "lxmf",
+            "delivery",
+        )
+        with self._lock:
+            dest = self._destinations.setdefault(identity.hash, dest)
+            self._destinations.move_to_end(identity.hash)
+            while len(self._destinations) > self.max_size:
+                self._destinations.popitem(last=False)
+        return dest
+
+    def for_message(self, message: LXMF.LXMessage) -> RNS.Destination:
+        """Destination to reply to the sender of ``message``."""
+        return self.get(message.source.identity)
@@ -0,0 +1,195 @@
+"""Per-subsystem logging for the hub's hot paths.
+
+Records are only formatted when the level of their subsystem lets them
+through, so detailed dumps of messages and telemetry cost a level check when
+nobody reads them. Records go to ``RNS.log`` by default, or as compact JSON
+lines to a file. Repetitive records can be sampled, keeping one in every
+``sample_every`` records that share a sample key.
+"""
+
+import json
+import threading
+import time
+from typing import Optional
+
+import RNS
+
+LEVEL_NAMES = {
+    "critical": RNS.LOG_CRITICAL,
+    "error": RNS.LOG_ERROR,
+    "warning": RNS.LOG_WARNING,
+    "notice": RNS.LOG_NOTICE,
+    "info": RNS.LOG_INFO,
+    "verbose": RNS.LOG_VERBOSE,
+    "debug": RNS.LOG_DEBUG,
+    "extreme": RNS.LOG_EXTREME,
+}
+_LEVEL_LABELS = {level: name for name, level in LEVEL_NAMES.items()}
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def _json_scalar(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return _json_default(value)
+
+
+class _JsonLinesWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        try:
+            line = json.dumps(record, separators=(",", ":"), default=_json_default)
+        except (TypeError, ValueError):
+            # e.g. LXMF fields dicts keyed by bytes
+            record = {key: _json_scalar(value) for key, value in record.items()}
+            line = json.dumps(record, separators=(",", ":"), default=_json_default)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class _LogSettings:
+    def __init__(self) -> None:
+        self.sample_every = 1
+        self.json_writer: Optional[_JsonLinesWriter] = None
+
+
+_settings = _LogSettings()
+_loggers: dict[str, "HubLogger"] = {}
+_loggers_lock = threading.Lock()
+
+
+class HubLogger:
+    """Logger of one hub subsystem, e.g. ``delivery`` or ``telemetry``.
+
+    Without its own level a logger follows ``RNS.loglevel``.
+    """
+
+    def __init__(self, subsystem: str) -> None:
+        self.subsystem = subsystem
+        self.level: Optional[int] = None
+        self._samples: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def effective_level(self) -> int:
+        return RNS.loglevel if self.level is None else self.level
+
+    def enabled(self, level: int) -> bool:
+        """Whether a record at ``level`` would be emitted, to guard costly arguments."""
+        return self.effective_level >= level
+
+    def log(self, level: int, msg: str, *args, sample: Optional[str] = None, **fields) -> None:
+        """Log ``msg % args`` with optional structured ``fields``.
+
+        Formatting only happens once the record passes the level check and,
+        when ``sample`` is given, the sampling of records sharing that key.
+        """
+        if self.effective_level < level:
+            return
+        suppressed = 0
+        every = _settings.sample_every
+        if sample is not None and every > 1:
+            with self._lock:
+                count = self._samples.get(sample, 0)
+                self._samples[sample] = count + 1
+            if count % every:
+                return
+            suppressed = every - 1 if count else 0
+        if args:
+            msg = msg % args
+        if suppressed:
+            fields["suppressed"] = suppressed
+        writer = _settings.json_writer
+        if writer is not None:
+            writer.write(
+                {
+                    "ts": round(time.time(), 3),
+                    "level": _LEVEL_LABELS.get(level, level),
+                    "subsystem": self.subsystem,
+                    "msg": msg,
+                    **fields,
+                }
+            )
+            return
+        if fields:
+            msg += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        # RNS.log filters on its own level, which a louder subsystem overrides
+        RNS.log(f"[{self.subsystem}] {msg}", min(level, max(RNS.loglevel, 0)))
+
+    def error(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_ERROR, msg, *args, **fields)
+
+    def warning(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_WARNING, msg, *args, **fields)
+
+    def notice(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_NOTICE, msg, *args, **fields)
+
+    def info(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_INFO, msg, *args, **fields)
+
+    def verbose(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_VERBOSE, msg, *args, **fields)
+
+    def debug(self, msg: str, *args, **fields) -> None:
+        self.log(RNS.LOG_DEBUG, msg, *args, **fields)
+
+
+def get_logger(subsystem: str) -> HubLogger:
+    """Return the logger of ``subsystem``, creating it on first use."""
+    logger = _loggers.get(subsystem)
+    if logger is None:
+        with _loggers_lock:
+            logger = _loggers.setdefault(subsystem, HubLogger(subsystem))
+    return logger
+
+
+def configure_logging(
+    levels: Optional[dict[str, int]] = None,
+    json_path: Optional[str] = None,
+    sample_every: int = 1,
+) -> None:
+    """Set subsystem levels, sampling and the JSON lines output.
+
+    Subsystems missing from ``levels`` go back to following ``RNS.loglevel``.
+    Without ``json_path`` records are written through ``RNS.log``.
+    """
+    with _loggers_lock:
+        for logger in _loggers.values():
+            logger.level = None
+    for subsystem, level in (levels or {}).items():
+        get_logger(subsystem).level = level
+    _settings.sample_every = max(1, sample_every)
+    if _settings.json_writer is not None:
+        _settings.json_writer.close()
+        _settings.json_writer = None
+    if json_path:
+        _settings.json_writer = _JsonLinesWriter(json_path)
+
+
+def parse_log_levels(value: str) -> dict[str, int]:
+    """Parse ``subsystem=level`` pairs, e.g. ``delivery=debug,telemetry=warning``."""
+    levels = {}
+    for pair in filter(None, value.split(",")):
+        subsystem, _, level = pair.partition("=")
+        level = level.strip().lower()
+        if level in LEVEL_NAMES:
+            levels[subsystem.strip()] = LEVEL_NAMES[level]
+        elif level.isdigit():
+            levels[subsystem.strip()] = int(level)
+        else:
+            raise ValueError(f"Unknown log level {level!r} for {subsystem!r}")
+    return levels
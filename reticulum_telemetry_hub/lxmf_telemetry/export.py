@@ -0,0 +1,335 @@
+"""Columnar export of stored telemetry for analysis.
+
+Telemeters are read with Core queries in batches of rows, one partition
+at a time, and written as one row per telemeter with a column per sensor
+field, to gzip compressed CSV or, when ``pyarrow`` is installed, Parquet.
+Memory stays bounded by the batch size whatever the exported range.
+
+Location fields are stored as scaled integers; a batch of them is scaled
+with NumPy when it is installed.
+
+Run from the command line::
+
+    python -m reticulum_telemetry_hub.lxmf_telemetry.export tracks.csv.gz --since 30d
+"""
+
+import argparse
+import csv
+import gzip
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_BATTERY,
+    SID_INFORMATION,
+    SID_LOCATION,
+    SID_PROXIMITY,
+    SID_RECEIVED,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.records import TelemetryRecord
+from reticulum_telemetry_hub.lxmf_telemetry.retention import parse_duration
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import (
+    CODECS,
+    LOCATION_CODEC,
+    EntriesCodec,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import PARTITIONS, StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+export_log = get_logger("export")
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMATS = (FORMAT_CSV, FORMAT_PARQUET)
+
+# Column type per sensor field, every other field is a float
+_FIELD_TYPES = {
+    (SID_BATTERY, "charging"): bool,
+    (SID_PROXIMITY, "triggered"): bool,
+    (SID_INFORMATION, "contents"): str,
+    (SID_RECEIVED, "by"): str,
+    (SID_RECEIVED, "via"): str,
+}
+
+
+class ExportColumn:
+    """One column of the export, the value of a sensor field or of the telemeter."""
+
+    __slots__ = ("name", "sid", "field", "type")
+
+    def __init__(
+        self, name: str, type: type, sid: Optional[int] = None, field: Optional[str] = None
+    ) -> None:
+        self.name = name
+        self.type = type
+        self.sid = sid
+        self.field = field
+
+
+def _columns() -> list[ExportColumn]:
+    columns = [
+        ExportColumn("id", int),
+        ExportColumn("peer_dest", str),
+        ExportColumn("time", float),
+    ]
+    for sid, codec in sorted(CODECS.items()):
+        # Entry lists have no fixed number of columns
+        if isinstance(codec, EntriesCodec):
+            continue
+        for field in codec.fields:
+            column_type = _FIELD_TYPES.get((sid, field), float)
+            columns.append(ExportColumn(f"{codec.name}_{field}", column_type, sid, field))
+    return columns
+
+
+COLUMNS = _columns()
+# Columns filled from each sensor, location is scaled per batch instead
+_SENSOR_COLUMNS: dict[int, list[ExportColumn]] = {}
+for _column in COLUMNS:
+    if _column.sid is not None and _column.sid != SID_LOCATION:
+        _SENSOR_COLUMNS.setdefault(_column.sid, []).append(_column)
+_LOCATION_COLUMNS = [f"location_{field}" for field in LOCATION_CODEC.fields]
+_LOCATION_SCALES = tuple(10**decimals for decimals in LOCATION_CODEC.DECIMALS) + (1,)
+
+
+def export_format(path: Union[str, Path]) -> str:
+    """Format of an export file, from its suffix."""
+    suffixes = Path(path).suffixes
+    return FORMAT_PARQUET if suffixes and suffixes[-1] == ".parquet" else FORMAT_CSV
+
+
+def _convert(value, column_type: type):
+    if value is None:
+        return None
+    if isinstance(value, bytes) and column_type is str:
+        return value.hex()
+    try:
+        return column_type(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _scale_locations(raw: list[Optional[tuple]]) -> dict[str, list]:
+    """Columns of the location fields of a batch, ``None`` where missing."""
+    if numpy is not None:
+        values = numpy.full((len(raw), len(_LOCATION_SCALES)), numpy.nan)
+        present = [i for i, fields in enumerate(raw) if fields is not None]
+        if present:
+            values[present] = numpy.array([raw[i] for i in present], dtype=numpy.float64)
+        values /= numpy.array(_LOCATION_SCALES, dtype=numpy.float64)
+        missing = numpy.isnan(values)
+        return {
+            name: [None if gap else value for value, gap in zip(column, gaps)]
+            for name, column, gaps in zip(
+                _LOCATION_COLUMNS, values.T.tolist(), missing.T.tolist()
+            )
+        }
+    columns = {name: [] for name in _LOCATION_COLUMNS}
+    for fields in raw:
+        for name, value, scale in zip(
+            _LOCATION_COLUMNS, fields or (None,) * len(_LOCATION_COLUMNS), _LOCATION_SCALES
+        ):
+            columns[name].append(None if value is None else value / scale)
+    return columns
+
+
+def telemetry_columns(records: list[TelemetryRecord]) -> dict[str, list]:
+    """Decode a batch of records into export columns."""
+    count = len(records)
+    columns = {column.name: [None] * count for column in COLUMNS}
+    columns["id"] = [record.id for record in records]
+    columns["peer_dest"] = [record.peer_dest for record in records]
+    columns["time"] = [record.time.timestamp() for record in records]
+    raw_locations = [None] * count
+    for index, record in enumerate(records):
+        for sid, value in record.tel_data.items():
+            if value is None:
+                continue
+            if sid == SID_LOCATION:
+                raw_locations[index] = LOCATION_CODEC.decode_raw(value)
+                continue
+            sensor_columns = _SENSOR_COLUMNS.get(sid)
+            if sensor_columns is None:
+                continue
+            values = CODECS[sid].decode(value)
+            if not values:
+                continue
+            for column in sensor_columns:
+                columns[column.name][index] = _convert(values.get(column.field), column.type)
+    columns.update(_scale_locations(raw_locations))
+    return columns
+
+
+def _telemetry_rows(
+    controller: TelemetryController,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    peer_dest: Optional[Union[str, Iterable[str]]],
+    batch_size: int,
+) -> Iterator[list[TelemetryRecord]]:
+    """Batches of ``TelemetryRecord`` objects oldest first, across partitions."""
+    batch = []
+    for record in controller.iter_records(
+        start_time, end_time, peer_dest, batch_size=batch_size
+    ):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_telemetry_columns(
+    controller: TelemetryController,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    peer_dest: Optional[Union[str, Iterable[str]]] = None,
+    batch_size: int = 10000,
+) -> Iterator[dict[str, list]]:
+    """Stored telemetry as batches of columns keyed by ``COLUMNS`` names, oldest first."""
+    for rows in _telemetry_rows(controller, start_time, end_time, peer_dest, batch_size):
+        yield telemetry_columns(rows)
+
+
+class _CsvWriter:
+    def __init__(self, path: Path) -> None:
+        if path.suffix == ".gz":
+            self._file = gzip.open(
+                path, "wt", compresslevel=6, newline="", encoding="utf-8"
+            )
+        else:
+            self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([column.name for column in COLUMNS])
+
+    def write(self, columns: dict[str, list]) -> None:
+        self._writer.writerows(zip(*(columns[column.name] for column in COLUMNS)))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    _TYPES = {int: "int64", float: "float64", bool: "bool_", str: "string"}
+
+    def __init__(self, path: Path) -> None:
+        if pyarrow is None:
+            raise RuntimeError("Parquet export needs pyarrow, export to CSV instead")
+        self._schema = pyarrow.schema(
+            [(column.name, getattr(pyarrow, self._TYPES[column.type])()) for column in COLUMNS]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, columns: dict[str, list]) -> None:
+        self._writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def export_telemetry(
+    controller: TelemetryController,
+    path: Union[str, Path],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    peer_dest: Optional[Union[str, Iterable[str]]] = None,
+    format: Optional[str] = None,
+    batch_size: int = 10000,
+) -> int:
+    """Write stored telemetry to ``path`` and return how many telemeters were exported.
+
+    ``format`` defaults to Parquet for ``.parquet`` files, else CSV, gzip
+    compressed when the file name ends in ``.gz``.
+    """
+    path = Path(path)
+    format = format or export_format(path)
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format!r}, expected one of {FORMATS}")
+    writer = _ParquetWriter(path) if format == FORMAT_PARQUET else _CsvWriter(path)
+    exported = 0
+    started = time.perf_counter()
+    try:
+        for columns in iter_telemetry_columns(
+            controller, start_time, end_time, peer_dest, batch_size
+        ):
+            writer.write(columns)
+            exported += len(columns["id"])
+            export_log.debug("Exported %d telemeters", exported)
+    finally:
+        writer.close()
+    export_log.info(
+        "Exported %d telemeters to %s in %.1f s", exported, path, time.perf_counter() - started
+    )
+    return exported
+
+
+def _parse_time(value: str) -> datetime:
+    """A ``datetime.fromisoformat`` value, or a duration before now like ``30d``."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.now() - parse_duration(value)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Export stored telemetry to CSV or Parquet")
+    ap.add_argument("output", help="File to write, .csv, .csv.gz or .parquet")
+    ap.add_argument(
+        "--db", help="Telemetry database file", default=str(Path("RTH_Store") / "telemetry.db")
+    )
+    ap.add_argument(
+        "--storage_partition",
+        choices=PARTITIONS,
+        help="Partitioning the hub was run with",
+        default=None,
+    )
+    ap.add_argument("--format", choices=FORMATS, help="Defaults to the output file suffix")
+    ap.add_argument(
+        "--since", type=_parse_time, help="ISO time or age like 30d", default=None
+    )
+    ap.add_argument(
+        "--until", type=_parse_time, help="ISO time or age like 1d", default=None
+    )
+    ap.add_argument(
+        "--peer", action="append", help="Peer destination hash, can be repeated", default=None
+    )
+    ap.add_argument("--batch_size", type=int, help="Rows decoded per batch", default=10000)
+    args = ap.parse_args(argv)
+
+    controller = TelemetryController(
+        StorageConfig(db_path=args.db, partition=args.storage_partition)
+    )
+    try:
+        exported = export_telemetry(
+            controller,
+            args.output,
+            start_time=args.since,
+            end_time=args.until,
+            peer_dest=args.peer,
+            format=args.format,
+            batch_size=args.batch_size,
+        )
+    finally:
+        controller.shutdown()
+    print(f"Exported {exported} telemeters to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,389 @@
+"""Bulk import of captured telemetry, to backfill a hub or replay load.
+
+Two kinds of files are read:
+
+- msgpack files holding one or more telemetry payloads, each either a
+  telemetry dict as in ``sample.bin`` (``FIELD_TELEMETRY``) or a list of
+  ``[source hash, timestamp, packed telemetry, appearance]`` stream entries
+  (``FIELD_TELEMETRY_STREAM``);
+- newline delimited JSON (``.ndjson`` or ``.jsonl``), one telemeter per
+  line as ``{"peer_dest": hex, "time": seconds, "packed": base64}``, or
+  with a ``"telemetry"`` object keyed by sensor id instead of ``"packed"``.
+
+Payloads are decoded in a process pool and written in large transactions
+through the controller's bulk insert, skipping telemetry already stored.
+For the joined layout the workers also build the column values of every
+sensor row, so the writing process only runs the inserts.
+Telemetry dicts carry no peer, theirs is given as ``peer_dest``, and are
+recorded at the time of their time sensor.
+
+Run from the command line::
+
+    python -m reticulum_telemetry_hub.lxmf_telemetry.importer capture.bin --peer <hash>
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from msgpack import Unpacker, packb, unpackb
+from sqlalchemy import inspect
+
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_mapping import (
+    sensor_class,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_JOINED,
+    LAYOUTS,
+    PARTITIONS,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+import_log = get_logger("import")
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+# Decoding processes, one core is left to the process writing the database
+DEFAULT_WORKERS = min(4, (os.cpu_count() or 1) - 1)
+
+# Kinds of raw items handed to the decoding workers
+_TELEMETRY = "telemetry"
+_ENTRY = "entry"
+_JSON = "json"
+
+
+class _ImportedSensor:
+    """What the controller indexes of an imported sensor: its type and location."""
+
+    __slots__ = ("sid", "latitude", "longitude")
+
+    def __init__(
+        self, sid: int, latitude: Optional[float] = None, longitude: Optional[float] = None
+    ) -> None:
+        self.sid = sid
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class ImportRecord:
+    """A decoded telemeter ready to be written, without ORM state.
+
+    ``sensor_rows`` holds, for the joined layout, the column values of each
+    sensor keyed by table name.
+    """
+
+    __slots__ = ("peer_dest", "time", "packed", "sensors", "sensor_rows")
+
+    def __init__(
+        self,
+        peer_dest: str,
+        time: datetime,
+        packed: bytes,
+        sensors: list,
+        sensor_rows: Optional[list[dict]] = None,
+    ) -> None:
+        self.peer_dest = peer_dest
+        self.time = time
+        self.packed = packed
+        self.sensors = sensors
+        self.sensor_rows = sensor_rows
+
+
+class ImportProgress:
+    """Counts of an import so far."""
+
+    def __init__(self) -> None:
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.seconds = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Records read per second."""
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "read": self.read,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "seconds": self.seconds,
+        }
+
+
+# Per sensor class: its tables with the (column, attribute) pairs inserted
+_SENSOR_COLUMNS: dict[type, list[tuple[str, list[tuple[str, str]]]]] = {}
+
+
+def _sensor_columns(cls: type) -> list[tuple[str, list[tuple[str, str]]]]:
+    columns = _SENSOR_COLUMNS.get(cls)
+    if columns is None:
+        mapper = inspect(cls)
+        # Ids and the telemeter reference are only known when writing
+        columns = _SENSOR_COLUMNS[cls] = [
+            (
+                table.name,
+                [
+                    (column.key, mapper.get_property_by_column(column).key)
+                    for column in table.columns
+                    if not column.primary_key and not column.foreign_keys
+                ],
+            )
+            for table in mapper.tables
+        ]
+    return columns
+
+
+def _joined_sensors(tel_data: dict) -> tuple[list, list[dict]]:
+    """Sensors of a telemetry dict and the joined layout rows they are stored as."""
+    sensors = []
+    sensor_rows = []
+    for sid, value in tel_data.items():
+        cls = sensor_class(sid) if isinstance(sid, int) else None
+        if cls is None or value is None:
+            continue
+        sensor = cls()
+        if sensor.unpack(value) is None:
+            continue
+        sensors.append(
+            _ImportedSensor(
+                sid, getattr(sensor, "latitude", None), getattr(sensor, "longitude", None)
+            )
+        )
+        sensor_rows.append(
+            {
+                table: {column: getattr(sensor, attr) for column, attr in columns}
+                for table, columns in _sensor_columns(cls)
+            }
+        )
+    return sensors, sensor_rows
+
+
+def _record(
+    peer_dest, timestamp, packed: bytes, tel_data=None, joined: bool = False
+) -> Optional[ImportRecord]:
+    """Build a record from a packed payload, None if it is not valid telemetry."""
+    if tel_data is None:
+        tel_data = unpackb(packed, strict_map_key=False)
+    if not isinstance(tel_data, dict):
+        return None
+    if timestamp is None:
+        timestamp = tel_data.get(SID_TIME)
+    if isinstance(peer_dest, bytes):
+        peer_dest = peer_dest.hex()
+    recorded = TelemetryController._source_time(timestamp)
+    if not peer_dest or recorded is None:
+        return None
+    if joined:
+        return ImportRecord(peer_dest, recorded, packed, *_joined_sensors(tel_data))
+    sensors = []
+    for sid, value in tel_data.items():
+        # Only sensors the hub can decode are indexed, as for live telemetry
+        if not isinstance(sid, int) or value is None or sensor_class(sid) is None:
+            continue
+        if sid == SID_LOCATION:
+            location = LOCATION_CODEC.decode(value)
+            if location is None:
+                continue
+            sensors.append(_ImportedSensor(sid, location["latitude"], location["longitude"]))
+        else:
+            sensors.append(_ImportedSensor(sid))
+    return ImportRecord(peer_dest, recorded, packed, sensors)
+
+
+def _decode_item(
+    item: tuple, peer_dest: Optional[str], joined: bool
+) -> Optional[ImportRecord]:
+    kind, value = item
+    if kind == _TELEMETRY:
+        return _record(peer_dest, None, packb(value), value, joined)
+    if kind == _ENTRY:
+        source, timestamp, packed = value[0], value[1], value[2]
+        return _record(source, timestamp, packed, joined=joined)
+    line = json.loads(value)
+    if "packed" in line:
+        packed = base64.b64decode(line["packed"])
+    else:
+        packed = packb({int(sid): data for sid, data in line["telemetry"].items()})
+    return _record(line.get("peer_dest") or peer_dest, line.get("time"), packed, joined=joined)
+
+
+def decode_chunk(
+    items: list, peer_dest: Optional[str] = None, joined: bool = False
+) -> tuple[list, int]:
+    """Decode raw items into records, returns them and how many were invalid.
+
+    ``joined`` also builds the sensor rows of the joined layout.
+    """
+    records = []
+    invalid = 0
+    for item in items:
+        try:
+            record = _decode_item(item, peer_dest, joined)
+        except Exception:
+            record = None
+        if record is None:
+            invalid += 1
+        else:
+            records.append(record)
+    return records, invalid
+
+
+def read_items(path: Union[str, Path]) -> Iterator[tuple]:
+    """Raw telemetry items of a capture file, decoded by ``decode_chunk``."""
+    path = Path(path)
+    if path.suffix in NDJSON_SUFFIXES:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield _JSON, line
+        return
+    with open(path, "rb") as f:
+        for payload in Unpacker(f, raw=False, strict_map_key=False):
+            if isinstance(payload, dict):
+                yield _TELEMETRY, payload
+            elif isinstance(payload, list):
+                for entry in payload:
+                    yield _ENTRY, entry
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TelemetryImporter:
+    """Decodes captured telemetry in worker processes and bulk writes it.
+
+    ``workers=0`` decodes in the calling process. ``progress`` is called
+    with an ``ImportProgress`` after every written batch.
+    """
+
+    def __init__(
+        self,
+        controller: TelemetryController,
+        workers: int = DEFAULT_WORKERS,
+        chunk_size: int = 2000,
+        batch_size: int = 10000,
+        progress: Optional[Callable[[ImportProgress], None]] = None,
+    ) -> None:
+        self.controller = controller
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def import_files(
+        self, paths: Iterable[Union[str, Path]], peer_dest: Optional[str] = None
+    ) -> ImportProgress:
+        """Import every file in ``paths`` and report what was imported."""
+        report = ImportProgress()
+        started = time.perf_counter()
+        items = (item for path in paths for item in read_items(path))
+        pending: list = []
+        for records, invalid in self._decoded(_chunks(items, self.chunk_size), peer_dest):
+            report.read += len(records) + invalid
+            report.invalid += invalid
+            pending.extend(records)
+            if len(pending) >= self.batch_size:
+                self._write(pending, report, started)
+                pending = []
+        self._write(pending, report, started)
+        import_log.info(
+            "Imported %d of %d telemeters in %.1f s",
+            report.imported,
+            report.read,
+            report.seconds,
+            duplicates=report.duplicates,
+            invalid=report.invalid,
+        )
+        return report
+
+    def _decoded(self, chunks: Iterator[list], peer_dest: Optional[str]) -> Iterator[tuple]:
+        """Decoded chunks in file order, with a bounded number in flight."""
+        joined = self.controller.storage.config.layout == LAYOUT_JOINED
+        if self.workers <= 0:
+            for chunk in chunks:
+                yield decode_chunk(chunk, peer_dest, joined)
+            return
+        with ProcessPoolExecutor(self.workers) as executor:
+            in_flight: list[Future] = []
+            for chunk in chunks:
+                in_flight.append(executor.submit(decode_chunk, chunk, peer_dest, joined))
+                if len(in_flight) >= self.workers * 2:
+                    yield in_flight.pop(0).result()
+            for future in in_flight:
+                yield future.result()
+
+    def _write(self, records: list, report: ImportProgress, started: float) -> None:
+        if records:
+            imported = self.controller.write_telemeters(records)
+            report.imported += imported
+            report.duplicates += len(records) - imported
+        report.seconds = time.perf_counter() - started
+        if self.progress is not None:
+            self.progress(report)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Import captured telemetry into a hub database")
+    ap.add_argument("files", nargs="+", help="msgpack captures, or .ndjson/.jsonl dumps")
+    ap.add_argument(
+        "--db", help="Telemetry database file", default=str(Path("RTH_Store") / "telemetry.db")
+    )
+    ap.add_argument("--storage_layout", choices=LAYOUTS, default=LAYOUT_JOINED)
+    ap.add_argument("--storage_partition", choices=PARTITIONS, default=None)
+    ap.add_argument("--peer", help="Peer destination hash of telemetry dicts without one")
+    ap.add_argument(
+        "--workers", type=int, help="Decoding processes, 0 decodes inline", default=DEFAULT_WORKERS
+    )
+    ap.add_argument("--batch_size", type=int, help="Telemeters per transaction", default=10000)
+    args = ap.parse_args(argv)
+
+    def show(progress: ImportProgress) -> None:
+        print(
+            f"\r{progress.read} read, {progress.imported} imported, "
+            f"{progress.duplicates} duplicate, {progress.invalid} invalid, "
+            f"{progress.rate:.0f}/s",
+            end="",
+            flush=True,
+        )
+
+    controller = TelemetryController(
+        StorageConfig(
+            db_path=args.db, layout=args.storage_layout, partition=args.storage_partition
+        )
+    )
+    try:
+        TelemetryImporter(
+            controller, workers=args.workers, batch_size=args.batch_size, progress=show
+        ).import_files(args.files, args.peer)
+    finally:
+        controller.shutdown()
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
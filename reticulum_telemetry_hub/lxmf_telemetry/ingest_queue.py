@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import RNS
+
+_STOP = object()
+_FLUSH = object()
+
+
+class IngestStats:
+    """Counters describing the behaviour of an ingest queue."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.committed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.commit_seconds_total = 0.0
+        self.commit_seconds_max = 0.0
+
+    def record_enqueued(self) -> None:
+        with self._lock:
+            self.enqueued += 1
+
+    def record_dropped(self) -> None:
+        with self._lock:
+            self.dropped += 1
+
+    def record_batch(self, size: int, seconds: float, failed: int = 0) -> None:
+        with self._lock:
+            self.batches += 1
+            self.last_batch_size = size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.commit_seconds_total += seconds
+            self.commit_seconds_max = max(self.commit_seconds_max, seconds)
+            self.committed += size - failed
+            self.failed += failed
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "committed": self.committed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "last_batch_size": self.last_batch_size,
+                "max_batch_size": self.max_batch_size,
+                "mean_batch_size": (
+                    (self.committed + self.failed) / self.batches if self.batches else 0.0
+                ),
+                "commit_seconds_total": self.commit_seconds_total,
+                "commit_seconds_max": self.commit_seconds_max,
+                "commit_seconds_mean": (
+                    self.commit_seconds_total / self.batches if self.batches else 0.0
+                ),
+            }
+
+
+class TelemetryIngestQueue:
+    """Write-behind queue that groups records into batched commits.
+
+    Records are handed to ``flush_callback`` in batches of at most
+    ``max_batch_size`` items, or earlier once the oldest pending record is
+    ``max_batch_age`` seconds old. At most ``max_pending`` records are held in
+    memory; ``put`` blocks when the queue is full, or gives up after
+    ``put_timeout`` seconds and counts the record as dropped. A batch whose
+    commit fails is split in halves and retried, so only the records that
+    fail on their own are lost.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[list], Any],
+        max_batch_size: int = 256,
+        max_batch_age: float = 0.5,
+        max_pending: int = 4096,
+        put_timeout: Optional[float] = None,
+        name: str = "telemetry-ingest",
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.flush_callback = flush_callback
+        self.max_batch_size = max_batch_size
+        self.max_batch_age = max_batch_age
+        self.put_timeout = put_timeout
+        self.name = name
+        self.stats = IngestStats()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def pending(self) -> int:
+        """Approximate number of records waiting to be committed."""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Start the background writer thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def put(self, item) -> bool:
+        """Queue a record for writing.
+
+        Returns False if the queue is not running or the record was dropped
+        because the queue stayed full for longer than ``put_timeout``.
+        """
+        if not self._running:
+            return False
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            self.stats.record_dropped()
+            RNS.log(f"{self.name}: queue full, record dropped", RNS.LOG_ERROR)
+            return False
+        self.stats.record_enqueued()
+        return True
+
+    def flush(self) -> None:
+        """Commit everything queued so far and wait for it to be written."""
+        if not self._running:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flush pending records and stop the writer thread."""
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            if item is _FLUSH:
+                self._queue.task_done()
+                continue
+            batch = [item]
+            markers = 0
+            deadline = time.monotonic() + self.max_batch_age
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP or item is _FLUSH:
+                    markers += 1
+                    stopping = item is _STOP
+                    break
+                batch.append(item)
+            self._commit(batch)
+            for _ in range(len(batch) + markers):
+                self._queue.task_done()
+
+    def _commit(self, batch: list) -> None:
+        started = time.perf_counter()
+        errors: list[Exception] = []
+        self._commit_parts(batch, errors)
+        if errors:
+            RNS.log(
+                f"{self.name}: failed to commit {len(errors)} of {len(batch)} records: "
+                f"{errors[-1]}",
+                RNS.LOG_ERROR,
+            )
+        self.stats.record_batch(len(batch), time.perf_counter() - started, len(errors))
+
+    def _commit_parts(self, batch: list, errors: list) -> None:
+        """Commit ``batch``, splitting it on failure until the failing records are alone."""
+        try:
+            self.flush_callback(batch)
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                errors.append(e)
+                return
+        middle = len(batch) // 2
+        self._commit_parts(batch[:middle], errors)
+        self._commit_parts(batch[middle:], errors)
@@ -1,13 +1,27 @@
 from . import Base
-from typing import TYPE_CHECKING, Optional
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, Index, LargeBinary, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-if TYPE_CHECKING:
-    from .telemeter import Telemeter
+from .telemeter import Telemeter
 
 class Peer(Base):
     __tablename__ = 'Peer'
 
     destination_hash: Mapped[str] = mapped_column(String, nullable=False, primary_key=True)
-    telemeters = relationship("Telemeter")
-    #appearance = relationship("Appearance", back_populates='peer')
\ No newline at end of file
+    display_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Announce app data as received, legacy UTF-8 or msgpack
+    app_data: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    last_heard: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Telemeter.peer_dest holds the same hex hash without a foreign key
+    telemeters: Mapped[list["Telemeter"]] = relationship(
+        "Telemeter",
+        primaryjoin="foreign(Telemeter.peer_dest) == Peer.destination_hash",
+        viewonly=True,
+    )
+    #appearance = relationship("Appearance", back_populates='peer')
+
+    __table_args__ = (
+        Index("ix_peer_last_heard", "last_heard"),
+    )
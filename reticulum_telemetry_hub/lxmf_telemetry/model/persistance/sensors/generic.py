@@ -0,0 +1,17 @@
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
+from .sensor_enum import SID_NONE
+
+
+class GenericSensor(Sensor):
+    """Sensor type without a dedicated table.
+
+    Rows live in the ``Sensor`` table only, with the msgpack encoded wire
+    value in ``data``. Each such SID gets a subclass in ``sensor_mapping``.
+    """
+
+    def __init__(self):
+        super().__init__(stale_time=15)
+
+    __mapper_args__ = {
+        'polymorphic_identity': SID_NONE,
+    }
@@ -1,8 +1,7 @@
 from sqlalchemy import Column
 from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
 from .sensor_enum import SID_LOCATION
-import struct
-import RNS
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
 from sqlalchemy import Integer, ForeignKey, Float, DateTime
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
@@ -29,38 +28,30 @@ class Location(Sensor):
         self.accuracy = None
 
     def pack(self):
-        try:
-            return [
-                struct.pack("!i", int(round(self.latitude, 6) * 1e6)),
-                struct.pack("!i", int(round(self.longitude, 6) * 1e6)),
-                struct.pack("!I", int(round(self.altitude, 2) * 1e2)),
-                struct.pack("!I", int(round(self.speed, 2) * 1e2)),
-                struct.pack("!I", int(round(self.bearing, 2) * 1e2)),
-                struct.pack("!H", int(round(self.accuracy, 2) * 1e2)),
-                self.last_update.timestamp(),
-            ]
-        except (KeyError, ValueError, struct.error) as e:
-            RNS.log(
-                "An error occurred while packing location sensor data. "
-                "The contained exception was: " + str(e),
-                RNS.LOG_ERROR,
-            )
-            return None
+        return LOCATION_CODEC.encode(
+            {
+                "latitude": self.latitude,
+                "longitude": self.longitude,
+                "altitude": self.altitude,
+                "speed": self.speed,
+                "bearing": self.bearing,
+                "accuracy": self.accuracy,
+                "last_update": self.last_update.timestamp(),
+            }
+        )
 
     def unpack(self, packed):
-        try:
-            if packed is None:
-                return None
-            else:
-                self.latitude = struct.unpack("!i", packed[0])[0] / 1e6
-                self.longitude = struct.unpack("!i", packed[1])[0] / 1e6
-                self.altitude = struct.unpack("!I", packed[2])[0] / 1e2
-                self.speed = struct.unpack("!I", packed[3])[0] / 1e2
-                self.bearing = struct.unpack("!I", packed[4])[0] / 1e2
-                self.accuracy = struct.unpack("!H", packed[5])[0] / 1e2
-                self.last_update = datetime.fromtimestamp(packed[6])
-        except (struct.error, IndexError):
+        values = LOCATION_CODEC.decode(packed)
+        if values is None:
             return None
+        self.latitude = values["latitude"]
+        self.longitude = values["longitude"]
+        self.altitude = values["altitude"]
+        self.speed = values["speed"]
+        self.bearing = values["bearing"]
+        self.accuracy = values["accuracy"]
+        self.last_update = datetime.fromtimestamp(values["last_update"])
+        return values
 
 
     __mapper_args__ = {
@@ -1,8 +1,7 @@
 from sqlalchemy import Column
 from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
 from .sensor_enum import SID_MAGNETIC_FIELD
-import struct
-import RNS
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import CODECS
 from sqlalchemy import Integer, ForeignKey, Float, DateTime
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
@@ -25,10 +24,13 @@ class MagneticField(Sensor):
         return [self.x, self.y, self.z]
 
     def unpack(self, packed):
-        try:
-            return {"x": packed[0], "y": packed[1], "z": packed[2]}
-        except:
+        values = CODECS[SID_MAGNETIC_FIELD].decode(packed)
+        if values is None:
             return None
+        self.x = values["x"]
+        self.y = values["y"]
+        self.z = values["z"]
+        return values
 
     __mapper_args__ = {
         'polymorphic_identity': SID_MAGNETIC_FIELD,
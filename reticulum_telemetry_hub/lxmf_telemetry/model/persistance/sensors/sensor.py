@@ -1,10 +1,11 @@
-from sqlalchemy import Column, ForeignKey, Integer, Float, Boolean, String, create_engine, BLOB
+from sqlalchemy import Column, ForeignKey, Integer, Float, Boolean, String, create_engine, BLOB, Index
 from msgpack import packb, unpackb
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Mapped, mapped_column
 import time
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 from .. import Base
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import CODECS
 
 class Sensor(Base):
     __tablename__ = 'Sensor'
@@ -17,6 +18,10 @@ class Sensor(Base):
     telemeter_id: Mapped[int] = mapped_column(ForeignKey('Telemeter.id'))
     telemeter = relationship("Telemeter", back_populates='sensors')
 
+    __table_args__ = (
+        Index("ix_sensor_telemeter_sid", "telemeter_id", "sid"),
+    )
+
     def __init__(self, stale_time=None, data=None, active=False, synthesized=False, last_update=0, last_read=0):
         self.stale_time = stale_time
         self.data = data
@@ -32,11 +37,25 @@ class Sensor(Base):
         return unpackb(self.unpack(packed))
 
     def pack(self):
-        return self.data
+        """Return the wire value of the sensor."""
+        return unpackb(self.data, strict_map_key=False) if self.data is not None else None
 
     def unpack(self, packed):
+        """Load the sensor from its wire value, returns None if it cannot be decoded.
+
+        Sensor types without a dedicated class keep the msgpack encoded wire
+        value in ``data``.
+        """
+        if packed is None:
+            return None
+        self.data = packb(packed)
         return packed
 
+    def decode(self) -> Optional[dict]:
+        """Return the sensor value as a dict of named fields."""
+        codec = CODECS.get(self.sid)
+        return codec.decode(self.pack()) if codec is not None else None
+
     __mapper_args__ = {
         'polymorphic_identity': 'Sensor',
         'with_polymorphic': '*',
@@ -2,8 +2,26 @@ from .sensor_enum import *
 from .location import Location
 from .time import Time
 from .magnetic_field import MagneticField
+from .generic import GenericSensor
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import CODECS
 sid_mapping = {
     SID_LOCATION: Location,
     SID_TIME: Time,
     SID_MAGNETIC_FIELD: MagneticField,
 }
+
+# Every other known sensor type is stored through a GenericSensor subclass
+generic_mapping = {
+    sid: type(
+        f"GenericSensor{sid:02X}",
+        (GenericSensor,),
+        {"__mapper_args__": {"polymorphic_identity": sid}},
+    )
+    for sid in CODECS
+    if sid not in sid_mapping
+}
+
+
+def sensor_class(sid: int):
+    """Return the class used to store a sensor type, or None if it is unknown."""
+    return sid_mapping.get(sid) or generic_mapping.get(sid)
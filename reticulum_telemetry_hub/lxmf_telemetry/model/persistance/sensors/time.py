@@ -25,6 +25,7 @@ class Time(Sensor):
             return None
         else:
             self.utc = datetime.fromtimestamp(packed)
+            return {"utc": packed}
 
     __mapper_args__ = {
         'polymorphic_identity': SID_TIME,
@@ -0,0 +1,18 @@
+from . import Base
+from datetime import datetime
+from sqlalchemy import DateTime, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class Subscriber(Base):
+    """A client that joined the hub to receive its broadcasts.
+
+    The identity public key is kept so the client's delivery destination can
+    be rebuilt after a restart without waiting for it to announce again.
+    """
+
+    __tablename__ = "Subscriber"
+
+    identity_hash: Mapped[str] = mapped_column(String, primary_key=True)
+    public_key: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    joined: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
@@ -0,0 +1,19 @@
+from . import Base
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class SyncCursor(Base):
+    """Newest telemeter delivered to a requester by incremental telemetry requests.
+
+    New telemeters get ids above every stored one, so the telemeters up to
+    ``telemeter_id`` are known to have reached the requester and are not sent
+    to it again.
+    """
+
+    __tablename__ = "SyncCursor"
+
+    requester: Mapped[str] = mapped_column(String, primary_key=True)
+    telemeter_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
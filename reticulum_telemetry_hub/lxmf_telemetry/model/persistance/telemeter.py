@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING, Optional
 from . import Base
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from msgpack import packb, unpackb
@@ -18,6 +18,18 @@ class Telemeter(Base):
     peer_dest: Mapped[str] = mapped_column(String, nullable=False) # mapped_column(ForeignKey("Peer.destination_hash"))
     #peer = relationship("Peer", back_populates="telemeters")
 
-    def __init__(self, peer_dest: str, time: Optional[datetime] = None):
+    # msgpack encoded telemetry exactly as received, re-sent without re-serializing
+    packed: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+    __table_args__ = (
+        Index("ix_telemeter_time", "time"),
+        # One row per peer and source timestamp, resent telemetry is ignored
+        Index("ix_telemeter_peer_time", "peer_dest", "time", unique=True),
+    )
+
+    def __init__(
+        self, peer_dest: str, time: Optional[datetime] = None, packed: Optional[bytes] = None
+    ):
         self.peer_dest = peer_dest
         self.time = time or datetime.now()
+        self.packed = packed
@@ -0,0 +1,18 @@
+from . import Base
+from sqlalchemy import ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class TelemeterSensor(Base):
+    """Sensor types present in a telemeter stored with the compact layout.
+
+    The sensor values themselves are decoded from ``Telemeter.packed``; this
+    narrow table only exists so telemetry can be filtered by sensor type.
+    """
+
+    __tablename__ = "TelemeterSensor"
+
+    telemeter_id: Mapped[int] = mapped_column(ForeignKey("Telemeter.id"), primary_key=True)
+    sid: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    __table_args__ = {"sqlite_with_rowid": False}
@@ -0,0 +1,165 @@
+"""Time-partitioned telemetry storage.
+
+Telemetry is split into one SQLite file per day or ISO week, named after
+the period it covers, e.g. ``2024-08-28.db`` or ``2024-W35.db``. Range
+queries only open the files overlapping the range and run them on a
+thread pool, and expired telemetry is removed by deleting whole files
+instead of row by row.
+"""
+
+import copy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable, Optional, TypeVar
+
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.lxmf_telemetry.storage import PARTITION_DAY, StorageConfig
+
+partition_log = get_logger("partitions")
+
+T = TypeVar("T")
+
+PARTITION_SUFFIX = ".db"
+# SQLite files that belong to a database besides the database itself
+_SIDECAR_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def partition_key(time: datetime, period: str) -> str:
+    """Name of the partition holding telemetry recorded at ``time``."""
+    if period == PARTITION_DAY:
+        return time.strftime("%Y-%m-%d")
+    year, week, _ = time.isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def partition_bounds(key: str, period: str) -> tuple[datetime, datetime]:
+    """Start and end, exclusive, of the time covered by partition ``key``."""
+    if period == PARTITION_DAY:
+        start = datetime.strptime(key, "%Y-%m-%d")
+        return start, start + timedelta(days=1)
+    year, _, week = key.partition("-W")
+    start = datetime.fromisocalendar(int(year), int(week), 1)
+    return start, start + timedelta(weeks=1)
+
+
+class TelemetryPartitions:
+    """The partition files of a telemetry database and their controllers.
+
+    ``factory`` builds the controller of one partition from its storage
+    settings; controllers are opened on first use and kept open until the
+    partition is dropped or ``close`` is called. ``on_drop`` is called with
+    the key of every dropped partition.
+    """
+
+    def __init__(
+        self,
+        config: StorageConfig,
+        factory: Callable[[StorageConfig], T],
+        on_drop: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.config = config
+        self.period = config.partition
+        self.directory = Path(config.db_path).with_suffix(".partitions")
+        self.factory = factory
+        self.on_drop = on_drop
+        self._open: dict[str, T] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            config.partition_workers, thread_name_prefix="rth-partitions"
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{PARTITION_SUFFIX}"
+
+    def keys(self) -> list[str]:
+        """Keys of all stored partitions, oldest first."""
+        keys = set()
+        if self.directory.is_dir():
+            keys.update(
+                path.stem
+                for path in self.directory.iterdir()
+                if path.suffix == PARTITION_SUFFIX
+            )
+        with self._lock:
+            keys.update(self._open)
+        return sorted(keys, key=lambda key: partition_bounds(key, self.period)[0])
+
+    def covering(
+        self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None
+    ) -> list[str]:
+        """Keys of the stored partitions overlapping a time range, oldest first."""
+        keys = []
+        for key in self.keys():
+            start, end = partition_bounds(key, self.period)
+            if start_time is not None and end <= start_time:
+                continue
+            if end_time is not None and start > end_time:
+                continue
+            keys.append(key)
+        return keys
+
+    def bounds(self, key: str) -> tuple[datetime, datetime]:
+        return partition_bounds(key, self.period)
+
+    def key_for(self, time: datetime) -> str:
+        return partition_key(time, self.period)
+
+    def get(self, key: str) -> T:
+        """Controller of partition ``key``, creating the partition if needed."""
+        with self._lock:
+            controller = self._open.get(key)
+            if controller is None:
+                config = copy.copy(self.config)
+                config.db_path = str(self.path(key))
+                config.partition = None
+                controller = self._open[key] = self.factory(config)
+            return controller
+
+    def map(self, callback: Callable[[T], object], keys: Iterable[str]) -> list:
+        """Run ``callback`` on the controllers of ``keys`` in parallel, results in their order."""
+        controllers = [self.get(key) for key in keys]
+        if len(controllers) == 1:
+            return [callback(controllers[0])]
+        return list(self._executor.map(callback, controllers))
+
+    def size(self, key: str) -> int:
+        """Bytes taken by the files of partition ``key``."""
+        path = self.path(key)
+        size = 0
+        for suffix in ("", *_SIDECAR_SUFFIXES):
+            try:
+                size += os.path.getsize(f"{path}{suffix}")
+            except OSError:
+                continue
+        return size
+
+    def drop(self, key: str) -> None:
+        """Close partition ``key`` and delete its files."""
+        with self._lock:
+            controller = self._open.pop(key, None)
+        if controller is not None:
+            controller.shutdown()
+        path = self.path(key)
+        for suffix in ("", *_SIDECAR_SUFFIXES):
+            try:
+                os.remove(f"{path}{suffix}")
+            except FileNotFoundError:
+                continue
+        if self.on_drop is not None:
+            self.on_drop(key)
+        partition_log.info("Dropped telemetry partition %s", key)
+
+    def close(self) -> None:
+        """Close every open partition and stop the query threads."""
+        with self._lock:
+            controllers = list(self._open.values())
+            self._open.clear()
+        for controller in controllers:
+            controller.shutdown()
+        self._executor.shutdown(wait=True)
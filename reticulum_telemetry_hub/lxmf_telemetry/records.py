@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Optional
+
+from msgpack import unpackb
+
+
+class TelemetryRecord:
+    """A stored telemeter read without the ORM, its sensors left packed.
+
+    Responses and exports only need the stored payload, so reading these
+    skips the identity map, instance state and sensor loading that
+    ``Telemeter`` objects carry.
+    """
+
+    __slots__ = ("id", "peer_dest", "time", "packed")
+
+    def __init__(self, id: int, peer_dest: str, time: datetime, packed: Optional[bytes]) -> None:
+        self.id = id
+        self.peer_dest = peer_dest
+        self.time = time
+        self.packed = packed
+
+    @property
+    def tel_data(self) -> dict:
+        """The telemetry dict, sensor values keyed by SID."""
+        if self.packed is None:
+            return {}
+        return unpackb(self.packed, strict_map_key=False)
+
+    def __repr__(self) -> str:
+        return f"TelemetryRecord(id={self.id}, peer_dest={self.peer_dest!r}, time={self.time})"
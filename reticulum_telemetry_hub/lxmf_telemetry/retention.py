@@ -0,0 +1,447 @@
+"""Retention and downsampling of stored telemetry.
+
+A ``RetentionPolicy`` bounds the telemetry database by age, by rows per peer
+and by total size, and thins old data with downsampling tiers, e.g. keeping
+one telemeter per peer every 5 minutes once data is older than a day.
+``RetentionJob`` applies the policy when the hub's runtime runs it, deleting
+in small transactions so ingest can take the write lock in between. With
+partitioned storage, expired partitions are deleted as whole files.
+"""
+
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import Connection, Integer, and_, cast, func, or_, select
+
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+from reticulum_telemetry_hub.metrics import REGISTRY
+
+retention_log = get_logger("retention")
+
+DELETED_TELEMETERS = REGISTRY.counter(
+    "rth_retention_deleted_total", "Telemeters deleted by the retention job"
+)
+
+# Naive datetimes are stored as they are, bucketed as if they were UTC
+_EPOCH = datetime(1970, 1, 1)
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(value: str) -> timedelta:
+    """Parse durations like ``90s``, ``5m``, ``24h``, ``30d`` or ``2w``."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*", value)
+    if match is None:
+        raise ValueError(f"Invalid duration {value!r}, expected e.g. 5m, 24h or 30d")
+    return timedelta(seconds=float(match.group(1)) * _DURATION_UNITS[match.group(2)])
+
+
+def parse_tiers(value: str) -> list["DownsampleTier"]:
+    """Parse ``older_than=interval`` pairs, e.g. ``24h=5m,7d=1h``."""
+    tiers = []
+    for pair in filter(None, value.split(",")):
+        older_than, _, interval = pair.partition("=")
+        tiers.append(DownsampleTier(parse_duration(older_than), parse_duration(interval)))
+    return tiers
+
+
+class DownsampleTier:
+    """Keep one telemeter per peer and ``interval`` once older than ``older_than``.
+
+    The newest telemeter of every interval is the one kept.
+    """
+
+    def __init__(self, older_than: timedelta, interval: timedelta) -> None:
+        if interval.total_seconds() < 1 or interval.total_seconds() % 1:
+            raise ValueError("Downsampling intervals must be whole seconds")
+        self.older_than = older_than
+        self.interval = interval
+
+    def __repr__(self) -> str:
+        return f"DownsampleTier(older_than={self.older_than}, interval={self.interval})"
+
+
+class RetentionPolicy:
+    """Limits applied to the telemetry database.
+
+    Args:
+        max_age: Delete telemeters older than this.
+        max_rows_per_peer: Keep at most this many telemeters per peer.
+        max_bytes: Delete the oldest telemeters while the data in the
+            database file takes more than this many bytes.
+        tiers: Downsampling tiers applied to old data.
+        chunk_size: Telemeters deleted per transaction.
+        chunk_pause: Seconds to wait between two deleting transactions.
+        vacuum: Rebuild the database file after deleting, which returns the
+            freed space to the file system but blocks all writers while it runs.
+    """
+
+    def __init__(
+        self,
+        max_age: Optional[timedelta] = None,
+        max_rows_per_peer: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        tiers: Iterable[DownsampleTier] = (),
+        chunk_size: int = 500,
+        chunk_pause: float = 0.05,
+        vacuum: bool = False,
+    ) -> None:
+        self.max_age = max_age
+        self.max_rows_per_peer = max_rows_per_peer
+        self.max_bytes = max_bytes
+        self.tiers = sorted(tiers, key=lambda tier: tier.older_than)
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.vacuum = vacuum
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self.max_age is not None
+            or self.max_rows_per_peer is not None
+            or self.max_bytes is not None
+            or self.tiers
+        )
+
+
+class RetentionReport:
+    """What a retention run deleted and how much space it freed."""
+
+    def __init__(self) -> None:
+        self.deleted: dict[str, int] = {"downsampled": 0, "age": 0, "per_peer": 0, "size": 0}
+        self.used_bytes_before = 0
+        self.used_bytes_after = 0
+        self.file_bytes_before = 0
+        self.file_bytes_after = 0
+        self.seconds = 0.0
+
+    @property
+    def total_deleted(self) -> int:
+        return sum(self.deleted.values())
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        """Bytes of the database no longer used by data, free for reuse."""
+        return self.used_bytes_before - self.used_bytes_after
+
+    def as_dict(self) -> dict:
+        return {
+            "deleted": dict(self.deleted),
+            "total_deleted": self.total_deleted,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "used_bytes_before": self.used_bytes_before,
+            "used_bytes_after": self.used_bytes_after,
+            "file_bytes_before": self.file_bytes_before,
+            "file_bytes_after": self.file_bytes_after,
+            "seconds": self.seconds,
+        }
+
+
+def _database_bytes(conn: Connection) -> tuple[int, int]:
+    """Return the bytes used by data and the size of the database file."""
+    page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return (page_count - free_pages) * page_size, page_count * page_size
+
+
+def _epoch_seconds(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+def _align_down(value: datetime, seconds: float) -> datetime:
+    return _EPOCH + timedelta(seconds=math.floor(_epoch_seconds(value) / seconds) * seconds)
+
+
+class RetentionJob:
+    """Applies a ``RetentionPolicy`` to a controller's database.
+
+    ``run_once`` applies it once; the hub runs it every ``interval`` seconds
+    as a periodic task of its runtime.
+    """
+
+    # Downsampling scans the history one window of at least this size at a time
+    DOWNSAMPLE_WINDOW = timedelta(days=1)
+
+    def __init__(
+        self,
+        controller: TelemetryController,
+        policy: RetentionPolicy,
+        interval: float = 3600.0,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.controller = controller
+        self.policy = policy
+        self.interval = interval
+        self.clock = clock
+        self.last_report: Optional[RetentionReport] = None
+        self._stop = threading.Event()
+        # Held while a run is in progress, so stop can wait for it
+        self._running = threading.Lock()
+
+    def stop(self) -> None:
+        """Interrupt a run between two chunks and wait until it returned.
+
+        Later runs do nothing, so the database can be closed safely.
+        """
+        self._stop.set()
+        with self._running:
+            pass
+
+    def run_once(self, now: Optional[datetime] = None) -> RetentionReport:
+        """Apply the policy once and report what was deleted."""
+        with self._running:
+            if self._stop.is_set():
+                return RetentionReport()
+            return self._run_once(now or self.clock())
+
+    def _run_once(self, now: datetime) -> RetentionReport:
+        report = RetentionReport()
+        started = time.perf_counter()
+        if self.controller.partitions is not None:
+            self._apply_partitioned(report, now)
+        else:
+            self._apply(report, now)
+        report.seconds = time.perf_counter() - started
+        self.last_report = report
+        if report.total_deleted:
+            retention_log.info(
+                "Deleted %d telemeters in %.1f s, reclaimed %d KiB",
+                report.total_deleted,
+                report.seconds,
+                report.reclaimed_bytes // 1024,
+                **report.deleted,
+            )
+        return report
+
+    def _apply(self, report: RetentionReport, now: datetime) -> None:
+        policy = self.policy
+        engine = self.controller.storage.engine
+        with engine.connect() as conn:
+            report.used_bytes_before, report.file_bytes_before = _database_bytes(conn)
+
+        for tier in policy.tiers:
+            report.deleted["downsampled"] += self._downsample(tier, now)
+        if policy.max_age is not None:
+            cutoff = now - policy.max_age
+            report.deleted["age"] += self._delete_matching(
+                lambda: select(Telemeter.id).where(Telemeter.time < cutoff)
+            )
+        if policy.max_rows_per_peer is not None:
+            report.deleted["per_peer"] += self._trim_peers(policy.max_rows_per_peer)
+        if policy.max_bytes is not None:
+            report.deleted["size"] += self._trim_size(policy.max_bytes)
+
+        if policy.vacuum and report.total_deleted and not self._stop.is_set():
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+        with engine.connect() as conn:
+            report.used_bytes_after, report.file_bytes_after = _database_bytes(conn)
+
+    def _apply_partitioned(self, report: RetentionReport, now: datetime) -> None:
+        """Apply the policy to a partitioned database.
+
+        Partitions past the age or size limit are deleted as whole files, the
+        row limits then run within the remaining partitions, newest first.
+        """
+        partitions = self.controller.partitions
+        policy = self.policy
+        report.used_bytes_before, report.file_bytes_before = self._partition_bytes()
+
+        if policy.max_age is not None:
+            cutoff = now - policy.max_age
+            for key in partitions.keys():
+                if partitions.bounds(key)[1] <= cutoff:
+                    report.deleted["age"] += self._drop_partition(key)
+        if policy.max_bytes is not None:
+            keys = partitions.keys()
+            # The newest partition is trimmed row by row instead
+            while len(keys) > 1 and not self._stop.is_set():
+                if self._partition_bytes()[0] <= policy.max_bytes:
+                    break
+                report.deleted["size"] += self._drop_partition(keys.pop(0))
+
+        # Row limits that stay within one partition
+        row_policy = RetentionPolicy(
+            max_age=policy.max_age,
+            tiers=policy.tiers,
+            chunk_size=policy.chunk_size,
+            chunk_pause=policy.chunk_pause,
+            vacuum=policy.vacuum,
+        )
+        # Rows each peer may still keep in older partitions
+        remaining: dict[str, int] = {}
+        keys = partitions.keys()
+        for key in reversed(keys):
+            if self._stop.is_set():
+                break
+            job = RetentionJob(partitions.get(key), row_policy, clock=self.clock)
+            job._stop = self._stop
+            if policy.max_rows_per_peer is not None:
+                report.deleted["per_peer"] += job._trim_peers(
+                    policy.max_rows_per_peer, remaining
+                )
+            if key == keys[-1] and policy.max_bytes is not None:
+                report.deleted["size"] += job._trim_size(policy.max_bytes)
+            for reason, deleted in job.run_once(now).deleted.items():
+                report.deleted[reason] += deleted
+        report.used_bytes_after, report.file_bytes_after = self._partition_bytes()
+
+    def _partition_bytes(self) -> tuple[int, int]:
+        """Bytes used by data and taken by the files, summed over the partitions."""
+
+        def database_bytes(partition: TelemetryController) -> tuple[int, int]:
+            with partition.storage.engine.connect() as conn:
+                return _database_bytes(conn)
+
+        partitions = self.controller.partitions
+        sizes = partitions.map(database_bytes, partitions.keys())
+        return sum(used for used, _ in sizes), sum(size for _, size in sizes)
+
+    def _drop_partition(self, key: str) -> int:
+        """Delete a whole partition, returns how many telemeters it held."""
+        partitions = self.controller.partitions
+        with partitions.get(key).storage.engine.connect() as conn:
+            count = conn.scalar(select(func.count()).select_from(Telemeter))
+        partitions.drop(key)
+        DELETED_TELEMETERS.inc(count)
+        return count
+
+    def _delete_ids(self, ids: list[int]) -> int:
+        deleted = 0
+        for offset in range(0, len(ids), self.policy.chunk_size):
+            if self._stop.is_set():
+                break
+            deleted += self.controller.delete_telemeters(
+                ids[offset : offset + self.policy.chunk_size]
+            )
+            time.sleep(self.policy.chunk_pause)
+        DELETED_TELEMETERS.inc(deleted)
+        return deleted
+
+    def _delete_matching(self, query: Callable) -> int:
+        """Delete chunk by chunk the telemeters selected by ``query()``, oldest first."""
+        deleted = 0
+        engine = self.controller.storage.engine
+        while not self._stop.is_set():
+            with engine.connect() as conn:
+                ids = list(
+                    conn.scalars(
+                        query()
+                        .order_by(Telemeter.time, Telemeter.id)
+                        .limit(self.policy.chunk_size)
+                    )
+                )
+            if not ids:
+                break
+            chunk_deleted = self._delete_ids(ids)
+            deleted += chunk_deleted
+            if not chunk_deleted:
+                break
+        return deleted
+
+    def _trim_peers(self, max_rows: int, remaining: Optional[dict[str, int]] = None) -> int:
+        """Keep the newest ``max_rows`` telemeters of every peer.
+
+        Partitions are trimmed newest first sharing ``remaining``, the rows
+        each peer may still keep, which is updated with what this one holds.
+        """
+        engine = self.controller.storage.engine
+        query = select(Telemeter.peer_dest, func.count()).group_by(Telemeter.peer_dest)
+        if remaining is None:
+            query = query.having(func.count() > max_rows)
+        with engine.connect() as conn:
+            counts = conn.execute(query).all()
+        deleted = 0
+        for peer, count in counts:
+            keep = max_rows
+            if remaining is not None:
+                keep = remaining.get(peer, max_rows)
+                remaining[peer] = max(0, keep - count)
+            if count <= keep:
+                continue
+            with engine.connect() as conn:
+                # The newest telemeter past the limit, everything up to it goes
+                boundary = conn.execute(
+                    select(Telemeter.time, Telemeter.id)
+                    .where(Telemeter.peer_dest == peer)
+                    .order_by(Telemeter.time.desc(), Telemeter.id.desc())
+                    .offset(keep)
+                    .limit(1)
+                ).first()
+            if boundary is None:
+                continue
+            boundary_time, boundary_id = boundary
+            deleted += self._delete_matching(
+                lambda: select(Telemeter.id).where(
+                    Telemeter.peer_dest == peer,
+                    or_(
+                        Telemeter.time < boundary_time,
+                        and_(Telemeter.time == boundary_time, Telemeter.id <= boundary_id),
+                    ),
+                )
+            )
+        return deleted
+
+    def _trim_size(self, max_bytes: int) -> int:
+        engine = self.controller.storage.engine
+        deleted = 0
+        while not self._stop.is_set():
+            with engine.connect() as conn:
+                used_bytes, _ = _database_bytes(conn)
+                if used_bytes <= max_bytes:
+                    break
+                ids = list(
+                    conn.scalars(
+                        select(Telemeter.id)
+                        .order_by(Telemeter.time, Telemeter.id)
+                        .limit(self.policy.chunk_size)
+                    )
+                )
+            if not ids:
+                break
+            chunk_deleted = self._delete_ids(ids)
+            deleted += chunk_deleted
+            if not chunk_deleted:
+                break
+        return deleted
+
+    def _downsample(self, tier: DownsampleTier, now: datetime) -> int:
+        seconds = tier.interval.total_seconds()
+        cutoff = _align_down(now - tier.older_than, seconds)
+        engine = self.controller.storage.engine
+        with engine.connect() as conn:
+            oldest = conn.scalar(select(func.min(Telemeter.time)).where(Telemeter.time < cutoff))
+        if oldest is None:
+            return 0
+        # Windows are whole multiples of the interval so no bucket spans two
+        window = seconds * max(1, math.ceil(self.DOWNSAMPLE_WINDOW.total_seconds() / seconds))
+        # Whole seconds, julianday() is too coarse to land exactly on boundaries
+        bucket = cast(func.strftime("%s", Telemeter.time), Integer) // int(seconds)
+        deleted = 0
+        start = _align_down(oldest, window)
+        while start < cutoff and not self._stop.is_set():
+            end = min(start + timedelta(seconds=window), cutoff)
+            ranked = (
+                select(
+                    Telemeter.id,
+                    func.row_number()
+                    .over(
+                        partition_by=(Telemeter.peer_dest, bucket),
+                        order_by=(Telemeter.time.desc(), Telemeter.id.desc()),
+                    )
+                    .label("rank"),
+                )
+                .where(Telemeter.time >= start, Telemeter.time < end)
+                .subquery()
+            )
+            with engine.connect() as conn:
+                ids = list(conn.scalars(select(ranked.c.id).where(ranked.c.rank > 1)))
+            deleted += self._delete_ids(ids)
+            start = end
+        return deleted
@@ -0,0 +1,225 @@
+"""Table driven codecs for the sensor values carried in LXMF telemetry.
+
+Sideband packs each sensor as a msgpack value keyed by its SID. Most values
+are msgpack scalars or lists; location packs its integer scaled fields as
+big-endian binary which is handled with precompiled ``struct.Struct`` objects.
+Every codec turns a wire value into a dict of named fields and back.
+"""
+
+import struct
+from typing import Iterable, Optional
+
+import RNS
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import *
+
+
+class SensorCodec:
+    """Codec for a sensor whose wire value is a single msgpack scalar."""
+
+    def __init__(self, sid: int, name: str, fields: tuple[str, ...]) -> None:
+        self.sid = sid
+        self.name = name
+        self.fields = fields
+
+    def decode(self, packed) -> Optional[dict]:
+        if packed is None:
+            return None
+        return {self.fields[0]: packed}
+
+    def encode(self, values: dict):
+        return values.get(self.fields[0])
+
+
+class ListCodec(SensorCodec):
+    """Codec for a sensor packed as a fixed length list, e.g. ``[x, y, z]``."""
+
+    def decode(self, packed) -> Optional[dict]:
+        try:
+            return {field: packed[i] for i, field in enumerate(self.fields)}
+        except (TypeError, IndexError, KeyError):
+            return None
+
+    def encode(self, values: dict) -> list:
+        return [values.get(field) for field in self.fields]
+
+
+class EntriesCodec(SensorCodec):
+    """Codec for a sensor packed as a list of entries, each a fixed length list."""
+
+    def decode(self, packed) -> Optional[dict]:
+        try:
+            return {
+                "entries": [
+                    {field: entry[i] for i, field in enumerate(self.fields)}
+                    for entry in packed
+                ]
+            }
+        except (TypeError, IndexError, KeyError):
+            return None
+
+    def encode(self, values: dict) -> list:
+        return [
+            [entry.get(field) for field in self.fields]
+            for entry in values.get("entries", [])
+        ]
+
+
+class LocationCodec(SensorCodec):
+    """Codec for location, whose first six fields are binary packed integers."""
+
+    SCALED_FIELDS = ("latitude", "longitude", "altitude", "speed", "bearing", "accuracy")
+    DECIMALS = (6, 6, 2, 2, 2, 2)
+    # Precompiled per field formats, and all six fields concatenated
+    FIELD_STRUCTS = tuple(struct.Struct(fmt) for fmt in ("!i", "!i", "!I", "!I", "!I", "!H"))
+    RECORD_STRUCT = struct.Struct("!iiIIIH")
+
+    def __init__(self) -> None:
+        super().__init__(SID_LOCATION, "location", self.SCALED_FIELDS + ("last_update",))
+        self._scales = tuple(10**decimals for decimals in self.DECIMALS)
+
+    def decode(self, packed) -> Optional[dict]:
+        try:
+            latitude, longitude, altitude, speed, bearing, accuracy = (
+                self.RECORD_STRUCT.unpack(b"".join(packed[:6]))
+            )
+            last_update = packed[6]
+        except (struct.error, TypeError, IndexError):
+            return None
+        return {
+            "latitude": latitude / 1e6,
+            "longitude": longitude / 1e6,
+            "altitude": altitude / 1e2,
+            "speed": speed / 1e2,
+            "bearing": bearing / 1e2,
+            "accuracy": accuracy / 1e2,
+            "last_update": last_update,
+        }
+
+    def decode_raw(self, packed) -> Optional[tuple]:
+        """Return the integer scaled fields and timestamp without dividing them."""
+        try:
+            return self.RECORD_STRUCT.unpack(b"".join(packed[:6])) + (packed[6],)
+        except (struct.error, TypeError, IndexError):
+            return None
+
+    def encode(self, values: dict) -> Optional[list]:
+        try:
+            packed = [
+                field_struct.pack(int(round(values[field], decimals) * scale))
+                for field, decimals, scale, field_struct in zip(
+                    self.SCALED_FIELDS, self.DECIMALS, self._scales, self.FIELD_STRUCTS
+                )
+            ]
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            RNS.log(
+                "An error occurred while packing location sensor data. "
+                "The contained exception was: " + str(e),
+                RNS.LOG_ERROR,
+            )
+            return None
+        packed.append(values.get("last_update"))
+        return packed
+
+
+CODECS: dict[int, SensorCodec] = {}
+
+
+def register_codec(codec: SensorCodec) -> SensorCodec:
+    """Register ``codec`` for its SID, replacing any existing codec."""
+    CODECS[codec.sid] = codec
+    return codec
+
+
+LOCATION_CODEC = register_codec(LocationCodec())
+
+for _codec in (
+    SensorCodec(SID_TIME, "time", ("utc",)),
+    SensorCodec(SID_PRESSURE, "pressure", ("mbar",)),
+    ListCodec(SID_BATTERY, "battery", ("charge_percent", "charging", "temperature")),
+    ListCodec(SID_PHYSICAL_LINK, "physical_link", ("rssi", "snr", "q")),
+    ListCodec(SID_ACCELERATION, "acceleration", ("x", "y", "z")),
+    SensorCodec(SID_TEMPERATURE, "temperature", ("c",)),
+    SensorCodec(SID_HUMIDITY, "humidity", ("percent_relative",)),
+    ListCodec(SID_MAGNETIC_FIELD, "magnetic_field", ("x", "y", "z")),
+    SensorCodec(SID_AMBIENT_LIGHT, "ambient_light", ("lux",)),
+    ListCodec(SID_GRAVITY, "gravity", ("x", "y", "z")),
+    ListCodec(SID_ANGULAR_VELOCITY, "angular_velocity", ("x", "y", "z")),
+    SensorCodec(SID_PROXIMITY, "proximity", ("triggered",)),
+    SensorCodec(SID_INFORMATION, "information", ("contents",)),
+    ListCodec(
+        SID_RECEIVED, "received", ("by", "via", "geodesic_distance", "euclidian_distance")
+    ),
+    EntriesCodec(SID_POWER_CONSUMPTION, "power_consumption", ("label", "w", "custom_icon")),
+    EntriesCodec(SID_POWER_PRODUCTION, "power_production", ("label", "w", "custom_icon")),
+    EntriesCodec(SID_PROCESSOR, "processor", ("current_load", "load_avgs", "clock", "label")),
+    EntriesCodec(SID_RAM, "ram", ("capacity", "used", "label")),
+    EntriesCodec(SID_NVM, "nvm", ("capacity", "used", "label")),
+    EntriesCodec(SID_TANK, "tank", ("capacity", "level", "unit", "label", "custom_icon")),
+    EntriesCodec(SID_FUEL, "fuel", ("capacity", "level", "unit", "label", "custom_icon")),
+    EntriesCodec(SID_CUSTOM, "custom", ("label", "value", "custom_icon")),
+):
+    register_codec(_codec)
+
+
+def decode_telemetry(tel_data: dict) -> dict[int, dict]:
+    """Decode every known sensor of an unpacked telemetry dict.
+
+    Sensors without a codec or whose value cannot be decoded are left out.
+    """
+    decoded = {}
+    for sid, packed in tel_data.items():
+        codec = CODECS.get(sid)
+        if codec is None or packed is None:
+            continue
+        values = codec.decode(packed)
+        if values is not None:
+            decoded[sid] = values
+    return decoded
+
+
+def encode_telemetry(decoded: dict[int, dict]) -> dict:
+    """Inverse of ``decode_telemetry``, ready to be packed with msgpack."""
+    return {sid: CODECS[sid].encode(values) for sid, values in decoded.items()}
+
+
+class DecodedTelemeter:
+    """One entry of a telemetry stream, its sensors decoded on first use."""
+
+    __slots__ = ("peer_dest", "timestamp", "packed", "tel_data", "_sensors")
+
+    def __init__(self, peer_dest: str, timestamp, packed: bytes, tel_data: dict) -> None:
+        self.peer_dest = peer_dest
+        self.timestamp = timestamp
+        self.packed = packed
+        self.tel_data = tel_data
+        self._sensors: Optional[dict[int, dict]] = None
+
+    @property
+    def sensors(self) -> dict[int, dict]:
+        """Decoded sensors of the entry, as returned by ``decode_telemetry``."""
+        if self._sensors is None:
+            self._sensors = decode_telemetry(self.tel_data)
+        return self._sensors
+
+
+def decode_stream(entries: Iterable) -> list[DecodedTelemeter]:
+    """Decode a whole ``FIELD_TELEMETRY_STREAM`` in one pass.
+
+    Entries are ``[source hash, timestamp, packed telemetry, appearance]``;
+    malformed entries are skipped.
+    """
+    decoded = []
+    for entry in entries:
+        try:
+            source, timestamp, packed = entry[0], entry[1], entry[2]
+            peer_dest = source.hex()
+            tel_data = unpackb(packed, strict_map_key=False)
+        except Exception as e:
+            RNS.log(f"Skipping malformed telemetry stream entry: {e}", RNS.LOG_WARNING)
+            continue
+        if not isinstance(tel_data, dict):
+            continue
+        decoded.append(DecodedTelemeter(peer_dest, timestamp, packed, tel_data))
+    return decoded
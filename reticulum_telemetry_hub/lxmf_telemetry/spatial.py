@@ -0,0 +1,156 @@
+"""SQLite R*Tree index of where and when telemeters were recorded.
+
+Every telemeter carrying a location gets a point in a three dimensional
+R*Tree (latitude, longitude, time) keyed by the telemeter id. The R*Tree
+stores 32 bit floats rounded outwards, so it returns a superset of the
+matches; the exact coordinates are kept as auxiliary columns and the exact
+time on the telemeter, which callers use to filter the candidates.
+"""
+
+import math
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+import RNS
+from sqlalchemy import Connection, bindparam, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+SPATIAL_TABLE = "TelemeterLocation"
+EARTH_RADIUS_METERS = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180
+
+# Naive datetimes are indexed as if they were UTC, as in retention
+_EPOCH = datetime(1970, 1, 1)
+
+_CREATE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS "{SPATIAL_TABLE}" USING rtree('
+    "id, min_lat, max_lat, min_lon, max_lon, min_time, max_time, +latitude, +longitude)"
+)
+_INSERT = text(
+    f'INSERT OR REPLACE INTO "{SPATIAL_TABLE}" '
+    "VALUES (:id, :latitude, :latitude, :longitude, :longitude, :time, :time, "
+    ":latitude, :longitude)"
+)
+_DELETE = text(f'DELETE FROM "{SPATIAL_TABLE}" WHERE id IN :ids').bindparams(
+    bindparam("ids", expanding=True)
+)
+_QUERY = text(
+    f'SELECT id, latitude, longitude FROM "{SPATIAL_TABLE}" '
+    "WHERE max_lat >= :min_lat AND min_lat <= :max_lat "
+    "AND max_lon >= :min_lon AND min_lon <= :max_lon "
+    "AND max_time >= :start AND min_time <= :end"
+)
+
+
+def create_spatial_index(engine: Engine) -> bool:
+    """Create the R*Tree table if needed, False when SQLite lacks the R*Tree module."""
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(_CREATE)
+    except OperationalError as e:
+        RNS.log(f"Spatial telemetry index is not available: {e}", RNS.LOG_WARNING)
+        return False
+    return True
+
+
+def epoch_seconds(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+def index_locations(conn: Connection, rows: list[dict]) -> None:
+    """Index ``{"id", "latitude", "longitude", "time"}`` rows, time a datetime."""
+    if rows:
+        conn.execute(
+            _INSERT,
+            [dict(row, time=epoch_seconds(row["time"])) for row in rows],
+        )
+
+
+def delete_locations(conn: Connection, ids: list[int]) -> None:
+    if ids:
+        conn.execute(_DELETE, {"ids": list(ids)})
+
+
+def max_indexed_id(conn: Connection) -> int:
+    return conn.exec_driver_sql(f'SELECT max(id) FROM "{SPATIAL_TABLE}"').scalar() or 0
+
+
+def bbox_boxes(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> list[tuple[float, float, float, float]]:
+    """Split a bounding box crossing the antimeridian (``min_lon > max_lon``) in two."""
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def radius_boxes(
+    latitude: float, longitude: float, radius: float
+) -> list[tuple[float, float, float, float]]:
+    """Bounding boxes holding every point within ``radius`` meters."""
+    lat_delta = radius / METERS_PER_DEGREE
+    min_lat = max(-90.0, latitude - lat_delta)
+    max_lat = min(90.0, latitude + lat_delta)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if max_lat >= 90.0 or min_lat <= -90.0 or cos_lat <= 0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    lon_delta = lat_delta / cos_lat
+    if lon_delta >= 180.0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    min_lon = longitude - lon_delta
+    max_lon = longitude + lon_delta
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    return bbox_boxes(min_lat, min_lon, max_lat, max_lon)
+
+
+def distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(a)))
+
+
+def within_radius(latitude: float, longitude: float, radius: float) -> Callable:
+    """Filter of the points within ``radius`` meters, for ``radius_boxes`` candidates."""
+
+    def within(lat: float, lon: float) -> bool:
+        return distance(latitude, longitude, lat, lon) <= radius
+
+    return within
+
+
+def query_locations(
+    conn: Connection,
+    boxes: Iterable[tuple[float, float, float, float]],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+) -> list[tuple[int, float, float]]:
+    """Return ``(telemeter id, latitude, longitude)`` of points inside ``boxes``.
+
+    Points are matched on their exact coordinates; the time window is only
+    applied approximately and has to be checked on the telemeters.
+    """
+    start = epoch_seconds(start_time) if start_time else -math.inf
+    end = epoch_seconds(end_time) if end_time else math.inf
+    found = {}
+    for min_lat, min_lon, max_lat, max_lon in boxes:
+        for tel_id, latitude, longitude in conn.execute(
+            _QUERY,
+            {
+                "min_lat": min_lat,
+                "max_lat": max_lat,
+                "min_lon": min_lon,
+                "max_lon": max_lon,
+                "start": start,
+                "end": end,
+            },
+        ):
+            if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                found[tel_id] = (tel_id, latitude, longitude)
+    return list(found.values())
@@ -0,0 +1,295 @@
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import RNS
+from sqlalchemy import Connection, Table, create_engine, delete, event, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance import Base
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.peer import Peer  # noqa: F401, creates the table
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors import sensor_mapping  # noqa: F401, creates the sensor tables
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.subscriber import Subscriber  # noqa: F401, creates the table
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sync_cursor import SyncCursor  # noqa: F401, creates the table
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter_sensor import TelemeterSensor  # noqa: F401, creates the table
+from reticulum_telemetry_hub.lxmf_telemetry.spatial import (
+    SPATIAL_TABLE,
+    create_spatial_index,
+    delete_locations,
+)
+
+MEMORY_DB = ":memory:"
+
+# Sensors stored as joined-table rows, one per sensor plus a subclass row
+LAYOUT_JOINED = "joined"
+# Sensors decoded from the stored payload, with only their types indexed
+LAYOUT_COMPACT = "compact"
+LAYOUTS = (LAYOUT_JOINED, LAYOUT_COMPACT)
+
+# Telemetry split into one database file per day or ISO week
+PARTITION_DAY = "day"
+PARTITION_WEEK = "week"
+PARTITIONS = (PARTITION_DAY, PARTITION_WEEK)
+
+# Rows deleted per statement when removing duplicates during a migration
+_DELETE_BATCH = 500
+
+
+class StorageConfig:
+    """Settings for the telemetry database.
+
+    Args:
+        db_path: Path of the SQLite database file, or ``":memory:"``.
+        journal_mode: SQLite journal mode, WAL allows readers alongside a writer.
+        synchronous: SQLite synchronous level, NORMAL is safe with WAL.
+        mmap_size: Bytes of the database file to memory map.
+        cache_size: Page cache size, negative values are KiB as in SQLite.
+        busy_timeout: Milliseconds to wait on a locked database.
+        pool_size: Connections kept open for concurrent sessions.
+        max_overflow: Extra connections allowed above ``pool_size``.
+        layout: How sensors are stored, ``LAYOUT_JOINED`` or ``LAYOUT_COMPACT``.
+            Compact inserts faster and takes less space, but reads that need
+            sensor objects decode them from the payload and are no faster
+            than joined ones, so it only pays off when telemetry is mostly
+            written and sent on as stored.
+        spatial_index: Maintain the R*Tree index used by area queries.
+        partition: Store telemetry in one file per ``PARTITION_DAY`` or
+            ``PARTITION_WEEK`` next to ``db_path``, which keeps everything
+            else. ``None`` stores it in ``db_path``.
+        partition_workers: Threads querying partitions in parallel.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "telemetry.db",
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        mmap_size: int = 64 * 1024 * 1024,
+        cache_size: int = -16000,
+        busy_timeout: int = 5000,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        layout: str = LAYOUT_JOINED,
+        spatial_index: bool = True,
+        partition: Optional[str] = None,
+        partition_workers: int = 4,
+    ) -> None:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown storage layout {layout!r}, expected one of {LAYOUTS}")
+        if partition is not None and partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition period {partition!r}, expected one of {PARTITIONS}")
+        if partition is not None and db_path == MEMORY_DB:
+            raise ValueError("Partitioned storage needs a database file")
+        self.db_path = str(db_path)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.busy_timeout = busy_timeout
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.layout = layout
+        self.spatial_index = spatial_index
+        self.partition = partition
+        self.partition_workers = partition_workers
+
+    @property
+    def in_memory(self) -> bool:
+        return self.db_path == MEMORY_DB
+
+    @property
+    def compact(self) -> bool:
+        return self.layout == LAYOUT_COMPACT
+
+    @property
+    def url(self) -> str:
+        return "sqlite://" if self.in_memory else f"sqlite:///{self.db_path}"
+
+    def pragmas(self) -> dict:
+        pragmas = {
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "busy_timeout": self.busy_timeout,
+        }
+        if not self.in_memory:
+            pragmas = {"journal_mode": self.journal_mode, **pragmas}
+        return pragmas
+
+
+def migrate_schema(engine: Engine) -> None:
+    """Bring an existing telemetry database up to the current schema.
+
+    ``create_all`` only creates missing tables, so nullable columns and
+    indexes declared on tables that already exist in older ``telemetry.db``
+    files are added here. Indexes stored without the uniqueness they are
+    declared with, as in databases written before ingest skipped repeated
+    telemetry, are rebuilt after deleting the repeated rows. Statistics are
+    gathered only after adding an index, ``dispose`` keeps them fresh with
+    ``PRAGMA optimize``.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                )
+        created = False
+        for table in Base.metadata.sorted_tables:
+            stored = _stored_indexes(conn, table.name)
+            for index in table.indexes:
+                if index.name in stored and (stored[index.name] or not index.unique):
+                    continue
+                if index.unique:
+                    deleted = _delete_duplicates(conn, table, index.columns)
+                    if deleted:
+                        RNS.log(f"Removed {deleted} duplicate rows from {table.name}")
+                    conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+                index.create(conn)
+                created = True
+        if created:
+            # Without statistics the planner may keep ignoring the new index
+            conn.exec_driver_sql("ANALYZE")
+
+
+def _stored_indexes(conn: Connection, table_name: str) -> dict[str, bool]:
+    """Indexes stored on a table by name, with whether each is unique."""
+    rows = conn.exec_driver_sql(f'PRAGMA index_list("{table_name}")').all()
+    return {row[1]: bool(row[2]) for row in rows}
+
+
+def _delete_duplicates(conn: Connection, table: Table, columns) -> int:
+    """Delete rows repeating ``columns`` of an earlier row, returns how many."""
+    first = table.alias("first")
+    ids = conn.scalars(
+        select(table.c.id).where(
+            select(first.c.id)
+            .where(
+                *(first.c[column.name] == column for column in columns),
+                first.c.id < table.c.id,
+            )
+            .exists()
+        )
+    ).all()
+    for offset in range(0, len(ids), _DELETE_BATCH):
+        _delete_rows(conn, table, ids[offset : offset + _DELETE_BATCH])
+    return len(ids)
+
+
+def _delete_rows(conn: Connection, table: Table, ids: list[int]) -> None:
+    """Delete rows by id after the rows referencing them, e.g. a telemeter's sensors."""
+    for dependent in Base.metadata.sorted_tables:
+        for fk in dependent.foreign_keys:
+            if fk.column.table is not table or dependent is table:
+                continue
+            if "id" in dependent.c:
+                referencing = conn.scalars(
+                    select(dependent.c.id).where(fk.parent.in_(ids))
+                ).all()
+                _delete_rows(conn, dependent, referencing)
+            else:
+                conn.execute(delete(dependent).where(fk.parent.in_(ids)))
+    if table is Telemeter.__table__ and inspect(conn).has_table(SPATIAL_TABLE):
+        delete_locations(conn, ids)
+    conn.execute(delete(table).where(table.c.id.in_(ids)))
+
+
+class TelemetryStorage:
+    """Lazily created engine and session factory for the telemetry database."""
+
+    def __init__(self, config: Optional[StorageConfig] = None) -> None:
+        self.config = config or StorageConfig()
+        self.startup_seconds: Optional[float] = None
+        self.spatial_index = False
+        self._engine: Optional[Engine] = None
+        self._session_cls: Optional[sessionmaker] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._engine is not None
+
+    @property
+    def engine(self) -> Engine:
+        self._ensure_initialized()
+        return self._engine
+
+    def initialize(self) -> None:
+        """Open the database and bring its schema up to date, if not done yet."""
+        self._ensure_initialized()
+
+    def session(self) -> Session:
+        """Open a new session on the telemetry database."""
+        self._ensure_initialized()
+        return self._session_cls()
+
+    def dispose(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            if self._engine is not None:
+                with self._engine.connect() as conn:
+                    conn.exec_driver_sql("PRAGMA optimize")
+                self._engine.dispose()
+                self._engine = None
+                self._session_cls = None
+
+    def _ensure_initialized(self) -> None:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._initialize()
+
+    def _initialize(self) -> None:
+        started = time.perf_counter()
+        engine = self._create_engine()
+        Base.metadata.create_all(engine)
+        migrate_schema(engine)
+        if self.config.spatial_index:
+            self.spatial_index = create_spatial_index(engine)
+        self._session_cls = sessionmaker(bind=engine, expire_on_commit=False)
+        self._engine = engine
+        self.startup_seconds = time.perf_counter() - started
+        RNS.log(
+            f"Telemetry storage {self.config.db_path} ready in "
+            f"{self.startup_seconds * 1000:.1f} ms",
+            RNS.LOG_VERBOSE,
+        )
+
+    def _create_engine(self) -> Engine:
+        config = self.config
+        if config.in_memory:
+            engine = create_engine(
+                config.url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+            )
+        else:
+            Path(config.db_path).parent.mkdir(parents=True, exist_ok=True)
+            engine = create_engine(
+                config.url,
+                connect_args={"check_same_thread": False},
+                pool_size=config.pool_size,
+                max_overflow=config.max_overflow,
+            )
+        pragmas = config.pragmas()
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+        return engine
@@ -0,0 +1,149 @@
+import threading
+from datetime import datetime
+
+import LXMF
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sync_cursor import SyncCursor
+from reticulum_telemetry_hub.lxmf_telemetry.storage import TelemetryStorage
+
+_CURSORS = SyncCursor.__table__
+
+
+class _PendingResponse:
+    """Messages of one incremental response waiting for delivery proofs."""
+
+    __slots__ = ("marks", "delivered", "generation")
+
+    def __init__(self, marks: list[dict[str, int]], generation: int) -> None:
+        self.marks = marks
+        self.delivered = [False] * len(marks)
+        # Partitions dropped after this are not advanced by the response
+        self.generation = generation
+
+
+class SyncCursors:
+    """Per requester high-water marks of the telemetry delivered to them.
+
+    A response is a sequence of messages holding telemeters in id order, each
+    with the id of its last telemeter as its mark. The cursor of a requester
+    moves to a message's mark once that message and all messages before it
+    in the response are delivered, so lost messages are sent again by the
+    next incremental request.
+
+    Partitioned storage numbers telemeters per partition, so requesters have
+    one cursor per partition, named by ``partition_cursor``. Ids restart
+    when a dropped partition is created again, so its cursors are dropped
+    with it.
+    """
+
+    def __init__(self, storage: TelemetryStorage) -> None:
+        self.storage = storage
+        self._cursors: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Generation at which each partition was last dropped
+        self._dropped: dict[str, int] = {}
+
+    @staticmethod
+    def partition_cursor(requester: str, partition: str) -> str:
+        return f"{requester}@{partition}"
+
+    def get(self, requester: str) -> int:
+        """Id of the newest telemeter delivered to ``requester``, 0 if none."""
+        with self._lock:
+            if requester in self._cursors:
+                return self._cursors[requester]
+        with self.storage.engine.connect() as conn:
+            stored = conn.scalar(
+                select(_CURSORS.c.telemeter_id).where(_CURSORS.c.requester == requester)
+            )
+        with self._lock:
+            return self._cursors.setdefault(requester, stored or 0)
+
+    def advance(self, requester: str, telemeter_id: int) -> None:
+        """Move the cursor of ``requester`` forward to ``telemeter_id``."""
+        with self._lock:
+            if telemeter_id <= self._cursors.get(requester, 0):
+                return
+            self._cursors[requester] = telemeter_id
+        statement = insert(_CURSORS).values(
+            requester=requester, telemeter_id=telemeter_id, updated=datetime.now()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[_CURSORS.c.requester],
+            set_={
+                "telemeter_id": func.max(
+                    _CURSORS.c.telemeter_id, statement.excluded.telemeter_id
+                ),
+                "updated": statement.excluded.updated,
+            },
+        )
+        with self.storage.engine.begin() as conn:
+            conn.execute(statement)
+
+    def reset(self, requester: str) -> None:
+        """Forget what was delivered to ``requester``, in every partition."""
+        prefix = self.partition_cursor(requester, "")
+        with self._lock:
+            for cursor in list(self._cursors):
+                if cursor == requester or cursor.startswith(prefix):
+                    del self._cursors[cursor]
+        with self.storage.engine.begin() as conn:
+            conn.execute(
+                delete(_CURSORS).where(
+                    or_(
+                        _CURSORS.c.requester == requester,
+                        _CURSORS.c.requester.startswith(prefix, autoescape=True),
+                    )
+                )
+            )
+
+    def drop_partition(self, partition: str) -> None:
+        """Forget every requester's cursor of ``partition``."""
+        suffix = self.partition_cursor("", partition)
+        with self._lock:
+            self._generation += 1
+            self._dropped[suffix] = self._generation
+            for cursor in list(self._cursors):
+                if cursor.endswith(suffix):
+                    del self._cursors[cursor]
+        with self.storage.engine.begin() as conn:
+            conn.execute(
+                delete(_CURSORS).where(_CURSORS.c.requester.endswith(suffix, autoescape=True))
+            )
+
+    def track(self, messages: list[LXMF.LXMessage], marks: list[dict[str, int]]) -> None:
+        """Advance cursors as the messages of a response are delivered.
+
+        ``marks`` holds, per message, the cursors it moves and their new ids.
+        """
+        with self._lock:
+            pending = _PendingResponse(marks, self._generation)
+        for index, message in enumerate(messages):
+            message.register_delivery_callback(
+                lambda delivered, index=index: self._delivered(pending, index, delivered)
+            )
+
+    def _delivered(
+        self, pending: _PendingResponse, index: int, message: LXMF.LXMessage
+    ) -> None:
+        # Also called when a message only reached a propagation node
+        if message.state != LXMF.LXMessage.DELIVERED:
+            return
+        with self._lock:
+            pending.delivered[index] = True
+            acknowledged = 0
+            while acknowledged < len(pending.marks) and pending.delivered[acknowledged]:
+                acknowledged += 1
+            dropped = [
+                suffix
+                for suffix, generation in self._dropped.items()
+                if generation > pending.generation
+            ]
+        if acknowledged:
+            for cursor, telemeter_id in pending.marks[acknowledged - 1].items():
+                # Ids sent from a partition dropped since are no longer valid
+                if not any(cursor.endswith(suffix) for suffix in dropped):
+                    self.advance(cursor, telemeter_id)
@@ -1,106 +1,1292 @@
-from typing import Optional
+import itertools
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable, Iterator, Optional, Union
 from datetime import datetime
 import LXMF
 import RNS
 from msgpack import packb, unpackb
+from reticulum_telemetry_hub.destinations import DestinationCache
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.metrics import REGISTRY
+from reticulum_telemetry_hub.lxmf_telemetry import spatial
+from reticulum_telemetry_hub.lxmf_telemetry.bloom import BloomFilter
+from reticulum_telemetry_hub.lxmf_telemetry.ingest_queue import TelemetryIngestQueue
 from reticulum_telemetry_hub.lxmf_telemetry.model.persistance import Base
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.location import Location
 from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
 from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter_sensor import TelemeterSensor
 
-from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_mapping import sid_mapping
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session, joinedload
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_mapping import sensor_class
+from reticulum_telemetry_hub.lxmf_telemetry.partitions import TelemetryPartitions
+from reticulum_telemetry_hub.lxmf_telemetry.records import TelemetryRecord
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC, decode_stream
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig, TelemetryStorage
+from reticulum_telemetry_hub.lxmf_telemetry.sync_cursors import SyncCursors
+from reticulum_telemetry_hub.lxmf_telemetry.track_codec import (
+    STREAM_APPEARANCE,
+    TRACK_CUSTOM_TYPE,
+    StreamChunk,
+    decode_track,
+    stream_chunk,
+)
+from sqlalchemy import Connection, Select, and_, delete, func, insert, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-_engine = create_engine("sqlite:///telemetry.db")
-Base.metadata.create_all(_engine)
-Session_cls = sessionmaker(bind=_engine)
+telemetry_log = get_logger("telemetry")
+
+COMMIT_SECONDS = REGISTRY.histogram(
+    "rth_telemetry_commit_seconds", "Seconds spent writing one batch of telemeters"
+)
+SAVED_TELEMETERS = REGISTRY.counter(
+    "rth_telemeters_saved_total", "Telemeters committed to the database"
+)
+DUPLICATE_TELEMETERS = REGISTRY.counter(
+    "rth_telemeters_duplicate_total", "Telemeters skipped because they were already stored"
+)
+QUERY_SECONDS = REGISTRY.histogram(
+    "rth_telemetry_query_seconds", "Seconds spent in get_telemetry"
+)
+QUERY_ROWS = REGISTRY.counter(
+    "rth_telemetry_query_rows_total", "Telemeters returned by get_telemetry"
+)
+RESPONSE_SECONDS = REGISTRY.histogram(
+    "rth_telemetry_response_seconds", "Seconds spent building telemetry responses"
+)
 
 
 class TelemetryController:
     """This class is responsible for managing the telemetry data."""
 
     TELEMETRY_REQUEST = 1
+    # Optional keys of a telemetry request command
+    TELEMETRY_MAX_BYTES = "max_bytes"  # byte budget per response message
+    TELEMETRY_BEFORE = "before"  # continuation marker from a previous response
+    # Response encoding, "track" delta encodes the stream (see track_codec);
+    # clients that do not ask get plain FIELD_TELEMETRY_STREAM entries
+    TELEMETRY_ENCODING = "encoding"
+    # Only send telemetry stored since the last delivered incremental
+    # response, oldest first; "reset" forgets what was delivered before
+    TELEMETRY_INCREMENTAL = "incremental"
+    TELEMETRY_RESET = "reset"
+    # Area request, answered with the telemetry recorded inside an area:
+    # {"area": {"bbox": [min_lat, min_lon, max_lat, max_lon]}} or
+    # {"area": {"center": [lat, lon], "radius": meters}}, optionally with
+    # "since"/"until" timestamps, "latest" for the newest entry per peer and
+    # "max_bytes"/"before" as for telemetry requests
+    TELEMETRY_AREA = "area"
+    # Key of the FIELD_RESULTS reply to a request that could not be parsed
+    TELEMETRY_ERROR = "error"
+
+    DEFAULT_MAX_STREAM_MESSAGES = 8
+    # Range a client supplied "max_bytes" is clamped to
+    MIN_CHUNK_BYTES = 256
+    MAX_CHUNK_BYTES = 256 * 1024
+    # Keys the duplicate filter is sized for before it is rebuilt larger
+    DEFAULT_DEDUPE_CAPACITY = 1_000_000
+    # Smaller per partition, most of them are never written to again
+    PARTITION_DEDUPE_CAPACITY = 100_000
+    # Columns read into TelemetryRecord objects
+    RECORD_COLUMNS = (Telemeter.id, Telemeter.peer_dest, Telemeter.time, Telemeter.packed)
+
+    def __init__(
+        self,
+        storage_config: Optional[StorageConfig] = None,
+        stream_chunk_bytes: Optional[int] = None,
+        max_stream_messages: int = DEFAULT_MAX_STREAM_MESSAGES,
+        destinations: Optional[DestinationCache] = None,
+        dedupe_capacity: int = DEFAULT_DEDUPE_CAPACITY,
+    ) -> None:
+        """
+        Args:
+            storage_config: Telemetry database settings.
+            stream_chunk_bytes: Split telemetry responses into messages of at
+                most this many bytes of stream entries, newest data first.
+                ``None`` answers with a single message holding everything.
+            max_stream_messages: Messages sent per chunked request before the
+                client has to ask for more using the continuation marker.
+            destinations: Cache of reply destinations, shared with the hub.
+            dedupe_capacity: Keys the duplicate filter is first sized for.
+        """
+        self.storage = TelemetryStorage(storage_config)
+        self.stream_chunk_bytes = stream_chunk_bytes
+        self.max_stream_messages = max_stream_messages
+        self.destinations = destinations if destinations is not None else DestinationCache()
+        self.dedupe_capacity = dedupe_capacity
+        self.sync_cursors = SyncCursors(self.storage)
+        # Telemetry lives in the partitions, the main database keeps the rest
+        self.partitions: Optional[TelemetryPartitions] = None
+        if self.storage.config.partition is not None:
+            self.partitions = TelemetryPartitions(
+                self.storage.config,
+                self._partition_controller,
+                on_drop=self.sync_cursors.drop_partition,
+            )
+        self._ingest_queue: Optional[TelemetryIngestQueue] = None
+        self._seen: Optional[BloomFilter] = None
+        self._seen_lock = threading.Lock()
+
+    def enable_batch_ingest(
+        self,
+        max_batch_size: int = 256,
+        max_batch_age: float = 0.5,
+        max_pending: int = 4096,
+        put_timeout: Optional[float] = None,
+    ) -> TelemetryIngestQueue:
+        """Route saved telemetry through a write-behind queue with group commit."""
+        if self._ingest_queue is None:
+            self._ingest_queue = TelemetryIngestQueue(
+                self._write_telemeters,
+                max_batch_size=max_batch_size,
+                max_batch_age=max_batch_age,
+                max_pending=max_pending,
+                put_timeout=put_timeout,
+            )
+            self._ingest_queue.start()
+        return self._ingest_queue
+
+    @property
+    def ingest_queue(self) -> Optional[TelemetryIngestQueue]:
+        return self._ingest_queue
+
+    def flush(self) -> None:
+        """Wait until all queued telemetry has been committed."""
+        if self._ingest_queue is not None:
+            self._ingest_queue.flush()
 
-    def __init__(self) -> None:
-        pass
+    def shutdown(self) -> None:
+        """Commit any queued telemetry and stop the ingest queue."""
+        if self._ingest_queue is not None:
+            self._ingest_queue.stop()
+            self._ingest_queue = None
+        if self.partitions is not None:
+            self.partitions.close()
+        self.storage.dispose()
+
+    def _partition_controller(self, config: StorageConfig) -> "TelemetryController":
+        return TelemetryController(
+            config,
+            self.stream_chunk_bytes,
+            self.max_stream_messages,
+            self.destinations,
+            dedupe_capacity=self.PARTITION_DEDUPE_CAPACITY,
+        )
 
     def get_telemetry(
-        self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        peer_dest: Optional[Union[str, Iterable[str]]] = None,
+        sids: Optional[Iterable[int]] = None,
     ) -> list[Telemeter]:
-        """Get the telemetry data."""
-        with Session_cls() as ses:
-            query = ses.query(Telemeter)
-            if start_time:
-                query = query.filter(Telemeter.time >= start_time)
-            if end_time:
-                query = query.filter(Telemeter.time <= end_time)
-            tels = query.options(joinedload(Telemeter.sensors)).all()
+        """Get the telemetry data.
+
+        Args:
+            start_time: Only return telemeters recorded at or after this time.
+            end_time: Only return telemeters recorded at or before this time.
+            peer_dest: Restrict to one or more peer destination hashes.
+            sids: Only return telemeters carrying at least one of these sensor types.
+        """
+        if self.partitions is not None:
+            # Partitions hold disjoint time ranges, so their results stay in order
+            results = self.partitions.map(
+                lambda partition: partition.get_telemetry(start_time, end_time, peer_dest, sids),
+                self.partitions.covering(start_time, end_time),
+            )
+            return list(itertools.chain.from_iterable(results))
+        query = self._telemetry_query(start_time, end_time, peer_dest, sids)
+        with QUERY_SECONDS.time(), self.storage.session() as ses:
+            tels = ses.scalars(self._load_sensors(query)).unique().all()
+            if self.storage.config.compact:
+                for tel in tels:
+                    self._attach_sensors(tel)
+        QUERY_ROWS.inc(len(tels))
+        return list(tels)
+
+    def iter_telemetry(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        peer_dest: Optional[Union[str, Iterable[str]]] = None,
+        sids: Optional[Iterable[int]] = None,
+        newest_first: bool = False,
+        before: Optional[tuple[datetime, int]] = None,
+        batch_size: int = 500,
+        with_sensors: bool = True,
+    ) -> Iterator[Telemeter]:
+        """Stream telemeters from the database in batches of ``batch_size`` rows.
+
+        ``before`` is a ``(time, id)`` pair; only telemeters ordered before it
+        are returned, which is how chunked responses are continued. With
+        ``with_sensors`` False sensors are only loaded on access, which callers
+        that use ``Telemeter.packed`` never need.
+        """
+        if self.partitions is not None:
+            keys = self.partitions.covering(start_time, end_time)
+            for key in reversed(keys) if newest_first else keys:
+                yield from self.partitions.get(key).iter_telemetry(
+                    start_time,
+                    end_time,
+                    peer_dest,
+                    sids,
+                    newest_first,
+                    before,
+                    batch_size,
+                    with_sensors,
+                )
+            return
+        query = self._telemetry_query(
+            start_time, end_time, peer_dest, sids, newest_first, before
+        )
+        compact = self.storage.config.compact
+        if with_sensors:
+            query = self._load_sensors(query)
+        with self.storage.session() as ses:
+            for tel in ses.scalars(query.execution_options(yield_per=batch_size)):
+                if with_sensors and compact:
+                    self._attach_sensors(tel)
+                yield tel
+
+    def iter_records(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        peer_dest: Optional[Union[str, Iterable[str]]] = None,
+        sids: Optional[Iterable[int]] = None,
+        newest_first: bool = False,
+        before: Optional[tuple[datetime, int]] = None,
+        batch_size: int = 500,
+    ) -> Iterator[TelemetryRecord]:
+        """Stream telemeters like ``iter_telemetry`` as ``TelemetryRecord`` objects.
+
+        Rows are read with Core in batches of ``batch_size``, so memory does
+        not grow with the number of telemeters returned.
+        """
+        if self.partitions is not None:
+            keys = self.partitions.covering(start_time, end_time)
+            for key in reversed(keys) if newest_first else keys:
+                yield from self.partitions.get(key).iter_records(
+                    start_time, end_time, peer_dest, sids, newest_first, before, batch_size
+                )
+            return
+        query = self._telemetry_query(
+            start_time, end_time, peer_dest, sids, newest_first, before, self.RECORD_COLUMNS
+        )
+        with self.storage.engine.connect() as conn:
+            yield from self._records(conn, query, batch_size)
+
+    def _records(
+        self, conn: Connection, query: Select, batch_size: int = 500
+    ) -> Iterator[TelemetryRecord]:
+        """Run a ``RECORD_COLUMNS`` query and stream its rows as records."""
+        result = conn.execution_options(yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            legacy = [row.id for row in rows if row.packed is None]
+            payloads = self._legacy_payloads(conn, legacy) if legacy else {}
+            for row in rows:
+                yield TelemetryRecord(
+                    row.id, row.peer_dest, row.time, payloads.get(row.id, row.packed)
+                )
+
+    def _legacy_payloads(self, conn: Connection, ids: list[int]) -> dict[int, bytes]:
+        """Payloads of joined rows stored before payloads were kept, from their sensors."""
+        with Session(bind=conn) as ses:
+            tels = ses.scalars(
+                select(Telemeter)
+                .where(Telemeter.id.in_(ids))
+                .options(selectinload(Telemeter.sensors))
+            )
+            return {tel.id: packb(self._serialize_telemeter(tel)) for tel in tels}
+
+    def get_telemetry_in_area(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        latest_per_peer: bool = False,
+        with_sensors: bool = True,
+    ) -> list[Telemeter]:
+        """Get telemeters whose location lies inside a bounding box, newest first.
+
+        A box with ``min_lon`` greater than ``max_lon`` crosses the
+        antimeridian. With ``latest_per_peer`` only the newest matching
+        telemeter of every peer is returned. Without ``with_sensors``
+        ``TelemetryRecord`` objects are returned instead of telemeters.
+        """
+        return self._spatial_telemetry(
+            spatial.bbox_boxes(min_lat, min_lon, max_lat, max_lon),
+            start_time,
+            end_time,
+            latest_per_peer,
+            with_sensors,
+        )
+
+    def get_telemetry_near(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        latest_per_peer: bool = False,
+        with_sensors: bool = True,
+    ) -> list[Telemeter]:
+        """Get telemeters located within ``radius`` meters of a point, newest first.
+
+        Returns ``TelemetryRecord`` objects without ``with_sensors``.
+        """
+        return self._spatial_telemetry(
+            spatial.radius_boxes(latitude, longitude, radius),
+            start_time,
+            end_time,
+            latest_per_peer,
+            with_sensors,
+            spatial.within_radius(latitude, longitude, radius),
+        )
+
+    def _spatial_telemetry(
+        self,
+        boxes: list,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        latest_per_peer: bool,
+        with_sensors: bool,
+        within=None,
+        batch_size: int = 500,
+    ) -> list[Telemeter]:
+        if not with_sensors:
+            with QUERY_SECONDS.time():
+                records = list(
+                    self._spatial_records(
+                        boxes, start_time, end_time, latest_per_peer, within, batch_size=batch_size
+                    )
+                )
+            QUERY_ROWS.inc(len(records))
+            return records
+        if self.partitions is not None:
+            results = self.partitions.map(
+                lambda partition: partition._spatial_telemetry(
+                    boxes, start_time, end_time, False, with_sensors, within, batch_size
+                ),
+                self.partitions.covering(start_time, end_time),
+            )
+            tels = list(itertools.chain.from_iterable(reversed(results)))
+            if latest_per_peer:
+                seen = set()
+                tels = [
+                    tel
+                    for tel in tels
+                    if tel.peer_dest not in seen and not seen.add(tel.peer_dest)
+                ]
             return tels
+        if not self.storage.spatial_index:
+            raise RuntimeError("The spatial telemetry index is not available")
+        with QUERY_SECONDS.time(), self.storage.session() as ses:
+            candidates = spatial.query_locations(
+                ses.connection(), boxes, start_time, end_time
+            )
+            ids = [
+                tel_id
+                for tel_id, lat, lon in candidates
+                if within is None or within(lat, lon)
+            ]
+            tels: list[Telemeter] = []
+            for offset in range(0, len(ids), batch_size):
+                query = self._telemetry_query(start_time, end_time).where(
+                    Telemeter.id.in_(ids[offset : offset + batch_size])
+                )
+                tels.extend(ses.scalars(self._load_sensors(query)))
+            tels.sort(key=lambda tel: (tel.time, tel.id), reverse=True)
+            if latest_per_peer:
+                seen = set()
+                tels = [
+                    tel
+                    for tel in tels
+                    if tel.peer_dest not in seen and not seen.add(tel.peer_dest)
+                ]
+            if self.storage.config.compact:
+                for tel in tels:
+                    self._attach_sensors(tel)
+        QUERY_ROWS.inc(len(tels))
+        return tels
+
+    def _spatial_records(
+        self,
+        boxes: list,
+        start_time: Optional[datetime],
+        end_time: Optional[datetime],
+        latest_per_peer: bool,
+        within=None,
+        before: Optional[tuple[datetime, int]] = None,
+        seen: Optional[set] = None,
+        batch_size: int = 500,
+    ) -> Iterator[TelemetryRecord]:
+        """Stream the telemeters located inside ``boxes`` as records, newest first.
+
+        Only the time, id and peer of the candidates are held in memory;
+        payloads are read a batch at a time as the records are consumed.
+        ``seen`` holds the peers already returned with ``latest_per_peer``,
+        shared by the partitions. ``before`` applies after ``latest_per_peer``
+        so continued responses do not send peers again.
+        """
+        if latest_per_peer and seen is None:
+            seen = set()
+        if self.partitions is not None:
+            for key in reversed(self.partitions.covering(start_time, end_time)):
+                # Newer partitions still decide which rows are the latest
+                if not latest_per_peer and before is not None:
+                    if self.partitions.bounds(key)[0] > before[0]:
+                        continue
+                yield from self.partitions.get(key)._spatial_records(
+                    boxes, start_time, end_time, latest_per_peer, within, before, seen, batch_size
+                )
+            return
+        if not self.storage.spatial_index:
+            raise RuntimeError("The spatial telemetry index is not available")
+        with self.storage.engine.connect() as conn:
+            ids = [
+                tel_id
+                for tel_id, lat, lon in spatial.query_locations(conn, boxes, start_time, end_time)
+                if within is None or within(lat, lon)
+            ]
+            keys = []
+            for offset in range(0, len(ids), batch_size):
+                columns = (Telemeter.time, Telemeter.id, Telemeter.peer_dest)
+                query = self._telemetry_query(start_time, end_time, columns=columns).where(
+                    Telemeter.id.in_(ids[offset : offset + batch_size])
+                )
+                keys.extend(conn.execute(query))
+            keys.sort(key=lambda key: (key[0], key[1]), reverse=True)
+            if latest_per_peer:
+                keys = [
+                    key for key in keys if key[2] not in seen and not seen.add(key[2])
+                ]
+            if before is not None:
+                keys = [key for key in keys if (key[0], key[1]) < before]
+            for offset in range(0, len(keys), batch_size):
+                query = self._telemetry_query(
+                    newest_first=True, columns=self.RECORD_COLUMNS
+                ).where(Telemeter.id.in_([key[1] for key in keys[offset : offset + batch_size]]))
+                yield from self._records(conn, query, batch_size)
+
+    def _load_sensors(self, query: Select) -> Select:
+        """Add the sensor loading strategy matching the storage layout."""
+        if self.storage.config.compact:
+            # Sensors are decoded from the payload by _attach_sensors instead
+            return query
+        return query.options(selectinload(Telemeter.sensors))
+
+    def _attach_sensors(self, tel: Telemeter) -> None:
+        """Decode the sensors of a compact telemeter without marking it dirty."""
+        sensors = []
+        if tel.packed is not None:
+            sensors = self._build_sensors(unpackb(tel.packed, strict_map_key=False))
+        set_committed_value(tel, "sensors", sensors)
+
+    def _telemetry_query(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        peer_dest: Optional[Union[str, Iterable[str]]] = None,
+        sids: Optional[Iterable[int]] = None,
+        newest_first: bool = False,
+        before: Optional[tuple[datetime, int]] = None,
+        columns: Optional[tuple] = None,
+    ) -> Select:
+        """Build the telemeter query so it can be served by the time/peer indexes.
+
+        ``columns`` selects those columns instead of ``Telemeter`` objects.
+        """
+        query = select(*columns) if columns is not None else select(Telemeter)
+        if peer_dest is not None:
+            if isinstance(peer_dest, str):
+                query = query.where(Telemeter.peer_dest == peer_dest)
+            else:
+                query = query.where(Telemeter.peer_dest.in_(list(peer_dest)))
+        if start_time:
+            query = query.where(Telemeter.time >= start_time)
+        if end_time:
+            query = query.where(Telemeter.time <= end_time)
+        if sids is not None:
+            if self.storage.config.compact:
+                sensor_query = select(TelemeterSensor.sid).where(
+                    TelemeterSensor.telemeter_id == Telemeter.id,
+                    TelemeterSensor.sid.in_(list(sids)),
+                )
+            else:
+                sensor_query = select(Sensor.id).where(
+                    Sensor.telemeter_id == Telemeter.id, Sensor.sid.in_(list(sids))
+                )
+            query = query.where(sensor_query.exists())
+        if before is not None:
+            before_time, before_id = before
+            query = query.where(
+                or_(
+                    Telemeter.time < before_time,
+                    and_(Telemeter.time == before_time, Telemeter.id < before_id),
+                )
+            )
+        if newest_first:
+            return query.order_by(Telemeter.time.desc(), Telemeter.id.desc())
+        return query.order_by(Telemeter.time)
+
+    def save_telemetry(
+        self, telemetry_data: dict, peer_dest, packed: Optional[bytes] = None
+    ) -> None:
+        """Save the telemetry data.
 
-    def save_telemetry(self, telemetry_data: dict, peer_dest) -> None:
-        """Save the telemetry data."""
-        tel = self._deserialize_telemeter(telemetry_data, peer_dest)
-        with Session_cls() as ses:
-            ses.add(tel)
+        ``packed`` is the msgpack encoding ``telemetry_data`` was decoded from,
+        kept so the telemetry can be sent on without re-serializing it. The
+        telemetry is recorded at the time of its time sensor, else now.
+        """
+        tel = self._deserialize_telemeter(
+            telemetry_data, peer_dest, packed, self._source_time(telemetry_data.get(SID_TIME))
+        )
+        self.save_telemeters([tel])
+
+    def save_telemeters(self, tels: list[Telemeter]) -> None:
+        """Save already deserialized telemeters, queued if batch ingest is enabled."""
+        if self._ingest_queue is not None and self._ingest_queue.running:
+            for tel in tels:
+                if not self._ingest_queue.put(tel):
+                    RNS.log(f"Telemetry from {tel.peer_dest} was not queued", RNS.LOG_ERROR)
+            return
+        self._write_telemeters(tels)
+
+    def write_telemeters(self, tels: list) -> int:
+        """Bulk write telemeters now, bypassing the ingest queue, e.g. for an import.
+
+        ``tels`` may also be importer records carrying their sensor rows.
+        The database schema is brought up to date first, as the bulk insert
+        relies on the unique peer and time index. Returns how many were
+        written, telemeters already stored are skipped.
+        """
+        self.storage.initialize()
+        return self._write_telemeters(tels)
+
+    def _write_telemeters(self, tels: list[Telemeter]) -> int:
+        """Write a batch of telemeters in a single transaction.
+
+        Telemeters already stored for the same peer and time are skipped.
+        Returns how many were written.
+        """
+        if self.partitions is not None:
+            by_partition = defaultdict(list)
+            for tel in tels:
+                by_partition[self.partitions.key_for(tel.time)].append(tel)
+            return sum(
+                self.partitions.get(key)._write_telemeters(batch)
+                for key, batch in by_partition.items()
+            )
+        with COMMIT_SECONDS.time(), self.storage.session() as ses:
+            if self.storage.config.compact:
+                new = self._new_telemeters(ses, tels)
+                new, ids = self._write_compact(ses, new)
+            elif tels and not isinstance(tels[0], Telemeter):
+                # Imported records carrying the column values of their sensors
+                new = self._new_telemeters(ses, tels)
+                new, ids = self._write_sensor_rows(ses, new)
+            else:
+                try:
+                    new = self._new_telemeters(ses, tels)
+                    ses.add_all(new)
+                    ses.flush()
+                except IntegrityError:
+                    # Stored by another writer after the filter was built
+                    ses.rollback()
+                    new = self._new_telemeters(ses, tels, use_filter=False)
+                    ses.add_all(new)
+                    ses.flush()
+                ids = [tel.id for tel in new]
+            if self.storage.spatial_index:
+                self._index_locations(ses, new, ids)
             ses.commit()
+        seen = self._dedupe_filter()
+        for tel in new:
+            seen.add(self._dedupe_key(tel.peer_dest, tel.time))
+        SAVED_TELEMETERS.inc(len(new))
+        DUPLICATE_TELEMETERS.inc(len(tels) - len(new))
+        return len(new)
+
+    @staticmethod
+    def _dedupe_key(peer_dest: str, time: datetime) -> bytes:
+        return f"{peer_dest}|{time.isoformat()}".encode()
+
+    def _dedupe_filter(self) -> BloomFilter:
+        """Bloom filter of the stored (peer, time) keys, built from the database on first use."""
+        with self._seen_lock:
+            if self._seen is None or self._seen.full:
+                with self.storage.engine.connect() as conn:
+                    stored = conn.scalar(select(func.count()).select_from(Telemeter))
+                    seen = BloomFilter(max(self.dedupe_capacity, stored * 2))
+                    rows = conn.execution_options(yield_per=10000).execute(
+                        select(Telemeter.peer_dest, Telemeter.time)
+                    )
+                    for peer_dest, time in rows:
+                        seen.add(self._dedupe_key(peer_dest, time))
+                self._seen = seen
+            return self._seen
+
+    def _new_telemeters(
+        self, ses: Session, tels: list[Telemeter], use_filter: bool = True
+    ) -> list[Telemeter]:
+        """Drop telemeters repeated in the batch or already in the database.
+
+        Only keys the filter may have seen are looked up in the database.
+        """
+        batch: dict[bytes, Telemeter] = {}
+        for tel in tels:
+            batch.setdefault(self._dedupe_key(tel.peer_dest, tel.time), tel)
+        seen = self._dedupe_filter() if use_filter else None
+        maybe = [tel for key, tel in batch.items() if seen is None or key in seen]
+        if maybe:
+            rows = ses.execute(
+                select(Telemeter.peer_dest, Telemeter.time).where(
+                    Telemeter.peer_dest.in_({tel.peer_dest for tel in maybe}),
+                    Telemeter.time.in_({tel.time for tel in maybe}),
+                )
+            )
+            for peer_dest, time in rows:
+                batch.pop(self._dedupe_key(peer_dest, time), None)
+        return list(batch.values())
+
+    def _index_locations(self, ses: Session, tels: list[Telemeter], ids: list[int]) -> None:
+        """Add the location of each new telemeter to the spatial index."""
+        rows = []
+        for tel_id, tel in zip(ids, tels):
+            for sensor in tel.sensors:
+                if sensor.sid == SID_LOCATION and sensor.latitude is not None:
+                    rows.append(
+                        {
+                            "id": tel_id,
+                            "latitude": sensor.latitude,
+                            "longitude": sensor.longitude,
+                            "time": tel.time,
+                        }
+                    )
+                    break
+        spatial.index_locations(ses.connection(), rows)
+
+    def _write_compact(
+        self, ses: Session, tels: list[Telemeter]
+    ) -> tuple[list[Telemeter], list[int]]:
+        """Bulk insert telemeters and their sensor types without sensor rows.
+
+        Telemeters conflicting with a stored one are ignored. Returns the
+        inserted telemeters and their new ids.
+        """
+        tels, ids = self._insert_telemeters(ses, tels)
+        sensor_rows = [
+            {"telemeter_id": tel_id, "sid": sid}
+            for tel_id, tel in zip(ids, tels)
+            for sid in {sensor.sid for sensor in tel.sensors}
+        ]
+        if sensor_rows:
+            ses.execute(insert(TelemeterSensor.__table__), sensor_rows)
+        return tels, ids
+
+    def _write_sensor_rows(self, ses: Session, records: list) -> tuple[list, list[int]]:
+        """Bulk insert records whose ``sensor_rows`` hold their joined layout columns.
+
+        Each entry of ``sensor_rows`` maps the tables of one sensor to its
+        column values without ids, as built by the importer's workers.
+        Returns the inserted records and their new ids.
+        """
+        records, ids = self._insert_telemeters(ses, records)
+        base = Sensor.__table__
+        sensor_rows = []
+        for tel_id, record in zip(ids, records):
+            for rows in record.sensor_rows:
+                sensor_rows.append((dict(rows[base.name], telemeter_id=tel_id), rows))
+        if not sensor_rows:
+            return records, ids
+        sensor_ids = ses.scalars(
+            insert(base).returning(base.c.id, sort_by_parameter_order=True),
+            [row for row, _ in sensor_rows],
+        ).all()
+        by_table = defaultdict(list)
+        for sensor_id, (_, rows) in zip(sensor_ids, sensor_rows):
+            for name, values in rows.items():
+                if name != base.name:
+                    by_table[name].append(dict(values, id=sensor_id))
+        for name, rows in by_table.items():
+            ses.execute(insert(Base.metadata.tables[name]), rows)
+        return records, ids
+
+    def _insert_telemeters(self, ses: Session, tels: list) -> tuple[list, list[int]]:
+        """Bulk insert telemeter rows, ignoring ones conflicting with a stored one.
+
+        Returns the inserted telemeters and their new ids.
+        """
+        if not tels:
+            return [], []
+        # Core statements on the tables, executemany without ORM bookkeeping
+        table = Telemeter.__table__
+        inserted = ses.execute(
+            sqlite_insert(table)
+            .on_conflict_do_nothing(index_elements=["peer_dest", "time"])
+            .returning(table.c.id, table.c.peer_dest, table.c.time),
+            [
+                {
+                    "time": tel.time,
+                    "peer_dest": tel.peer_dest,
+                    "packed": self._packed_telemeter(tel),
+                }
+                for tel in tels
+            ],
+        ).all()
+        by_key = {self._dedupe_key(tel.peer_dest, tel.time): tel for tel in tels}
+        tels = [by_key[self._dedupe_key(row.peer_dest, row.time)] for row in inserted]
+        return tels, [row.id for row in inserted]
+
+    def migrate_to_compact(self, batch_size: int = 1000) -> int:
+        """Move telemetry stored with the joined layout to the compact layout.
+
+        Telemeters without a stored payload get one built from their sensor
+        rows, then their sensor rows are replaced by ``TelemeterSensor`` rows.
+        Runs in batches of ``batch_size`` telemeters and returns how many were
+        migrated.
+        """
+        if self.partitions is not None:
+            return self._each_partition(lambda partition: partition.migrate_to_compact(batch_size))
+        migrated = 0
+        while True:
+            with self.storage.session() as ses:
+                tel_ids = ses.scalars(
+                    select(Sensor.telemeter_id)
+                    .where(Sensor.telemeter_id.is_not(None))
+                    .distinct()
+                    .limit(batch_size)
+                ).all()
+                if not tel_ids:
+                    return migrated
+                tels = ses.scalars(
+                    select(Telemeter)
+                    .where(Telemeter.id.in_(tel_ids))
+                    .options(selectinload(Telemeter.sensors))
+                ).all()
+                sensor_rows = []
+                for tel in tels:
+                    if tel.packed is None:
+                        tel.packed = packb(self._serialize_telemeter(tel))
+                    sensor_rows.extend(
+                        {"telemeter_id": tel.id, "sid": sid}
+                        for sid in {sensor.sid for sensor in tel.sensors}
+                    )
+                    for sensor in tel.sensors:
+                        ses.delete(sensor)
+                ses.flush()
+                ses.execute(
+                    insert(TelemeterSensor).prefix_with("OR IGNORE"), sensor_rows
+                )
+                ses.commit()
+                migrated += len(tels)
+
+    def backfill_spatial_index(self, batch_size: int = 1000) -> int:
+        """Index the locations of telemeters stored before the spatial index existed.
+
+        Telemeters newer than the last indexed one are scanned, so this is
+        cheap once the index is up to date. Returns how many were indexed.
+        """
+        if self.partitions is not None:
+            return self._each_partition(
+                lambda partition: partition.backfill_spatial_index(batch_size)
+            )
+        if not self.storage.spatial_index:
+            return 0
+        indexed = 0
+        with self.storage.engine.connect() as conn:
+            last_id = spatial.max_indexed_id(conn)
+        while True:
+            with self.storage.engine.begin() as conn:
+                rows = conn.execute(
+                    select(Telemeter.id, Telemeter.time, Telemeter.packed)
+                    .where(Telemeter.id > last_id)
+                    .order_by(Telemeter.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    return indexed
+                last_id = rows[-1].id
+                locations = {}
+                unpacked = [row.id for row in rows if row.packed is None]
+                if unpacked:
+                    # Joined rows saved before payloads were kept
+                    locations = {
+                        tel_id: (lat, lon)
+                        for tel_id, lat, lon in conn.execute(
+                            select(
+                                Location.telemeter_id, Location.latitude, Location.longitude
+                            ).where(Location.telemeter_id.in_(unpacked))
+                        )
+                    }
+                index_rows = []
+                for row in rows:
+                    if row.packed is not None:
+                        values = LOCATION_CODEC.decode(
+                            unpackb(row.packed, strict_map_key=False).get(SID_LOCATION)
+                        )
+                        if values is not None:
+                            locations[row.id] = (values["latitude"], values["longitude"])
+                    if row.id in locations:
+                        lat, lon = locations[row.id]
+                        index_rows.append(
+                            {"id": row.id, "latitude": lat, "longitude": lon, "time": row.time}
+                        )
+                spatial.index_locations(conn, index_rows)
+                indexed += len(index_rows)
+
+    def migrate_to_partitions(self, batch_size: int = 1000) -> int:
+        """Move telemetry stored in the main database into the partitions.
+
+        Needed once when partitioning is enabled for an existing database. A
+        batch is copied before it is deleted, so an interrupted migration
+        resumes without losing telemetry. Returns how many were moved.
+        """
+        if self.partitions is None:
+            return 0
+        moved = 0
+        while True:
+            with self.storage.session() as ses:
+                tels = ses.scalars(
+                    self._load_sensors(
+                        select(Telemeter).order_by(Telemeter.id).limit(batch_size)
+                    )
+                ).all()
+                if not tels:
+                    return moved
+                copies = []
+                for tel in tels:
+                    if tel.packed is not None:
+                        tel_data = unpackb(tel.packed, strict_map_key=False)
+                    else:
+                        tel_data = self._serialize_telemeter(tel)
+                    copies.append(
+                        self._deserialize_telemeter(tel_data, tel.peer_dest, tel.packed, tel.time)
+                    )
+            self._write_telemeters(copies)
+            self.delete_telemeters([tel.id for tel in tels])
+            moved += len(tels)
+
+    def _each_partition(self, callback) -> int:
+        """Run a maintenance ``callback`` on every partition and sum the results."""
+        return sum(self.partitions.map(callback, self.partitions.keys()))
+
+    def delete_telemeters(self, ids: list[int]) -> int:
+        """Delete telemeters and all their sensor rows in one transaction.
+
+        Ids are those of this controller's own database, each partition of a
+        partitioned database deletes through its own controller. Returns how
+        many telemeters were deleted.
+        """
+        if not ids:
+            return 0
+        sensor_table = Sensor.__table__
+        sensor_ids = select(sensor_table.c.id).where(sensor_table.c.telemeter_id.in_(ids))
+        with self.storage.engine.begin() as conn:
+            # Subclass rows of joined-table sensors, e.g. Location
+            for table in Base.metadata.sorted_tables:
+                if any(fk.column.table is sensor_table for fk in table.foreign_keys):
+                    conn.execute(delete(table).where(table.c.id.in_(sensor_ids)))
+            conn.execute(delete(sensor_table).where(sensor_table.c.telemeter_id.in_(ids)))
+            conn.execute(delete(TelemeterSensor).where(TelemeterSensor.telemeter_id.in_(ids)))
+            if self.storage.spatial_index:
+                spatial.delete_locations(conn, ids)
+            result = conn.execute(delete(Telemeter).where(Telemeter.id.in_(ids)))
+        return result.rowcount
 
     def handle_message(self, message: LXMF.LXMessage) -> bool:
         """Handle the incoming message."""
-        handled = False
+        if not self.has_telemetry(message):
+            return False
+        self.save_telemeters(self.decode_message(message))
+        return True
+
+    @staticmethod
+    def has_telemetry(message: LXMF.LXMessage) -> bool:
+        return (
+            LXMF.FIELD_TELEMETRY in message.fields
+            or LXMF.FIELD_TELEMETRY_STREAM in message.fields
+            or message.fields.get(LXMF.FIELD_CUSTOM_TYPE) == TRACK_CUSTOM_TYPE
+        )
+
+    def decode_message(self, message: LXMF.LXMessage) -> list[Telemeter]:
+        """Deserialize the telemetry carried by ``message`` without saving it."""
+        tels = []
         if LXMF.FIELD_TELEMETRY in message.fields:
-            tel_data: dict = unpackb(
-                message.fields[LXMF.FIELD_TELEMETRY], strict_map_key=False
+            packed = message.fields[LXMF.FIELD_TELEMETRY]
+            tel_data: dict = unpackb(packed, strict_map_key=False)
+            telemetry_log.debug("Telemetry data: %s", tel_data)
+            time_data = tel_data.get(SID_TIME)
+            tels.append(
+                self._deserialize_telemeter(
+                    tel_data,
+                    RNS.hexrep(message.source_hash, False),
+                    packed,
+                    # The time sensor, else when the message was created
+                    self._source_time(time_data)
+                    or self._source_time(getattr(message, "timestamp", None)),
+                )
             )
-            RNS.log(f"Telemetry data: {tel_data}")
-            self.save_telemetry(tel_data, RNS.hexrep(message.source_hash, False))
-            handled = True
+        streams = []
         if LXMF.FIELD_TELEMETRY_STREAM in message.fields:
-            tels_data = unpackb(
-                message.fields[LXMF.FIELD_TELEMETRY_STREAM], strict_map_key=False
-            )
-            for tel_data in tels_data:
-                self.save_telemetry(tel_data, RNS.hexrep(tel_data.pop(0)))
-            handled = True
-
-        return handled
-
-    def handle_command(self, command: dict, message: LXMF.LXMessage, my_lxm_dest) -> Optional[LXMF.LXMessage]:
-        """Handle the incoming command."""
-        if TelemetryController.TELEMETRY_REQUEST in command:
-            timebase = command[TelemetryController.TELEMETRY_REQUEST]
-            tels = self.get_telemetry(start_time=datetime.fromtimestamp(timebase))
-            packed_tels = []
-            dest = RNS.Destination(
-                message.source.identity,
-                RNS.Destination.OUT,
-                RNS.Destination.SINGLE,
-                "lxmf",
-                "delivery",
-            )
-            message = LXMF.LXMessage(
-                    dest,
-                    my_lxm_dest,
-                    "Telemetry data",
-                    desired_method=LXMF.LXMessage.DIRECT,
+            tels_data = message.fields[LXMF.FIELD_TELEMETRY_STREAM]
+            if isinstance(tels_data, bytes):
+                tels_data = unpackb(tels_data, strict_map_key=False)
+            streams.append(tels_data)
+        if message.fields.get(LXMF.FIELD_CUSTOM_TYPE) == TRACK_CUSTOM_TYPE:
+            try:
+                streams.append(decode_track(message.fields.get(LXMF.FIELD_CUSTOM_DATA) or b""))
+            except ValueError as e:
+                telemetry_log.warning("Skipping malformed telemetry track: %s", e)
+        for tels_data in streams:
+            tels.extend(
+                self._deserialize_telemeter(
+                    entry.tel_data,
+                    entry.peer_dest,
+                    entry.packed,
+                    self._source_time(entry.timestamp),
                 )
-            for tel in tels:
-                tel_data = self._serialize_telemeter(tel)
-                packed_tels.append(
-                    [
-                        bytes.fromhex(tel.peer_dest),
-                        round(tel.time.timestamp()),
-                        packb(tel_data),
-                        ['account', b'\x00\x00\x00', b'\xff\xff\xff'],
-                    ]
+                for entry in decode_stream(tels_data)
+            )
+        return tels
+
+    @staticmethod
+    def _source_time(timestamp) -> Optional[datetime]:
+        """Datetime of a timestamp in seconds, None if it is missing or invalid."""
+        if isinstance(timestamp, bool):
+            return None
+        try:
+            return datetime.fromtimestamp(timestamp)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return None
+
+    def handle_command(
+        self, command: dict, message: LXMF.LXMessage, my_lxm_dest
+    ) -> list[LXMF.LXMessage]:
+        """Handle the incoming command and return the response messages.
+
+        A request with invalid parameters is answered with a single message
+        carrying the reason under ``TELEMETRY_ERROR`` in ``FIELD_RESULTS``.
+        """
+        if TelemetryController.TELEMETRY_AREA in command:
+            with RESPONSE_SECONDS.time():
+                return self._area_response(
+                    command[TelemetryController.TELEMETRY_AREA], message, my_lxm_dest
                 )
-            message.fields[LXMF.FIELD_TELEMETRY_STREAM] = packed_tels
-            print("+--- Sending telemetry data---------------------------------")
-            print(f"| Telemetry data: {packed_tels}")
-            print(f"| Message: {message}")
-            print("+------------------------------------------------------------")
-            return message
-        else:
+        if TelemetryController.TELEMETRY_REQUEST not in command:
+            return []
+        with RESPONSE_SECONDS.time():
+            try:
+                return self._telemetry_response(command, message, my_lxm_dest)
+            except ValueError as e:
+                telemetry_log.warning("Invalid telemetry request %s: %s", command, e)
+                return [self._error_message(message, my_lxm_dest, str(e))]
+
+    def _telemetry_response(
+        self, command: dict, message: LXMF.LXMessage, my_lxm_dest
+    ) -> list[LXMF.LXMessage]:
+        """Answer a telemetry request, raises ValueError if it is invalid."""
+        start_time = self._request_time(command[TelemetryController.TELEMETRY_REQUEST])
+        chunk_bytes = self._request_max_bytes(command)
+        before = self._request_before(command)
+        dest = self._reply_destination(message)
+        encoding = command.get(TelemetryController.TELEMETRY_ENCODING)
+        requester = RNS.hexrep(message.source.identity.hash, False)
+        if command.get(TelemetryController.TELEMETRY_RESET):
+            self.sync_cursors.reset(requester)
+        if command.get(TelemetryController.TELEMETRY_INCREMENTAL):
+            return self._incremental_telemetry_messages(
+                requester,
+                dest,
+                my_lxm_dest,
+                start_time,
+                chunk_bytes,
+                encoding,
+            )
+        if chunk_bytes is None:
+            chunk = stream_chunk(encoding)
+            for tel in self.iter_records(start_time=start_time):
+                chunk.add(self._stream_entry(tel))
+            return [self._telemetry_message(dest, my_lxm_dest, chunk)]
+
+        return self._chunked_telemetry_messages(
+            dest, my_lxm_dest, start_time, chunk_bytes, before, encoding
+        )
+
+    @classmethod
+    def _request_time(cls, timestamp) -> datetime:
+        """Datetime of a timestamp sent by a client, raises ValueError if invalid."""
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            raise ValueError(f"expected a timestamp, got {timestamp!r}")
+        time = cls._source_time(timestamp)
+        if time is None:
+            raise ValueError(f"timestamp {timestamp!r} is out of range")
+        return time
+
+    def _request_max_bytes(self, request: dict) -> Optional[int]:
+        """The byte budget asked for, clamped to ``MIN_CHUNK_BYTES``..``MAX_CHUNK_BYTES``."""
+        max_bytes = request.get(TelemetryController.TELEMETRY_MAX_BYTES)
+        if max_bytes is None:
+            return self.stream_chunk_bytes
+        if isinstance(max_bytes, bool) or not isinstance(max_bytes, int):
+            raise ValueError(f"expected max_bytes to be an integer, got {max_bytes!r}")
+        return min(
+            max(max_bytes, TelemetryController.MIN_CHUNK_BYTES),
+            TelemetryController.MAX_CHUNK_BYTES,
+        )
+
+    def _request_before(self, request: dict) -> Optional[tuple[datetime, int]]:
+        """The continuation marker sent back by a client as a ``(time, id)`` pair."""
+        before = request.get(TelemetryController.TELEMETRY_BEFORE)
+        if before is None:
             return None
+        if not isinstance(before, (list, tuple)) or len(before) != 2:
+            raise ValueError(f"expected before to be a [timestamp, id] pair, got {before!r}")
+        tel_id = before[1]
+        if isinstance(tel_id, bool) or not isinstance(tel_id, int) or tel_id < 0:
+            raise ValueError(f"expected a telemeter id in before, got {tel_id!r}")
+        return self._request_time(before[0]), tel_id
+
+    def _error_message(
+        self, message: LXMF.LXMessage, my_lxm_dest, error: str
+    ) -> LXMF.LXMessage:
+        """Reply telling the client why its request was rejected."""
+        return LXMF.LXMessage(
+            self._reply_destination(message),
+            my_lxm_dest,
+            f"Invalid telemetry request: {error}",
+            "Telemetry error",
+            desired_method=LXMF.LXMessage.DIRECT,
+            fields={LXMF.FIELD_RESULTS: {TelemetryController.TELEMETRY_ERROR: error}},
+        )
+
+    def _area_response(
+        self, area: dict, message: LXMF.LXMessage, my_lxm_dest
+    ) -> list[LXMF.LXMessage]:
+        """Answer an area request with the matching telemetry, newest first.
+
+        Like chunked telemetry responses, the last of ``max_stream_messages``
+        full messages carries a continuation marker for ``"before"``.
+        """
+        try:
+            since, until = area.get("since"), area.get("until")
+            start_time = self._request_time(since) if since else None
+            end_time = self._request_time(until) if until else None
+            within = None
+            if "bbox" in area:
+                boxes = spatial.bbox_boxes(*area["bbox"])
+            elif "center" in area and "radius" in area:
+                boxes = spatial.radius_boxes(*area["center"], area["radius"])
+                within = spatial.within_radius(*area["center"], area["radius"])
+            else:
+                raise ValueError("expected a bbox, or a center and a radius")
+            chunk_bytes = self._request_max_bytes(area)
+            before = self._request_before(area)
+            records = self._spatial_records(
+                boxes, start_time, end_time, bool(area.get("latest")), within, before
+            )
+            chunks, continuation = self._fill_chunks(
+                records, chunk_bytes, area.get(TelemetryController.TELEMETRY_ENCODING)
+            )
+        except (AttributeError, TypeError, ValueError, RuntimeError) as e:
+            telemetry_log.warning("Invalid area request %s: %s", area, e)
+            return [self._error_message(message, my_lxm_dest, str(e))]
+        return self._stream_messages(
+            self._reply_destination(message), my_lxm_dest, chunks, continuation
+        )
+
+    def _fill_chunks(
+        self,
+        tels: Iterator[TelemetryRecord],
+        chunk_bytes: Optional[int],
+        encoding: Optional[str] = None,
+    ) -> tuple[list[StreamChunk], Optional[list]]:
+        """Pack telemetry into chunks of at most ``chunk_bytes`` encoded bytes each.
+
+        Stops once ``max_stream_messages`` chunks are full and returns the
+        continuation marker of the last telemeter packed, else None.
+        """
+        chunks, packed, truncated = self._pack_chunks(tels, chunk_bytes, encoding)
+        continuation = None
+        if truncated:
+            last_sent = packed[-1][-1]
+            continuation = [last_sent.time.timestamp(), last_sent.id]
+        return chunks, continuation
+
+    def _pack_chunks(
+        self,
+        items: Iterator,
+        chunk_bytes: Optional[int],
+        encoding: Optional[str] = None,
+        record: Callable = lambda item: item,
+    ) -> tuple[list[StreamChunk], list[list], bool]:
+        """Pack stream entries into at most ``max_stream_messages`` chunks.
+
+        ``record`` returns the telemetry record of an item. Returns the
+        chunks, the items packed into each chunk and whether items were
+        left over. ``items`` is closed when done.
+        """
+        chunks: list[StreamChunk] = []
+        packed: list[list] = []
+        chunk = stream_chunk(encoding)
+        chunk_items: list = []
+        truncated = False
+        try:
+            for item in items:
+                entry = self._stream_entry(record(item))
+                if (
+                    chunk
+                    and chunk_bytes is not None
+                    and chunk.size + chunk.measure(entry) > chunk_bytes
+                ):
+                    chunks.append(chunk)
+                    packed.append(chunk_items)
+                    chunk = stream_chunk(encoding)
+                    chunk_items = []
+                    if len(chunks) >= self.max_stream_messages:
+                        truncated = True
+                        break
+                chunk.add(entry)
+                chunk_items.append(item)
+        finally:
+            items.close()
+        if chunk or not chunks:
+            chunks.append(chunk)
+            packed.append(chunk_items)
+        return chunks, packed, truncated
+
+    def _stream_messages(
+        self,
+        dest: RNS.Destination,
+        my_lxm_dest,
+        chunks: list[StreamChunk],
+        continuation: Optional[list],
+    ) -> list[LXMF.LXMessage]:
+        messages = [self._telemetry_message(dest, my_lxm_dest, chunk) for chunk in chunks]
+        if continuation is not None:
+            messages[-1].fields[LXMF.FIELD_RESULTS] = {
+                TelemetryController.TELEMETRY_BEFORE: continuation
+            }
+        return messages
+
+    def _reply_destination(self, message: LXMF.LXMessage) -> RNS.Destination:
+        return self.destinations.for_message(message)
+
+    def _chunked_telemetry_messages(
+        self,
+        dest: RNS.Destination,
+        my_lxm_dest,
+        start_time: datetime,
+        chunk_bytes: int,
+        before: Optional[tuple[datetime, int]] = None,
+        encoding: Optional[str] = None,
+    ) -> list[LXMF.LXMessage]:
+        """Pack telemetry newest first into messages under ``chunk_bytes`` each.
+
+        Once ``max_stream_messages`` are full the last message carries a
+        continuation marker that the client sends back as ``TELEMETRY_BEFORE``.
+        """
+        chunks, continuation = self._fill_chunks(
+            self.iter_records(start_time=start_time, newest_first=True, before=before),
+            chunk_bytes,
+            encoding,
+        )
+        return self._stream_messages(dest, my_lxm_dest, chunks, continuation)
+
+    def _incremental_telemetry_messages(
+        self,
+        requester: str,
+        dest: RNS.Destination,
+        my_lxm_dest,
+        start_time: datetime,
+        chunk_bytes: Optional[int],
+        encoding: Optional[str] = None,
+    ) -> list[LXMF.LXMessage]:
+        """Pack telemetry stored after the requester's sync cursor, oldest first.
+
+        At most ``max_stream_messages`` are sent; the cursor advances as they
+        are delivered, so the next request picks up where this one stopped.
+        """
+        chunks, packed, _ = self._pack_chunks(
+            self._incremental_rows(requester, start_time),
+            chunk_bytes,
+            encoding,
+            record=lambda row: row[1],
+        )
+        # Newest id sent per cursor, one cursor per partition when partitioned
+        marks: list[dict[str, int]] = []
+        last: dict[str, int] = {}
+        for rows in packed:
+            for cursor, tel in rows:
+                last[cursor] = tel.id
+            marks.append(dict(last))
+
+        messages = [self._telemetry_message(dest, my_lxm_dest, chunk) for chunk in chunks]
+        if last:
+            self.sync_cursors.track(messages, marks)
+        return messages
+
+    def _incremental_rows(
+        self, requester: str, start_time: datetime
+    ) -> Iterator[tuple[str, TelemetryRecord]]:
+        """Telemeters after the requester's cursors, with the cursor each one advances."""
+        if self.partitions is None:
+            sources = [(requester, self)]
+        else:
+            sources = [
+                (SyncCursors.partition_cursor(requester, key), self.partitions.get(key))
+                for key in self.partitions.covering(start_time)
+            ]
+        for cursor, source in sources:
+            query = (
+                select(*self.RECORD_COLUMNS)
+                .where(Telemeter.id > self.sync_cursors.get(cursor), Telemeter.time >= start_time)
+                .order_by(Telemeter.id)
+            )
+            with source.storage.engine.connect() as conn:
+                for record in source._records(conn, query):
+                    yield cursor, record
+
+    def _telemetry_message(
+        self, dest: RNS.Destination, my_lxm_dest, chunk: StreamChunk
+    ) -> LXMF.LXMessage:
+        message = LXMF.LXMessage(
+            dest,
+            my_lxm_dest,
+            "Telemetry data",
+            desired_method=LXMF.LXMessage.DIRECT,
+        )
+        message.fields.update(chunk.fields())
+        telemetry_log.verbose("Sending %d telemeters to %s", len(chunk), dest)
+        telemetry_log.log(RNS.LOG_EXTREME, "Telemetry data: %s", chunk.entries)
+        return message
+
+    def _stream_entry(self, tel: Union[Telemeter, TelemetryRecord]) -> list:
+        """Build a telemetry stream entry for a stored telemeter."""
+        return [
+            bytes.fromhex(tel.peer_dest),
+            round(tel.time.timestamp()),
+            self._packed_telemeter(tel),
+            STREAM_APPEARANCE,
+        ]
+
+    def _packed_telemeter(self, telemeter: Union[Telemeter, TelemetryRecord]) -> bytes:
+        """Return the stored wire encoding, re-serializing only rows saved without one."""
+        if telemeter.packed is not None:
+            return telemeter.packed
+        return packb(self._serialize_telemeter(telemeter))
 
     def _serialize_telemeter(self, telemeter: Telemeter) -> dict:
         """Serialize the telemeter data."""
@@ -110,15 +1296,33 @@ class TelemetryController:
             telemeter_data[sensor.sid] = sensor_data
         return telemeter_data
 
-    def _deserialize_telemeter(self, tel_data: dict, peer_dest: str) -> Telemeter:
-        """Deserialize the telemeter data."""
-        tel = Telemeter(peer_dest)
-        for sid in tel_data:
-            if sid in sid_mapping:
-                if tel_data[sid] is None:
-                    RNS.log(f"Sensor data for {sid} is None")
-                    continue
-                sensor = sid_mapping[sid]()
-                sensor.unpack(tel_data[sid])
-                tel.sensors.append(sensor)
+    def _deserialize_telemeter(
+        self,
+        tel_data: dict,
+        peer_dest: str,
+        packed: Optional[bytes] = None,
+        time: Optional[datetime] = None,
+    ) -> Telemeter:
+        """Deserialize the telemeter data, recorded at ``time`` or now."""
+        tel = Telemeter(
+            peer_dest, time, packed=packed if packed is not None else packb(tel_data)
+        )
+        tel.sensors.extend(self._build_sensors(tel_data))
         return tel
+
+    def _build_sensors(self, tel_data: dict) -> list[Sensor]:
+        """Decode the sensors of a telemetry dict into sensor objects."""
+        sensors = []
+        for sid in tel_data:
+            cls = sensor_class(sid)
+            if cls is None:
+                continue
+            if tel_data[sid] is None:
+                RNS.log(f"Sensor data for {sid} is None")
+                continue
+            sensor = cls()
+            if sensor.unpack(tel_data[sid]) is None:
+                RNS.log(f"Could not decode sensor data for {sid}", RNS.LOG_WARNING)
+                continue
+            sensors.append(sensor)
+        return sensors
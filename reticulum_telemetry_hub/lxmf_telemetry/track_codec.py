@@ -0,0 +1,321 @@
+"""Delta encoded telemetry tracks for bulk transfer between hubs.
+
+A plain ``FIELD_TELEMETRY_STREAM`` entry carries the peer hash, a timestamp
+and the full packed telemetry, so the history of a peer repeats nearly the
+same bytes entry after entry. Clients that ask for ``TRACK_ENCODING`` get
+the same entries as one binary blob in ``FIELD_CUSTOM_DATA`` instead, with
+``FIELD_CUSTOM_TYPE`` set to ``TRACK_CUSTOM_TYPE``.
+
+The blob is a version byte followed by the entries in stream order::
+
+    varint  peer index, a new index is followed by varint length + hash
+    varint  flags
+    zigzag  timestamp - previous timestamp of the peer
+    zigzag  6 x location field - previous value of the peer   (FLAG_TRACK)
+    zigzag  location last_update - timestamp                  (FLAG_TRACK)
+    varint  length + rest of the payload        (unless FLAG_SAME_REST)
+
+The integer scaled location fields and its timestamp are taken out of the
+payload and replaced by nil, as is a time sensor equal to the entry
+timestamp (``FLAG_TIME``). What remains is sent as is, or not at all when
+it repeats the previous entry of the peer. Payloads that would not pack
+back to the same bytes are sent whole, so decoding is always lossless.
+Timestamps are whole seconds, as the hub sends them, and the appearance
+of every entry is ``STREAM_APPEARANCE``.
+"""
+
+import struct
+from typing import Iterable, Optional
+
+import LXMF
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+
+# Value of the "encoding" key of a telemetry request
+TRACK_ENCODING = "track"
+TRACK_CUSTOM_TYPE = "rth.telemetry.track"
+TRACK_VERSION = 1
+# Appearance the hub sends with every stream entry
+STREAM_APPEARANCE = ["account", b"\x00\x00\x00", b"\xff\xff\xff"]
+
+FLAG_TRACK = 0x01
+FLAG_TIME = 0x02
+FLAG_SAME_REST = 0x04
+
+_FIELD_STRUCTS = LOCATION_CODEC.FIELD_STRUCTS
+_FIELD_SIZES = tuple(field_struct.size for field_struct in _FIELD_STRUCTS)
+_NO_LOCATION = (0,) * len(_FIELD_STRUCTS)
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> bytes:
+    return _varint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise ValueError("truncated track") from None
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _read_zigzag(data: bytes, pos: int) -> tuple[int, int]:
+    value, pos = _read_varint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+
+class _PeerState:
+    """What the next entry of a peer is encoded against."""
+
+    __slots__ = ("index", "time", "location", "rest")
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.time = 0
+        self.location = _NO_LOCATION
+        self.rest: Optional[bytes] = None
+
+
+def _split_payload(packed: bytes, timestamp: int) -> tuple[int, Optional[tuple], bytes]:
+    """Flags, location fields and remaining payload of an entry's telemetry."""
+    try:
+        tel_data = unpackb(packed, strict_map_key=False)
+    except Exception:
+        return 0, None, packed
+    # Only payloads that pack back to the same bytes can be taken apart
+    if not isinstance(tel_data, dict) or packb(tel_data) != packed:
+        return 0, None, packed
+    flags = 0
+    location = None
+    value = tel_data.get(SID_LOCATION)
+    if (
+        isinstance(value, list)
+        and len(value) == len(_FIELD_SIZES) + 1
+        and all(isinstance(field, bytes) for field in value[:-1])
+        and tuple(len(field) for field in value[:-1]) == _FIELD_SIZES
+        and type(value[-1]) is int
+    ):
+        location = LOCATION_CODEC.decode_raw(value)
+        tel_data[SID_LOCATION] = None
+        flags |= FLAG_TRACK
+    if type(tel_data.get(SID_TIME)) is int and tel_data[SID_TIME] == timestamp:
+        tel_data[SID_TIME] = None
+        flags |= FLAG_TIME
+    if not flags:
+        return 0, None, packed
+    return flags, location, packb(tel_data)
+
+
+class StreamChunk:
+    """Stream entries sent in one response message as ``FIELD_TELEMETRY_STREAM``.
+
+    ``measure`` gives the bytes an entry would add and ``size`` the bytes
+    of the chunk so far, counted only when asked for.
+    """
+
+    def __init__(self) -> None:
+        self.entries: list = []
+        self._size = 0
+        self._sized = 0
+        # Size of the entry last measured, reused when it is added
+        self._measured: Optional[tuple] = None
+
+    @property
+    def size(self) -> int:
+        for entry in self.entries[self._sized :]:
+            self._size += len(packb(entry))
+        self._sized = len(self.entries)
+        return self._size
+
+    def measure(self, entry: list) -> int:
+        size = len(packb(entry))
+        self._measured = (entry, size)
+        return size
+
+    def add(self, entry: list) -> None:
+        measured = self._measured
+        if measured is not None and measured[0] is entry and self._sized == len(self.entries):
+            self._size += measured[1]
+            self._sized += 1
+        self._measured = None
+        self.entries.append(entry)
+
+    def fields(self) -> dict:
+        """LXMF fields of the response message."""
+        return {LXMF.FIELD_TELEMETRY_STREAM: self.entries}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class TrackChunk(StreamChunk):
+    """Stream entries of one response message, delta encoded as a track."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._parts = [bytes([TRACK_VERSION])]
+        self._size = 1
+        self._peers: dict[bytes, _PeerState] = {}
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def measure(self, entry: list) -> int:
+        return len(self._encode(entry)[0])
+
+    def add(self, entry: list) -> None:
+        encoded, state, location, rest = self._encode(entry)
+        self._measured = None
+        if state is None:
+            state = self._peers[bytes(entry[0])] = _PeerState(len(self._peers))
+        state.time = int(entry[1])
+        if location is not None:
+            state.location = location[:-1]
+        state.rest = rest
+        self._parts.append(encoded)
+        self._size += len(encoded)
+        self.entries.append(entry)
+
+    def _encode(self, entry: list) -> tuple:
+        if self._measured is not None and self._measured[0] is entry:
+            return self._measured[1]
+        peer, timestamp, packed = bytes(entry[0]), int(entry[1]), entry[2]
+        state = self._peers.get(peer)
+        if state is None:
+            head = _varint(len(self._peers)) + _varint(len(peer)) + peer
+            previous = _PeerState(len(self._peers))
+        else:
+            head = _varint(state.index)
+            previous = state
+        flags, location, rest = _split_payload(packed, timestamp)
+        if rest == previous.rest:
+            flags |= FLAG_SAME_REST
+        parts = [head, _varint(flags), _zigzag(timestamp - previous.time)]
+        if location is not None:
+            parts.extend(
+                _zigzag(value - last) for value, last in zip(location, previous.location)
+            )
+            parts.append(_zigzag(location[-1] - timestamp))
+        if not flags & FLAG_SAME_REST:
+            parts.append(_varint(len(rest)))
+            parts.append(rest)
+        encoded = (b"".join(parts), state, location, rest)
+        self._measured = (entry, encoded)
+        return encoded
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._parts)
+
+    def fields(self) -> dict:
+        return {
+            LXMF.FIELD_CUSTOM_TYPE: TRACK_CUSTOM_TYPE,
+            LXMF.FIELD_CUSTOM_DATA: self.getvalue(),
+        }
+
+
+def stream_chunk(encoding: Optional[str] = None) -> StreamChunk:
+    """An empty chunk for the encoding a client asked for, plain by default."""
+    return TrackChunk() if encoding == TRACK_ENCODING else StreamChunk()
+
+
+def encode_track(entries: Iterable[list]) -> bytes:
+    """Delta encode ``FIELD_TELEMETRY_STREAM`` entries as one track blob."""
+    chunk = TrackChunk()
+    for entry in entries:
+        chunk.add(entry)
+    return chunk.getvalue()
+
+
+def decode_track(data: bytes) -> list[list]:
+    """Decode a track blob back into ``FIELD_TELEMETRY_STREAM`` entries.
+
+    Raises ``ValueError`` if the blob is malformed or of another version.
+    """
+    if not data or data[0] != TRACK_VERSION:
+        raise ValueError("unsupported track version")
+    peers: list[bytes] = []
+    states: list[_PeerState] = []
+    entries = []
+    pos = 1
+    size = len(data)
+    while pos < size:
+        index, pos = _read_varint(data, pos)
+        if index == len(peers):
+            length, pos = _read_varint(data, pos)
+            if pos + length > size:
+                raise ValueError("truncated track")
+            peers.append(data[pos : pos + length])
+            states.append(_PeerState(index))
+            pos += length
+        elif index > len(peers):
+            raise ValueError(f"unknown peer index {index}")
+        state = states[index]
+        flags, pos = _read_varint(data, pos)
+        delta, pos = _read_zigzag(data, pos)
+        timestamp = state.time + delta
+        location = None
+        if flags & FLAG_TRACK:
+            values = []
+            for last in state.location:
+                delta, pos = _read_zigzag(data, pos)
+                values.append(last + delta)
+            state.location = tuple(values)
+            delta, pos = _read_zigzag(data, pos)
+            try:
+                location = [
+                    field_struct.pack(value)
+                    for field_struct, value in zip(_FIELD_STRUCTS, values)
+                ]
+            except struct.error as e:
+                raise ValueError(f"invalid location: {e}") from None
+            location.append(timestamp + delta)
+        if flags & FLAG_SAME_REST:
+            if state.rest is None:
+                raise ValueError("repeated payload without a previous one")
+            rest = state.rest
+        else:
+            length, pos = _read_varint(data, pos)
+            if pos + length > size:
+                raise ValueError("truncated track")
+            rest = data[pos : pos + length]
+            pos += length
+        state.time = timestamp
+        state.rest = rest
+        if flags & (FLAG_TRACK | FLAG_TIME):
+            try:
+                tel_data = unpackb(rest, strict_map_key=False)
+            except Exception as e:
+                raise ValueError(f"invalid track payload: {e}") from None
+            if not isinstance(tel_data, dict):
+                raise ValueError("track payload is not telemetry")
+            if location is not None:
+                tel_data[SID_LOCATION] = location
+            if flags & FLAG_TIME:
+                tel_data[SID_TIME] = timestamp
+            packed = packb(tel_data)
+        else:
+            packed = rest
+        entries.append([peers[index], timestamp, packed, STREAM_APPEARANCE])
+    return entries
@@ -16,7 +16,7 @@ Functionalities:
 - **Reticulum Transport**: Routes traffic, passes network announcements, and handles path requests.
 
 Usage:
-- The script loads or generates an identity for the hub, configures the LXMF router, and starts the main loop.
+- The script loads or generates an identity for the hub, configures the LXMF router, and hands it to the asyncio runtime.
 - It supports manual commands to announce the hub identity or request telemetry from a specific connection.
 
 Configuration:
@@ -24,8 +24,9 @@ Configuration:
 - The `APP_NAME` constant defines the application name used in LXMF.
 
 Running the Script:
-- Execute this script directly to start the hub and enter the interactive command loop.
-- Commands include `exit` to terminate, `announce` to re-announce the hub identity, and `telemetry` to request telemetry from a connected peer.
+- Execute this script directly to start the hub and enter the admin console.
+- Commands include `exit` to terminate, `announce` to re-announce the hub identity, `telemetry <hash>` to request telemetry from a connected peer, and `status`.
+- With `--headless` there is no console; SIGINT or SIGTERM shut the hub down after draining its queues.
 
 Author: FreeTAKTeam
 Date: Aug 2024 
@@ -36,35 +37,121 @@ import time
 import LXMF
 import RNS
 import argparse
+from datetime import timedelta
 from pathlib import Path
+from typing import Optional
+from reticulum_telemetry_hub.destinations import DestinationCache
+from reticulum_telemetry_hub.hub_log import (
+    configure_logging,
+    get_logger,
+    parse_log_levels,
+)
+from reticulum_telemetry_hub.metrics import REGISTRY, MetricsServer
+from reticulum_telemetry_hub.lxmf_telemetry.retention import (
+    RetentionJob,
+    RetentionPolicy,
+    parse_duration,
+    parse_tiers,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_JOINED,
+    LAYOUTS,
+    PARTITIONS,
+    StorageConfig,
+)
 from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import (
     TelemetryController,
 )
+from reticulum_telemetry_hub.reticulum_server.announce_scheduler import (
+    AnnouncePolicy,
+    AnnounceScheduler,
+)
+from reticulum_telemetry_hub.reticulum_server.fanout import BroadcastFanout
+from reticulum_telemetry_hub.reticulum_server.peer_directory import PeerDirectory
+from reticulum_telemetry_hub.reticulum_server.runtime import AdminConsole, HubRuntime
+from reticulum_telemetry_hub.reticulum_server.subscribers import SubscriberStore
+from reticulum_telemetry_hub.reticulum_server.pipeline import (
+    PipelineStage,
+    StagedPipeline,
+)
 
 # Constants
 STORAGE_PATH = "RTH_Store"  # Path to store temporary files
 IDENTITY_PATH = os.path.join(STORAGE_PATH, "identity")  # Path to store identity file
+DATABASE_FILE = "telemetry.db"  # Telemetry database file inside the storage path
+TELEMETRY_CHUNK_BYTES = 16 * 1024  # Byte budget of each telemetry response message
 APP_NAME = LXMF.APP_NAME + ".delivery"  # Application name for LXMF
+PIPELINE_WORKERS = {  # Worker threads of each inbound pipeline stage
+    "classify": 1,
+    "decode": 2,
+    "persist": 2,
+    "fanout": 1,
+}
+PIPELINE_QUEUE_SIZE = 256  # Messages queued per pipeline worker
+# Seconds the delivery callback waits for a full pipeline before dropping the
+# message, so a backlog never stalls the Reticulum transport thread
+PIPELINE_SUBMIT_TIMEOUT = 0.05
+ANNOUNCE_TICK = 1.0  # Seconds between checks whether an announce is due
+PEER_CACHE_SIZE = 10000  # Announced peers held in memory
+PEER_TTL = 7 * 24 * 3600  # Seconds a peer stays in memory after its last announce
 PLUGIN_COMMAND = (
     0  # Command to join the network, equivalent to ping on the sideband client
 )
 
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "rth_messages_received_total", "LXMF messages delivered to the hub"
+)
+COMMANDS_RECEIVED = REGISTRY.counter(
+    "rth_commands_received_total", "Commands received from clients"
+)
+
+announce_log = get_logger("announce")
+delivery_log = get_logger("delivery")
+command_log = get_logger("commands")
+
 
 class AnnounceHandler:
     """Handles announcements from other nodes in the Reticulum network."""
 
-    def __init__(self, identities):
+    def __init__(self, peers: PeerDirectory):
         self.aspect_filter = APP_NAME  # Filter for LXMF announcements
-        self.identities = identities  # Dictionary to store identities
+        self.peers = peers
 
     def received_announce(self, destination_hash, announced_identity, app_data):
-        # Log the received announcement details
-        RNS.log("\t+--- LXMF Announcement -----------------------------------------")
-        RNS.log(f"\t| Source hash            : {RNS.prettyhexrep(destination_hash)}")
-        RNS.log(f"\t| Announced identity     : {announced_identity}")
-        RNS.log(f"\t| App data               : {app_data}")
-        RNS.log("\t+---------------------------------------------------------------")
-        self.identities[destination_hash] = app_data.decode("utf-8")
+        if announce_log.enabled(RNS.LOG_DEBUG):
+            announce_log.debug(
+                "LXMF announce from %s",
+                RNS.prettyhexrep(destination_hash),
+                identity=str(announced_identity),
+                app_data=app_data,
+            )
+        self.peers.record_announce(destination_hash, app_data)
+
+
+class InboundMessage:
+    """A delivered message as it moves through the inbound pipeline."""
+
+    __slots__ = ("message", "time_string", "signature_string", "telemeters")
+
+    def __init__(self, message: LXMF.LXMessage, time_string: str, signature_string: str):
+        self.message = message
+        self.time_string = time_string
+        self.signature_string = signature_string
+        self.telemeters = []
+
+
+def parse_pipeline_workers(value: str) -> dict[str, int]:
+    """Parse ``stage=count`` pairs separated by commas, e.g. ``decode=4,persist=2``."""
+    workers = {}
+    for pair in filter(None, value.split(",")):
+        stage, _, count = pair.partition("=")
+        if stage not in PIPELINE_WORKERS:
+            raise argparse.ArgumentTypeError(f"Unknown pipeline stage {stage!r}")
+        try:
+            workers[stage] = int(count)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid worker count for {stage!r}")
+    return workers
 
 
 class ReticulumTelemetryHub:
@@ -72,17 +159,71 @@ class ReticulumTelemetryHub:
 
     lxm_router: LXMF.LXMRouter
     connections: dict[bytes, RNS.Destination]
-    identities: dict[str, str]
+    destinations: DestinationCache
+    subscribers: SubscriberStore
+    peers: PeerDirectory
     my_lxmf_dest: RNS.Destination
     ret: RNS.Reticulum
     storage_path: Path
     identity_path: Path
     tel_controller: TelemetryController
-
-    def __init__(self, display_name: str, storage_path: Path, identity_path: Path):
+    fanout: BroadcastFanout
+    pipeline: StagedPipeline
+    admins: set[str]
+    metrics_server: Optional[MetricsServer]
+    retention: Optional[RetentionJob]
+    announcer: AnnounceScheduler
+
+    def __init__(
+        self,
+        display_name: str,
+        storage_path: Path,
+        identity_path: Path,
+        telemetry_chunk_bytes: Optional[int] = TELEMETRY_CHUNK_BYTES,
+        storage_layout: str = LAYOUT_JOINED,
+        storage_partition: Optional[str] = None,
+        pipeline_workers: Optional[dict[str, int]] = None,
+        metrics_port: Optional[int] = None,
+        admins: Optional[set[str]] = None,
+        retention_policy: Optional[RetentionPolicy] = None,
+        peer_cache_size: int = PEER_CACHE_SIZE,
+        peer_ttl: float = PEER_TTL,
+        announce_policy: Optional[AnnouncePolicy] = None,
+    ):
         self.ret = RNS.Reticulum()  # Initialize Reticulum
-        self.tel_controller = TelemetryController()  # Initialize telemetry controller
-        self.connections = {}  # List to store connections
+        storage_config = StorageConfig(
+            db_path=os.path.join(storage_path, DATABASE_FILE),
+            layout=storage_layout,
+            partition=storage_partition,
+        )
+        # Reply and broadcast destinations, shared with the telemetry controller
+        self.destinations = DestinationCache()
+        self.tel_controller = TelemetryController(
+            storage_config,
+            stream_chunk_bytes=telemetry_chunk_bytes,
+            destinations=self.destinations,
+        )  # Initialize telemetry controller
+        moved = self.tel_controller.migrate_to_partitions()
+        if moved:
+            RNS.log(f"Moved {moved} telemeters to {storage_partition} partitions")
+        if storage_config.compact:
+            migrated = self.tel_controller.migrate_to_compact()
+            if migrated:
+                RNS.log(f"Migrated {migrated} telemeters to the compact storage layout")
+        indexed = self.tel_controller.backfill_spatial_index()
+        if indexed:
+            RNS.log(f"Added {indexed} stored telemeters to the spatial index")
+        self.tel_controller.enable_batch_ingest()  # Group commits off the delivery thread
+        self.retention = None
+        if retention_policy is not None and retention_policy.enabled:
+            # Run periodically by the runtime, see schedule
+            self.retention = RetentionJob(self.tel_controller, retention_policy)
+        # Joined clients survive restarts and keep receiving broadcasts
+        self.subscribers = SubscriberStore(self.tel_controller.storage, self.destinations)
+        restored = self.subscribers.load()
+        if restored:
+            RNS.log(f"Restored {restored} subscribed clients")
+        self.connections = self.subscribers.connections
 
         identity = self.load_or_generate_identity(
             identity_path
@@ -96,20 +237,82 @@ class ReticulumTelemetryHub:
             identity, display_name=display_name
         )  # Register delivery identity
 
-        self.identities = {}  # Dictionary to store identities
+        # Announces back off while the network is stable, see schedule
+        self.announcer = AnnounceScheduler(
+            self.announce,
+            announce_policy,
+            interfaces=lambda: list(RNS.Transport.interfaces),
+        )
+
+        # Peers heard announcing, bounded in memory and kept in the database
+        self.peers = PeerDirectory(
+            self.tel_controller.storage,
+            max_peers=peer_cache_size,
+            ttl=peer_ttl,
+        )
+        loaded = self.peers.start()
+        if loaded:
+            RNS.log(f"Loaded {loaded} known peers")
 
         self.lxm_router.set_message_storage_limit(megabytes=5)
 
-        # Register delivery callback
-        self.lxm_router.register_delivery_callback(
-            lambda msg: self.delivery_callback(msg)
-        )
+        # Broadcasts are sent from a worker pool, off the delivery callback
+        self.fanout = BroadcastFanout(self.lxm_router, self.my_lxmf_dest)
+        self.fanout.start()
+
+        # Delivered messages are only queued on the transport thread
+        self.pipeline = self.build_pipeline(pipeline_workers)
+        self.pipeline.start()
+        self.lxm_router.register_delivery_callback(self.enqueue_delivery)
+
+        # Identity hashes allowed to read the metrics over LXMF
+        self.admins = set(admins or ())
+        self.register_metrics()
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(REGISTRY, port=metrics_port)
+            self.metrics_server.start()
 
         # Register announce handler
         RNS.Transport.register_announce_handler(
-            AnnounceHandler(self.identities)
+            AnnounceHandler(self.peers)
         )
 
+    def register_metrics(self):
+        """Expose the size of the hub's queues and maps, read only when scraped."""
+        gauges = {
+            "rth_connections": ("Connected clients", lambda: len(self.connections)),
+            "rth_identities": ("Peers held in memory", lambda: len(self.peers)),
+            "rth_destinations_cached": (
+                "Outbound destinations in the cache",
+                lambda: len(self.destinations),
+            ),
+            "rth_outbound_queue": (
+                "Messages waiting in the LXMF router",
+                lambda: len(self.lxm_router.pending_outbound),
+            ),
+            "rth_pipeline_depth": (
+                "Messages queued in the inbound pipeline",
+                lambda: sum(stage.depth() for stage in self.pipeline.stages),
+            ),
+            "rth_pipeline_dropped": (
+                "Messages dropped by a full inbound pipeline",
+                lambda: self.pipeline.dropped,
+            ),
+            "rth_ingest_pending": (
+                "Telemeters waiting to be committed",
+                lambda: self.tel_controller.ingest_queue.pending()
+                if self.tel_controller.ingest_queue
+                else 0,
+            ),
+            "rth_fanout_pending": (
+                "Broadcasts waiting to be sent",
+                lambda: self.fanout.pending(),
+            ),
+        }
+        for name, (help, callback) in gauges.items():
+            REGISTRY.gauge(name, help, callback)
+
     def command_handler(self, commands: list, message: LXMF.LXMessage):
         """Handles commands received from the client and sends responses back.
 
@@ -118,16 +321,14 @@ class ReticulumTelemetryHub:
             message (LXMF.LXMessage): LXMF message object
         """
         for command in commands:
-            print(f"Command: {command}")
+            COMMANDS_RECEIVED.inc()
+            command_log.debug("Command: %s", command)
+            if PLUGIN_COMMAND in command and command[PLUGIN_COMMAND] == "metrics":
+                self.send_metrics(message)
+                continue
             if PLUGIN_COMMAND in command and command[PLUGIN_COMMAND] == "join":
-                dest = RNS.Destination(
-                    message.source.identity,
-                    RNS.Destination.OUT,
-                    RNS.Destination.SINGLE,
-                    "lxmf",
-                    "delivery",
-                )
-                self.connections[dest.identity.hash] = dest
+                dest = self.subscribers.join(message.source.identity)
+                self.announcer.topology_changed("join")
                 RNS.log(f"Connection added: {message.source}")
                 confirmation = LXMF.LXMessage(
                     dest,
@@ -138,14 +339,8 @@ class ReticulumTelemetryHub:
                 self.lxm_router.handle_outbound(confirmation)
                 continue  # Skip the rest of the loop
             elif PLUGIN_COMMAND in command and command[PLUGIN_COMMAND] == "leave":
-                dest = RNS.Destination(
-                    message.source.identity,
-                    RNS.Destination.OUT,
-                    RNS.Destination.SINGLE,
-                    "lxmf",
-                    "delivery",
-                )
-                self.connections.pop(dest.identity.hash, None)
+                dest = self.subscribers.leave(message.source.identity)
+                self.announcer.topology_changed("leave")
                 RNS.log(f"Connection removed: {message.source}")
                 confirmation = LXMF.LXMessage(
                     dest,
@@ -155,91 +350,169 @@ class ReticulumTelemetryHub:
                 )
                 self.lxm_router.handle_outbound(confirmation)
                 continue
-            msg = self.tel_controller.handle_command(
+            for msg in self.tel_controller.handle_command(
                 command, message, self.my_lxmf_dest
-            )
-            if msg:
+            ):
                 self.lxm_router.handle_outbound(msg)
 
+    def send_metrics(self, message: LXMF.LXMessage):
+        """Answer a metrics command from an admin identity."""
+        requester = RNS.hexrep(message.source.identity.hash, False)
+        if requester not in self.admins:
+            command_log.warning("Metrics requested by non-admin %s", requester)
+            return
+        dest = self.destinations.for_message(message)
+        reply = LXMF.LXMessage(
+            dest,
+            self.my_lxmf_dest,
+            REGISTRY.render_prometheus(),
+            "Metrics",
+            desired_method=LXMF.LXMessage.DIRECT,
+            fields={LXMF.FIELD_RESULTS: REGISTRY.snapshot()},
+        )
+        self.lxm_router.handle_outbound(reply)
+
+    def enqueue_delivery(self, message: LXMF.LXMessage):
+        """Delivery callback, only queues the message on the inbound pipeline."""
+        MESSAGES_RECEIVED.inc()
+        self.pipeline.submit(message, message.source_hash)
+
+    def build_pipeline(
+        self, workers: Optional[dict[str, int]] = None
+    ) -> StagedPipeline:
+        """Create the classify, decode, persist and fan-out stages.
+
+        Messages are sharded by source hash, so messages from one peer are
+        handled in the order they were delivered. Messages arriving while the
+        first stage is full are dropped and counted after
+        ``PIPELINE_SUBMIT_TIMEOUT``.
+        """
+        workers = {**PIPELINE_WORKERS, **(workers or {})}
+        handlers = {
+            "classify": self.classify_message,
+            "decode": self.decode_message,
+            "persist": self.persist_and_respond,
+            "fanout": self.fan_out,
+        }
+        return StagedPipeline(
+            [
+                PipelineStage(
+                    name,
+                    handler,
+                    workers=workers[name],
+                    queue_size=PIPELINE_QUEUE_SIZE,
+                )
+                for name, handler in handlers.items()
+            ],
+            submit_timeout=PIPELINE_SUBMIT_TIMEOUT,
+        )
+
     def delivery_callback(self, message: LXMF.LXMessage):
-        """Callback function to handle incoming messages.
+        """Handle an incoming message on the calling thread.
+
+        Runs the same stages as the inbound pipeline, one after the other.
 
         Args:
             message (LXMF.LXMessage): LXMF message object
         """
         try:
-            # Format the timestamp of the message
-            time_string = time.strftime(
-                "%Y-%m-%d %H:%M:%S", time.localtime(message.timestamp)
-            )
-            signature_string = "Signature is invalid, reason undetermined"
-
-            # Determine the signature validation status
-            if message.signature_validated:
-                signature_string = "Validated"
-            elif message.unverified_reason == LXMF.LXMessage.SIGNATURE_INVALID:
-                signature_string = "Invalid signature"
-                return
-            elif message.unverified_reason == LXMF.LXMessage.SOURCE_UNKNOWN:
-                signature_string = "Cannot verify, source is unknown"
-                return
-
-            # Log the delivery details
-            self.log_delivery_details(message, time_string, signature_string)
-
-            # Handle the commands
-            if message.signature_validated and LXMF.FIELD_COMMANDS in message.fields:
-                self.command_handler(message.fields[LXMF.FIELD_COMMANDS], message)
-
-            # Handle telemetry data
-            if self.tel_controller.handle_message(message):
-                RNS.log("Telemetry data saved")
-
-            # Skip if the message content is empty
-            if message.content is None or message.content == b"":
-                return
-
-            # Broadcast the message to all connected clients
-            msg = (
-                self.identities[message.get_source().hash]
-                + " > "
-                + message.content_as_string()
-            )
-            self.send_message(msg)
+            inbound = self.classify_message(message)
+            for stage in (self.decode_message, self.persist_and_respond, self.fan_out):
+                if inbound is None:
+                    return
+                inbound = stage(inbound)
         except Exception as e:
             RNS.log(f"Error: {e}")
 
+    def classify_message(self, message: LXMF.LXMessage) -> Optional[InboundMessage]:
+        """Drop messages with an invalid signature and log the delivery."""
+        # Format the timestamp of the message
+        time_string = time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(message.timestamp)
+        )
+        signature_string = "Signature is invalid, reason undetermined"
+
+        # Determine the signature validation status
+        if message.signature_validated:
+            signature_string = "Validated"
+        elif message.unverified_reason == LXMF.LXMessage.SIGNATURE_INVALID:
+            return None
+        elif message.unverified_reason == LXMF.LXMessage.SOURCE_UNKNOWN:
+            return None
+
+        # Log the delivery details
+        self.log_delivery_details(message, time_string, signature_string)
+        return InboundMessage(message, time_string, signature_string)
+
+    def decode_message(self, inbound: InboundMessage) -> InboundMessage:
+        """Deserialize the telemetry carried by the message."""
+        if self.tel_controller.has_telemetry(inbound.message):
+            inbound.telemeters = self.tel_controller.decode_message(inbound.message)
+        return inbound
+
+    def persist_and_respond(self, inbound: InboundMessage) -> Optional[InboundMessage]:
+        """Answer commands and save telemetry, passing on messages with content."""
+        message = inbound.message
+
+        # Handle the commands
+        if message.signature_validated and LXMF.FIELD_COMMANDS in message.fields:
+            self.command_handler(message.fields[LXMF.FIELD_COMMANDS], message)
+
+        # Handle telemetry data
+        if inbound.telemeters:
+            self.tel_controller.save_telemeters(inbound.telemeters)
+            delivery_log.verbose(
+                "Saved %d telemeters", len(inbound.telemeters), sample="telemetry_saved"
+            )
+
+        # Skip if the message content is empty
+        if message.content is None or message.content == b"":
+            return None
+        return inbound
+
+    def fan_out(self, inbound: InboundMessage) -> None:
+        """Broadcast the message to all connected clients."""
+        message = inbound.message
+        # Senders may not have announced since the hub started
+        name = self.peers.display_name(message.source_hash) or RNS.prettyhexrep(
+            message.source_hash
+        )
+        msg = name + " > " + message.content_as_string()
+        self.send_message(msg)
+
     def send_message(self, message: str):
         """Sends a message to all connected clients.
 
         Args:
             message (str): Message to send
         """
-        for connection in self.connections:
-            response = LXMF.LXMessage(
-                connection,
-                self.my_lxmf_dest,
-                message,
-                desired_method=LXMF.LXMessage.DIRECT,
-            )
-            self.lxm_router.handle_outbound(response)
+        self.fanout.broadcast(message, self.subscribers.snapshot())
 
     def log_delivery_details(self, message, time_string, signature_string):
-        RNS.log("\t+--- LXMF Delivery ---------------------------------------------")
-        RNS.log(f"\t| Source hash            : {RNS.prettyhexrep(message.source_hash)}")
-        RNS.log(f"\t| Source instance        : {message.get_source()}")
-        RNS.log(
-            f"\t| Destination hash       : {RNS.prettyhexrep(message.destination_hash)}"
+        # Formatting a whole message is only worth it when someone reads it
+        if not delivery_log.enabled(RNS.LOG_VERBOSE):
+            return
+        if not delivery_log.enabled(RNS.LOG_DEBUG):
+            delivery_log.verbose(
+                "Message from %s",
+                RNS.prettyhexrep(message.source_hash),
+                sample="delivery",
+                signature=signature_string,
+            )
+            return
+        delivery_log.debug(
+            "Message from %s",
+            RNS.prettyhexrep(message.source_hash),
+            source=str(message.get_source()),
+            destination=RNS.prettyhexrep(message.destination_hash),
+            destination_instance=str(message.get_destination()),
+            transport_encryption=message.transport_encryption,
+            timestamp=time_string,
+            title=message.title_as_string(),
+            content=message.content_as_string(),
+            fields=message.fields,
+            signature=signature_string,
         )
-        # RNS.log(f"\t| Destination identity   : {message.source_identity}")
-        RNS.log(f"\t| Destination instance   : {message.get_destination()}")
-        RNS.log(f"\t| Transport Encryption   : {message.transport_encryption}")
-        RNS.log(f"\t| Timestamp              : {time_string}")
-        RNS.log(f"\t| Title                  : {message.title_as_string()}")
-        RNS.log(f"\t| Content                : {message.content_as_string()}")
-        RNS.log(f"\t| Fields                 : {message.fields}")
-        RNS.log(f"\t| Message signature      : {signature_string}")
-        RNS.log("\t+---------------------------------------------------------------")
 
     def load_or_generate_identity(self, identity_path):
         # Load existing identity or generate a new one
@@ -257,40 +530,68 @@ class ReticulumTelemetryHub:
         identity.to_file(identity_path)  # Save the new identity to file
         return identity
 
-    def interactive_loop(self):
-        # Periodically announce the LXMF identity
-        while True:
-            choice = input("Enter your choice (exit/announce/telemetry): ")
-
-            if choice == "exit":
-                break
-            elif choice == "announce":
-                self.my_lxmf_dest.announce()
-            elif choice == "telemetry":
-                connection_hash = input("Enter the connection hash: ")
-                found = False
-                for connection in self.connections:
-                    if connection.hexhash == connection_hash:
-                        message = LXMF.LXMessage(
-                            connection,
-                            self.my_lxmf_dest,
-                            "Requesting telemetry",
-                            desired_method=LXMF.LXMessage.DIRECT,
-                            fields={
-                                LXMF.FIELD_COMMANDS: [
-                                    {TelemetryController.TELEMETRY_REQUEST: 1000000000}
-                                ]
-                            },
-                        )
-                        self.lxm_router.handle_outbound(message)
-                        found = True
-                        break
-                if not found:
-                    print("Connection not found")
-    def headless_loop(self):
-        while True:
-            self.my_lxmf_dest.announce()
-            time.sleep(60)
+    def announce(self) -> int:
+        """Announce the hub's LXMF delivery destination, returns the packet size."""
+        packet = self.my_lxmf_dest.announce(send=False)
+        packet.send()
+        return len(packet.raw)
+
+    def announce_now(self):
+        """Announce at once, counted and rescheduled by the announce scheduler."""
+        self.announcer.announce_now("console")
+
+    def request_telemetry(self, connection_hash: str, encoding: Optional[str] = None) -> bool:
+        """Ask a connected client for its telemetry, False if it is not connected.
+
+        ``encoding`` asks hubs for another response encoding, e.g. ``"track"``.
+        """
+        command = {TelemetryController.TELEMETRY_REQUEST: 1000000000}
+        if encoding is not None:
+            command[TelemetryController.TELEMETRY_ENCODING] = encoding
+        for connection in self.subscribers.snapshot():
+            if connection.hexhash == connection_hash:
+                message = LXMF.LXMessage(
+                    connection,
+                    self.my_lxmf_dest,
+                    "Requesting telemetry",
+                    desired_method=LXMF.LXMessage.DIRECT,
+                    fields={LXMF.FIELD_COMMANDS: [command]},
+                )
+                self.lxm_router.handle_outbound(message)
+                return True
+        return False
+
+    def status(self) -> dict:
+        """Sizes of the hub's maps and queues, for the admin console."""
+        return {
+            "connections": len(self.connections),
+            "peers": len(self.peers),
+            "outbound": len(self.lxm_router.pending_outbound),
+            "pipeline": self.pipeline.stats(),
+            "announces": self.announcer.stats(),
+        }
+
+    def schedule(self, runtime: HubRuntime):
+        """Register the hub's background work and shutdown with ``runtime``."""
+        runtime.add_periodic(
+            "announce", ANNOUNCE_TICK, self.announcer.tick, jitter=0, run_now=True
+        )
+        if self.retention is not None:
+            runtime.add_periodic(
+                "retention", self.retention.interval, self.retention.run_once
+            )
+        runtime.add_shutdown_hook(self.shutdown)
+
+    def shutdown(self):
+        """Flush queued messages, telemetry and broadcasts before the hub exits."""
+        self.pipeline.stop()
+        self.fanout.stop()
+        self.peers.stop()
+        if self.retention is not None:
+            self.retention.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.tel_controller.shutdown()
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
@@ -298,19 +599,163 @@ if __name__ == "__main__":
         "-s", "--storage_dir", help="Storage directory path", default=STORAGE_PATH
     )
     ap.add_argument("--headless", action="store_true", help="Run in headless mode")
+    ap.add_argument(
+        "--announce_interval",
+        type=parse_duration,
+        help="Shortest time between announces of the hub, e.g. 60s",
+        default=timedelta(minutes=1),
+    )
+    ap.add_argument(
+        "--announce_max_interval",
+        type=parse_duration,
+        help="Longest time between announces while the network is stable, e.g. 1h",
+        default=timedelta(hours=1),
+    )
+    ap.add_argument(
+        "--announce_backoff",
+        type=float,
+        help="Factor the announce interval grows by while nothing changes, 1 to disable",
+        default=2.0,
+    )
+    ap.add_argument(
+        "--announce_jitter",
+        type=float,
+        help="Random spread of each announce interval as a fraction of it",
+        default=0.1,
+    )
     ap.add_argument("--display_name", help="Display name for the server", default="RTH")
+    ap.add_argument(
+        "--telemetry_chunk_bytes",
+        type=int,
+        help="Byte budget per telemetry response message, 0 sends a single message",
+        default=TELEMETRY_CHUNK_BYTES,
+    )
+    ap.add_argument(
+        "--storage_layout",
+        choices=LAYOUTS,
+        help=(
+            "How sensor data is stored. compact inserts faster and is smaller, but "
+            "reading sensors is no faster; it migrates existing joined rows"
+        ),
+        default=LAYOUT_JOINED,
+    )
+    ap.add_argument(
+        "--storage_partition",
+        choices=PARTITIONS,
+        help="Store telemetry in one database file per day or week, retention drops whole files",
+        default=None,
+    )
+    ap.add_argument(
+        "--pipeline_workers",
+        type=parse_pipeline_workers,
+        help="Worker threads per inbound stage, e.g. decode=4,persist=2",
+        default={},
+    )
+    ap.add_argument(
+        "--log_levels",
+        type=parse_log_levels,
+        help="Log level per subsystem, e.g. delivery=debug,telemetry=warning",
+        default={},
+    )
+    ap.add_argument("--log_json", help="Write hub log records as JSON lines to this file")
+    ap.add_argument(
+        "--log_sample_every",
+        type=int,
+        help="Keep one in this many repetitive per-message log records",
+        default=1,
+    )
+
+    ap.add_argument(
+        "--metrics_port",
+        type=int,
+        help="Serve Prometheus metrics on this local port",
+        default=None,
+    )
+    ap.add_argument(
+        "--admin",
+        action="append",
+        help="Identity hash allowed to request metrics over LXMF, can be repeated",
+        default=[],
+    )
+
+    ap.add_argument(
+        "--retention_age",
+        type=parse_duration,
+        help="Delete telemetry older than this, e.g. 30d",
+        default=None,
+    )
+    ap.add_argument(
+        "--retention_peer_rows",
+        type=int,
+        help="Keep at most this many telemetry entries per peer",
+        default=None,
+    )
+    ap.add_argument(
+        "--retention_max_mb",
+        type=float,
+        help="Delete the oldest telemetry while the database holds more than this",
+        default=None,
+    )
+    ap.add_argument(
+        "--downsample",
+        type=parse_tiers,
+        help="Downsampling tiers as age=interval pairs, e.g. 24h=5m,7d=1h",
+        default=[],
+    )
+    ap.add_argument(
+        "--peer_cache_size",
+        type=int,
+        help="Announced peers held in memory, the rest are read from the database",
+        default=PEER_CACHE_SIZE,
+    )
+    ap.add_argument(
+        "--peer_ttl",
+        type=parse_duration,
+        help="Forget peers from memory when not heard for this long, e.g. 7d",
+        default=None,
+    )
 
     args = ap.parse_args()
+    configure_logging(args.log_levels, args.log_json, args.log_sample_every)
 
     if args.storage_dir:
         storage_path = args.storage_dir
         identity_path = os.path.join(STORAGE_PATH, "identity")
 
     reticulum_server = ReticulumTelemetryHub(
-        args.display_name, storage_path, identity_path
+        args.display_name,
+        storage_path,
+        identity_path,
+        telemetry_chunk_bytes=args.telemetry_chunk_bytes or None,
+        storage_layout=args.storage_layout,
+        storage_partition=args.storage_partition,
+        pipeline_workers=args.pipeline_workers,
+        metrics_port=args.metrics_port,
+        admins=set(args.admin),
+        retention_policy=RetentionPolicy(
+            max_age=args.retention_age,
+            max_rows_per_peer=args.retention_peer_rows,
+            max_bytes=(
+                int(args.retention_max_mb * 1024 * 1024)
+                if args.retention_max_mb is not None
+                else None
+            ),
+            tiers=args.downsample,
+        ),
+        peer_cache_size=args.peer_cache_size,
+        peer_ttl=args.peer_ttl.total_seconds() if args.peer_ttl else PEER_TTL,
+        announce_policy=AnnouncePolicy(
+            min_interval=args.announce_interval.total_seconds(),
+            max_interval=args.announce_max_interval.total_seconds(),
+            backoff=args.announce_backoff,
+            jitter=args.announce_jitter,
+        ),
     )
 
-    if not args.headless:
-        reticulum_server.interactive_loop()
-    else:
-        reticulum_server.headless_loop()
+    runtime = HubRuntime()
+    reticulum_server.schedule(runtime)
+    console = [] if args.headless else [AdminConsole(reticulum_server, runtime).run()]
+    try:
+        runtime.run(*console)
+    except KeyboardInterrupt:
+        pass  # Platforms without loop signal handlers; hooks ran on the way out
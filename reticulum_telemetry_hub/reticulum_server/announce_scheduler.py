@@ -0,0 +1,150 @@
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from reticulum_telemetry_hub.hub_log import get_logger
+from reticulum_telemetry_hub.metrics import REGISTRY
+
+announce_log = get_logger("announce")
+
+ANNOUNCES_SENT = REGISTRY.counter("rth_announces_total", "Announces sent by the hub")
+ANNOUNCE_BYTES = REGISTRY.counter(
+    "rth_announce_bytes_total", "Bytes of announce packets sent by the hub"
+)
+
+
+def interface_signature(interfaces: Iterable) -> frozenset:
+    """Names of the interfaces that are online, to notice new or returning ones."""
+    return frozenset(
+        str(interface) for interface in interfaces if getattr(interface, "online", True)
+    )
+
+
+class AnnouncePolicy:
+    """How often a hub announces itself.
+
+    Announces start ``min_interval`` seconds apart and back off by
+    ``backoff`` up to ``max_interval`` while nothing changes, each spread by
+    up to ``jitter`` of the interval so hubs sharing a link do not announce
+    together. ``backoff=1`` announces every ``min_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 60.0,
+        max_interval: float = 3600.0,
+        backoff: float = 2.0,
+        jitter: float = 0.1,
+    ) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Announce intervals must satisfy 0 < min_interval <= max_interval")
+        if backoff < 1:
+            raise ValueError("backoff must be at least 1")
+        if not 0 <= jitter < 1:
+            raise ValueError("jitter must be at least 0 and below 1")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+
+
+class AnnounceScheduler:
+    """Decides when the hub announces itself, following an ``AnnouncePolicy``.
+
+    A client joining or leaving, or an interface coming up restarts the
+    backoff and announces at once, though never twice within
+    ``min_interval``. Peers merely heard announcing do not, on a busy mesh
+    they would keep the hub announcing at the shortest interval.
+
+    ``announce`` sends one announce and returns its size in bytes. ``tick``
+    is called often, e.g. every second, and announces when one is due.
+    """
+
+    def __init__(
+        self,
+        announce: Callable[[], Optional[int]],
+        policy: Optional[AnnouncePolicy] = None,
+        interfaces: Optional[Callable[[], Iterable]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.announce = announce
+        self.policy = policy or AnnouncePolicy()
+        self.interfaces = interfaces
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.interval = self.policy.min_interval
+        self.announces = 0
+        self.announce_bytes = 0
+        self.last_reason: Optional[str] = None
+        self._last_announce: Optional[float] = None
+        self._due = clock()  # Announce on the first tick
+        self._reason = "startup"
+        self._interfaces = interface_signature(interfaces()) if interfaces else frozenset()
+        self._lock = threading.Lock()
+
+    @property
+    def next_due(self) -> float:
+        return self._due
+
+    def topology_changed(self, reason: str) -> None:
+        """Announce as soon as allowed and restart the backoff, from any thread."""
+        with self._lock:
+            self.interval = self.policy.min_interval
+            earliest = self.clock()
+            if self._last_announce is not None:
+                earliest = max(earliest, self._last_announce + self.policy.min_interval)
+            if earliest < self._due:
+                self._due = earliest
+                self._reason = reason
+                announce_log.debug("Re-announcing after %s", reason)
+
+    def tick(self) -> bool:
+        """Announce if one is due, returns whether it did."""
+        if self.interfaces is not None:
+            signature = interface_signature(self.interfaces())
+            if signature - self._interfaces:
+                self.topology_changed("interface")
+            self._interfaces = signature
+        now = self.clock()
+        with self._lock:
+            if now < self._due:
+                return False
+            reason = self._reason
+        self._send(reason, now)
+        return True
+
+    def announce_now(self, reason: str = "manual") -> None:
+        """Announce immediately, e.g. on request of an admin."""
+        self._send(reason, self.clock())
+
+    def _send(self, reason: str, now: float) -> None:
+        size = self.announce() or 0
+        with self._lock:
+            self.announces += 1
+            self.announce_bytes += size
+            self.last_reason = reason
+            self._last_announce = now
+            self._due = now + self._jittered(self.interval)
+            self._reason = "periodic"
+            self.interval = min(self.interval * self.policy.backoff, self.policy.max_interval)
+        ANNOUNCES_SENT.inc()
+        ANNOUNCE_BYTES.inc(size)
+        announce_log.verbose(
+            "Announced (%s, %d bytes), next in %.0f s", reason, size, self._due - now
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "announces": self.announces,
+                "bytes": self.announce_bytes,
+                "interval": self.interval,
+                "next_in": max(0.0, self._due - self.clock()),
+                "last_reason": self.last_reason,
+            }
+
+    def _jittered(self, interval: float) -> float:
+        spread = interval * self.policy.jitter
+        return interval + self.rng.uniform(-spread, spread)
@@ -0,0 +1,272 @@
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+import LXMF
+import RNS
+
+from reticulum_telemetry_hub.metrics import REGISTRY
+
+FANOUT_MESSAGES = {
+    "enqueued": REGISTRY.counter(
+        "rth_fanout_enqueued_total", "Broadcast messages queued for a recipient"
+    ),
+    "sent": REGISTRY.counter("rth_fanout_sent_total", "Broadcast messages handed to LXMF"),
+    "propagated": REGISTRY.counter(
+        "rth_fanout_propagated_total", "Broadcast messages sent through a propagation node"
+    ),
+    "dropped": REGISTRY.counter(
+        "rth_fanout_dropped_total", "Broadcast messages dropped from a full recipient queue"
+    ),
+    "failed": REGISTRY.counter(
+        "rth_fanout_failed_total", "Broadcast messages LXMF refused to send"
+    ),
+}
+# Paced recipients may wait several intervals behind earlier broadcasts
+FANOUT_LATENCY = REGISTRY.histogram(
+    "rth_fanout_latency_seconds",
+    "Seconds from queueing a broadcast to handing it to LXMF",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+class FanoutStats:
+    """Counters for broadcast fan-out, also exported as ``rth_fanout_*`` metrics."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.sent = 0
+        self.propagated = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+        FANOUT_MESSAGES[name].inc(amount)
+
+    def record_sent(self, latency: float, propagated: bool) -> None:
+        with self._lock:
+            self.sent += 1
+            if propagated:
+                self.propagated += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        FANOUT_MESSAGES["sent"].inc()
+        if propagated:
+            FANOUT_MESSAGES["propagated"].inc()
+        FANOUT_LATENCY.observe(latency)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "propagated": self.propagated,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "latency_seconds_mean": self.latency_total / self.sent if self.sent else 0.0,
+                "latency_seconds_max": self.latency_max,
+            }
+
+
+class _Outgoing:
+    __slots__ = ("content", "title", "fields", "enqueued_at")
+
+    def __init__(self, content: str, title: str, fields: Optional[dict]) -> None:
+        self.content = content
+        self.title = title
+        self.fields = fields
+        self.enqueued_at = time.monotonic()
+
+
+class BroadcastFanout:
+    """Delivers broadcast messages to many recipients from a worker pool.
+
+    Every recipient has its own bounded queue; when it is full the oldest
+    message for that recipient is dropped. Workers never send to the same
+    recipient concurrently, keep per-recipient order and wait at least
+    ``min_interval`` seconds between two messages to the same recipient.
+    Recipients without a known path are sent PROPAGATED when the router has
+    an outbound propagation node.
+    """
+
+    def __init__(
+        self,
+        router: LXMF.LXMRouter,
+        source: RNS.Destination,
+        workers: int = 4,
+        queue_size: int = 32,
+        min_interval: float = 0.0,
+        propagation_fallback: bool = True,
+        has_path: Callable[[bytes], bool] = RNS.Transport.has_path,
+    ) -> None:
+        self.router = router
+        self.source = source
+        self.workers = workers
+        self.queue_size = queue_size
+        self.min_interval = min_interval
+        self.propagation_fallback = propagation_fallback
+        self.has_path = has_path
+        self.stats = FanoutStats()
+        self._cond = threading.Condition()
+        self._pending: dict[bytes, deque] = {}
+        self._recipients: dict[bytes, RNS.Destination] = {}
+        self._last_sent: dict[bytes, float] = {}
+        self._schedule: list[tuple[float, bytes]] = []
+        self._scheduled: set[bytes] = set()
+        self._busy = 0
+        self._threads: list[threading.Thread] = []
+        self._running = False
+
+    def start(self) -> None:
+        """Start the worker pool."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [
+            threading.Thread(target=self._work, name=f"fanout-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """Stop the workers, sending queued messages first unless ``drain`` is False."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            if not drain:
+                dropped = sum(len(pending) for pending in self._pending.values())
+                self.stats.record("dropped", dropped)
+                self._pending.clear()
+                self._schedule.clear()
+                self._scheduled.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def pending(self) -> int:
+        """Number of messages waiting to be sent."""
+        with self._cond:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def broadcast(
+        self,
+        content: str,
+        recipients: Iterable[RNS.Destination],
+        title: str = "",
+        fields: Optional[dict] = None,
+    ) -> int:
+        """Queue ``content`` for every recipient and return how many were queued."""
+        outgoing = _Outgoing(content, title, fields)
+        queued = 0
+        now = time.monotonic()
+        with self._cond:
+            if not self._running:
+                return 0
+            for recipient in recipients:
+                key = recipient.hash
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = deque()
+                self._recipients[key] = recipient
+                if len(pending) >= self.queue_size:
+                    pending.popleft()
+                    self.stats.record("dropped")
+                pending.append(outgoing)
+                queued += 1
+                if key not in self._scheduled:
+                    ready_at = self._last_sent.get(key, 0.0) + self.min_interval
+                    heapq.heappush(self._schedule, (max(now, ready_at), key))
+                    self._scheduled.add(key)
+            self.stats.record("enqueued", queued)
+            self._cond.notify_all()
+        return queued
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message has been handed to the router."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._schedule or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                key = self._next_ready()
+                if key is None:
+                    return
+                outgoing = self._pending[key].popleft()
+                recipient = self._recipients[key]
+                self._busy += 1
+            try:
+                self._send(recipient, outgoing)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._last_sent[key] = time.monotonic()
+                    if self._pending.get(key):
+                        heapq.heappush(
+                            self._schedule, (self._last_sent[key] + self.min_interval, key)
+                        )
+                    else:
+                        self._scheduled.discard(key)
+                        self._pending.pop(key, None)
+                        self._recipients.pop(key, None)
+                    self._cond.notify_all()
+
+    def _next_ready(self) -> Optional[bytes]:
+        """Pop the next recipient whose pacing interval has passed, waiting if needed."""
+        while True:
+            if not self._schedule:
+                if not self._running:
+                    return None
+                self._cond.wait()
+                continue
+            ready_at, key = self._schedule[0]
+            wait = ready_at - time.monotonic()
+            # Pacing is skipped while draining on shutdown
+            if wait > 0 and self._running:
+                self._cond.wait(wait)
+                continue
+            heapq.heappop(self._schedule)
+            return key
+
+    def _send(self, recipient: RNS.Destination, outgoing: _Outgoing) -> None:
+        method = LXMF.LXMessage.DIRECT
+        if (
+            self.propagation_fallback
+            and not self.has_path(recipient.hash)
+            and self.router.get_outbound_propagation_node() is not None
+        ):
+            method = LXMF.LXMessage.PROPAGATED
+        try:
+            message = LXMF.LXMessage(
+                recipient,
+                self.source,
+                outgoing.content,
+                outgoing.title,
+                fields=outgoing.fields,
+                desired_method=method,
+            )
+            self.router.handle_outbound(message)
+        except Exception as e:
+            self.stats.record("failed")
+            RNS.log(f"Could not send broadcast to {recipient}: {e}", RNS.LOG_ERROR)
+            return
+        self.stats.record_sent(
+            time.monotonic() - outgoing.enqueued_at, method == LXMF.LXMessage.PROPAGATED
+        )
@@ -0,0 +1,219 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+
+import LXMF
+import RNS
+from sqlalchemy import Row, select
+from sqlalchemy.dialects.sqlite import insert
+
+from reticulum_telemetry_hub.lxmf_telemetry.ingest_queue import TelemetryIngestQueue
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.peer import Peer
+from reticulum_telemetry_hub.lxmf_telemetry.storage import TelemetryStorage
+
+# Core access keeps lookups cheap and independent of the telemetry mappers
+_PEERS = Peer.__table__
+
+
+def decode_display_name(app_data: Optional[bytes]) -> Optional[str]:
+    """Display name from announce app data in the legacy UTF-8 or msgpack format."""
+    try:
+        return LXMF.display_name_from_app_data(app_data)
+    except Exception:
+        return None
+
+
+class PeerRecord:
+    """A peer heard announcing, as held in the directory's hot set."""
+
+    __slots__ = ("destination_hash", "display_name", "app_data", "last_heard")
+
+    def __init__(
+        self,
+        destination_hash: bytes,
+        display_name: Optional[str],
+        app_data: Optional[bytes],
+        last_heard: float,
+    ) -> None:
+        self.destination_hash = destination_hash
+        self.display_name = display_name
+        self.app_data = app_data
+        self.last_heard = last_heard
+
+
+class PeerDirectory:
+    """Peers heard on the network, bounded in memory and persisted to ``Peer``.
+
+    The hot set keeps at most ``max_peers`` peers, evicting the least
+    recently used, and forgets peers not heard for ``ttl`` seconds. Announces
+    are written to the database in the background; lookups that miss the hot
+    set fall back to the database, so peers survive restarts and eviction.
+    Peers not heard for ``ttl`` seconds are missing from both.
+    """
+
+    def __init__(
+        self,
+        storage: TelemetryStorage,
+        max_peers: int = 10000,
+        ttl: float = 7 * 24 * 3600,
+        max_batch_age: float = 2.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.storage = storage
+        self.clock = clock
+        self.max_peers = max_peers
+        self.ttl = ttl
+        self._hot: OrderedDict[bytes, PeerRecord] = OrderedDict()
+        # (last_heard, hash) of hot peers, stale entries are skipped when popped
+        self._expiry: list[tuple[float, bytes]] = []
+        self._lock = threading.Lock()
+        # Announces arrive on the transport thread, which must never wait on disk
+        self._writer = TelemetryIngestQueue(
+            self._write_peers,
+            max_batch_age=max_batch_age,
+            put_timeout=0.1,
+            name="peer-directory",
+        )
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+    def start(self) -> int:
+        """Warm the hot set from the database and start persisting announces.
+
+        Returns how many peers were loaded.
+        """
+        loaded = self.warm_load()
+        self._writer.start()
+        return loaded
+
+    def stop(self) -> None:
+        """Write pending announces and stop the background writer."""
+        self._writer.stop()
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+    def warm_load(self) -> int:
+        """Load the most recently heard peers that are still within the TTL."""
+        oldest = datetime.fromtimestamp(self.clock() - self.ttl)
+        with self.storage.engine.connect() as conn:
+            peers = conn.execute(
+                select(_PEERS)
+                .where(_PEERS.c.last_heard >= oldest)
+                .order_by(_PEERS.c.last_heard.desc())
+                .limit(self.max_peers)
+            ).all()
+        with self._lock:
+            for peer in reversed(peers):
+                self._remember(self._record_from_peer(peer))
+            self._evict()
+        return len(peers)
+
+    def record_announce(
+        self, destination_hash: bytes, app_data: Optional[bytes]
+    ) -> PeerRecord:
+        """Remember an announce, queuing it to be persisted."""
+        record = PeerRecord(
+            destination_hash, decode_display_name(app_data), app_data, self.clock()
+        )
+        with self._lock:
+            self._remember(record)
+            self._evict()
+        self._writer.put(record)
+        return record
+
+    def get(self, destination_hash: bytes) -> Optional[PeerRecord]:
+        """Look a peer up in the hot set, then in the database."""
+        with self._lock:
+            record = self._hot.get(destination_hash)
+            if record is not None:
+                if self.clock() - record.last_heard <= self.ttl:
+                    self._hot.move_to_end(destination_hash)
+                    return record
+                del self._hot[destination_hash]
+        with self.storage.engine.connect() as conn:
+            peer = conn.execute(
+                select(_PEERS).where(
+                    _PEERS.c.destination_hash == RNS.hexrep(destination_hash, False)
+                )
+            ).first()
+        if peer is None:
+            return None
+        record = self._record_from_peer(peer)
+        if self.clock() - record.last_heard > self.ttl:
+            return None
+        with self._lock:
+            # Keep a record that may have been announced meanwhile
+            if destination_hash in self._hot:
+                record = self._hot[destination_hash]
+                self._hot.move_to_end(destination_hash)
+            else:
+                self._remember(record)
+            self._evict()
+        return record
+
+    def display_name(self, destination_hash: bytes) -> Optional[str]:
+        record = self.get(destination_hash)
+        return record.display_name if record is not None else None
+
+    def _remember(self, record: PeerRecord) -> None:
+        self._hot[record.destination_hash] = record
+        self._hot.move_to_end(record.destination_hash)
+        heapq.heappush(self._expiry, (record.last_heard, record.destination_hash))
+
+    def _evict(self) -> None:
+        while len(self._hot) > self.max_peers:
+            self._hot.popitem(last=False)
+        # Lookups reorder the hot set without hearing the peer, so expiry
+        # follows the heap of last_heard instead of the least recently used end
+        deadline = self.clock() - self.ttl
+        expiry = self._expiry
+        while expiry and expiry[0][0] < deadline:
+            _, destination_hash = heapq.heappop(expiry)
+            record = self._hot.get(destination_hash)
+            if record is not None and record.last_heard < deadline:
+                del self._hot[destination_hash]
+        # Drop the entries of evicted and re-announced peers once they pile up
+        if len(expiry) > 2 * len(self._hot) + 64:
+            self._expiry = [
+                (record.last_heard, destination_hash)
+                for destination_hash, record in self._hot.items()
+            ]
+            heapq.heapify(self._expiry)
+
+    @staticmethod
+    def _record_from_peer(peer: Row) -> PeerRecord:
+        return PeerRecord(
+            bytes.fromhex(peer.destination_hash),
+            peer.display_name,
+            peer.app_data,
+            peer.last_heard.timestamp() if peer.last_heard else 0.0,
+        )
+
+    def _write_peers(self, records: list[PeerRecord]) -> None:
+        # Only the latest announce of every peer in the batch is written
+        latest = {record.destination_hash: record for record in records}
+        rows = [
+            {
+                "destination_hash": RNS.hexrep(record.destination_hash, False),
+                "display_name": record.display_name,
+                "app_data": record.app_data,
+                "last_heard": datetime.fromtimestamp(record.last_heard),
+            }
+            for record in latest.values()
+        ]
+        statement = insert(_PEERS)
+        statement = statement.on_conflict_do_update(
+            index_elements=[_PEERS.c.destination_hash],
+            set_={
+                "display_name": statement.excluded.display_name,
+                "app_data": statement.excluded.app_data,
+                "last_heard": statement.excluded.last_heard,
+            },
+        )
+        with self.storage.engine.begin() as conn:
+            conn.execute(statement, rows)
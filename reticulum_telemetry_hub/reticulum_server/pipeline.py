@@ -0,0 +1,160 @@
+import queue
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+import RNS
+
+_STOP = object()
+
+
+class PipelineStage:
+    """One stage of a ``StagedPipeline``.
+
+    The stage runs ``handler`` on ``workers`` threads, each with its own
+    bounded queue. Items are assigned to a worker by the hash of their key,
+    so items sharing a key are processed one at a time and in order. The
+    handler's return value is passed to the next stage; ``None`` ends
+    processing of the item.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Any],
+        workers: int = 1,
+        queue_size: int = 256,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("a pipeline stage needs at least one worker")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.next_stage: Optional["PipelineStage"] = None
+        self.processed = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._threads = [
+            threading.Thread(
+                target=self._work, args=(q,), name=f"{self.name}-{i}", daemon=True
+            )
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item, key: Hashable, timeout: Optional[float] = None) -> bool:
+        """Queue ``item`` on the worker owning ``key``, False if it stayed full."""
+        try:
+            self._queues[hash(key) % self.workers].put((key, item), timeout=timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def join(self) -> None:
+        for q in self._queues:
+            q.join()
+
+    def stop(self) -> None:
+        """Process everything already queued, then stop the workers."""
+        for q in self._queues:
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _work(self, q: queue.Queue) -> None:
+        while True:
+            entry = q.get()
+            if entry is _STOP:
+                q.task_done()
+                return
+            key, item = entry
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                result = None
+                with self._lock:
+                    self.errors += 1
+                RNS.log(f"Pipeline stage {self.name} failed: {e}", RNS.LOG_ERROR)
+            with self._lock:
+                self.processed += 1
+            if result is not None and self.next_stage is not None:
+                # Blocks when the next stage is full, pushing back on this one
+                self.next_stage.put(result, key)
+            q.task_done()
+
+
+class StagedPipeline:
+    """Chain of ``PipelineStage`` objects connected by bounded queues.
+
+    ``submit`` hands an item to the first stage; when that stage stays full
+    for ``submit_timeout`` seconds the item is dropped and counted.
+    """
+
+    def __init__(self, stages: list[PipelineStage], submit_timeout: Optional[float] = None) -> None:
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        self.submit_timeout = submit_timeout
+        self.dropped = 0
+        self._running = False
+        # submit is called from several delivery threads
+        self._lock = threading.Lock()
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        if self._running:
+            return
+        for stage in self.stages:
+            stage.start()
+        self._running = True
+
+    def submit(self, item, key: Hashable) -> bool:
+        """Queue ``item`` for processing; items with the same key keep their order."""
+        if not self._running:
+            return False
+        if not self.stages[0].put(item, key, timeout=self.submit_timeout):
+            with self._lock:
+                self.dropped += 1
+            RNS.log("Inbound pipeline is full, message dropped", RNS.LOG_ERROR)
+            return False
+        return True
+
+    def join(self) -> None:
+        """Wait until every submitted item has left the pipeline."""
+        for stage in self.stages:
+            stage.join()
+
+    def stop(self) -> None:
+        """Drain all stages in order and stop their workers."""
+        if not self._running:
+            return
+        self._running = False
+        for stage in self.stages:
+            stage.stop()
+
+    def stats(self) -> dict:
+        return {
+            "dropped": self.dropped,
+            "stages": {
+                stage.name: {
+                    "workers": stage.workers,
+                    "depth": stage.depth(),
+                    "processed": stage.processed,
+                    "errors": stage.errors,
+                }
+                for stage in self.stages
+            },
+        }
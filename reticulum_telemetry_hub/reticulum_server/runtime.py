@@ -0,0 +1,278 @@
+"""asyncio runtime that owns the hub's lifecycle.
+
+RNS and LXMF call back from their own threads, which hand the work to the
+hub's queues. Background work is registered as periodic tasks instead of
+dedicated threads, blocking work runs on one shared executor, and shutdown
+hooks drain the hub's queues before the loop exits.
+"""
+
+import asyncio
+import inspect
+import random
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from reticulum_telemetry_hub.hub_log import get_logger
+
+runtime_log = get_logger("runtime")
+
+
+class PeriodicTask:
+    """A callback run every ``interval`` seconds, spread by up to ``jitter`` of it.
+
+    Blocking callbacks run on the runtime's executor, others on the loop;
+    coroutine functions are awaited.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval: float,
+        callback: Callable[[], Any],
+        jitter: float = 0.1,
+        run_now: bool = False,
+        blocking: bool = True,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if not 0 <= jitter < 1:
+            raise ValueError("jitter must be at least 0 and below 1")
+        self.name = name
+        self.interval = interval
+        self.callback = callback
+        self.jitter = jitter
+        self.run_now = run_now
+        self.blocking = blocking and not inspect.iscoroutinefunction(callback)
+        self.runs = 0
+        self.failures = 0
+        self.last_seconds: Optional[float] = None
+
+    def next_delay(self, rng: random.Random) -> float:
+        spread = self.interval * self.jitter
+        return self.interval + rng.uniform(-spread, spread)
+
+    def as_dict(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_seconds": self.last_seconds,
+        }
+
+
+class HubRuntime:
+    """Event loop, periodic tasks and shutdown sequence of a running hub."""
+
+    def __init__(self, workers: int = 4, seed: Optional[int] = None) -> None:
+        self.tasks: list[PeriodicTask] = []
+        self._shutdown_hooks: list[Callable[[], Any]] = []
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="rth-runtime")
+        self._rng = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._background: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def add_periodic(
+        self,
+        name: str,
+        interval: float,
+        callback: Callable[[], Any],
+        jitter: float = 0.1,
+        run_now: bool = False,
+        blocking: bool = True,
+    ) -> PeriodicTask:
+        """Run ``callback`` periodically once the runtime is serving."""
+        task = PeriodicTask(name, interval, callback, jitter, run_now, blocking)
+        self.tasks.append(task)
+        if self.running:
+            self._loop.call_soon_threadsafe(self._spawn, self._run_periodic(task))
+        return task
+
+    def add_shutdown_hook(self, callback: Callable[[], Any]) -> None:
+        """Run a blocking ``callback`` on shutdown, after the periodic tasks stopped."""
+        self._shutdown_hooks.append(callback)
+
+    async def run_blocking(self, callback: Callable[..., Any], *args) -> Any:
+        """Run a blocking callable on the runtime's executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, callback, *args
+        )
+
+    def stop(self) -> None:
+        """Ask the runtime to shut down, from any thread."""
+        loop, stopping = self._loop, self._stopping
+        if loop is None or stopping is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(stopping.set)
+
+    def run(self, *coroutines) -> None:
+        """Serve until stopped, blocking the calling thread."""
+        asyncio.run(self.serve(*coroutines))
+
+    async def serve(self, *coroutines) -> None:
+        """Run the periodic tasks and ``coroutines`` until ``stop`` is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        signals = self._install_signal_handlers()
+        try:
+            for task in self.tasks:
+                self._spawn(self._run_periodic(task))
+            for coroutine in coroutines:
+                self._spawn(coroutine)
+            await self._stopping.wait()
+        finally:
+            runtime_log.info("Shutting down")
+            for task in list(self._background):
+                task.cancel()
+            await asyncio.gather(*self._background, return_exceptions=True)
+            for hook in self._shutdown_hooks:
+                try:
+                    await self.run_blocking(hook)
+                except Exception as e:
+                    runtime_log.error("Shutdown hook %s failed: %s", hook, e)
+            for signum in signals:
+                self._loop.remove_signal_handler(signum)
+            self._executor.shutdown(wait=True)
+            self._loop = None
+
+    def _install_signal_handlers(self) -> list[int]:
+        installed = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signum, self._stopping.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                continue  # Not the main thread, or a platform without them
+            installed.append(signum)
+        return installed
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._finished)
+        return task
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            runtime_log.error("Background task failed: %s", task.exception())
+
+    async def _run_periodic(self, task: PeriodicTask) -> None:
+        delay = 0.0 if task.run_now else task.next_delay(self._rng)
+        while True:
+            await asyncio.sleep(delay)
+            started = time.perf_counter()
+            try:
+                if task.blocking:
+                    await self.run_blocking(task.callback)
+                else:
+                    result = task.callback()
+                    if inspect.isawaitable(result):
+                        await result
+                task.runs += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                task.failures += 1
+                runtime_log.error("Periodic task %s failed: %s", task.name, e)
+            task.last_seconds = time.perf_counter() - started
+            delay = task.next_delay(self._rng)
+
+
+def _write_stdout(text: str) -> None:
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+class AdminConsole:
+    """Line based admin commands, read without blocking the event loop.
+
+    ``hub`` provides ``announce_now``, ``request_telemetry`` and ``status``.
+    """
+
+    PROMPT = "rth> "
+    HELP = (
+        "Commands:\n"
+        "  announce          announce the hub now\n"
+        "  telemetry <hash> [track]\n"
+        "                    request telemetry from a connected client,\n"
+        "                    delta encoded as a track when it is a hub\n"
+        "  status            show queues, peers and background tasks\n"
+        "  exit              shut the hub down\n"
+    )
+
+    def __init__(
+        self,
+        hub,
+        runtime: HubRuntime,
+        reader: Optional[asyncio.StreamReader] = None,
+        write: Callable[[str], None] = _write_stdout,
+    ) -> None:
+        self.hub = hub
+        self.runtime = runtime
+        self.reader = reader
+        self.write = write
+
+    async def run(self) -> None:
+        """Read commands until ``exit`` or the end of input, then stop the runtime."""
+        readline = await self._readline()
+        self.write(self.HELP)
+        while True:
+            self.write(self.PROMPT)
+            line = await readline()
+            if not line:
+                break
+            if not await self.handle(line.decode("utf-8", "replace").strip()):
+                break
+        self.runtime.stop()
+
+    async def handle(self, line: str) -> bool:
+        """Run one command, False once the console should exit."""
+        command, _, argument = line.partition(" ")
+        if command in ("exit", "quit"):
+            return False
+        if command == "announce":
+            await self.runtime.run_blocking(self.hub.announce_now)
+            self.write("Announced\n")
+        elif command == "telemetry":
+            args = argument.split()
+            if not 1 <= len(args) <= 2:
+                self.write("Usage: telemetry <connection hash> [track]\n")
+            elif await self.runtime.run_blocking(self.hub.request_telemetry, *args):
+                self.write("Telemetry requested\n")
+            else:
+                self.write("Connection not found\n")
+        elif command == "status":
+            status = self.hub.status()
+            status["tasks"] = {task.name: task.as_dict() for task in self.runtime.tasks}
+            for name, value in status.items():
+                self.write(f"{name}: {value}\n")
+        elif command in ("help", "?"):
+            self.write(self.HELP)
+        elif command:
+            self.write(f"Unknown command {command!r}\n")
+        return True
+
+    async def _readline(self) -> Callable[[], Any]:
+        if self.reader is not None:
+            return self.reader.readline
+        reader = asyncio.StreamReader()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+            )
+        except (ValueError, OSError):
+            # Regular files cannot be watched by the loop, but never block either
+            async def read_file() -> bytes:
+                line = await self.runtime.run_blocking(sys.stdin.readline)
+                return line.encode("utf-8")
+
+            return read_file
+        return reader.readline
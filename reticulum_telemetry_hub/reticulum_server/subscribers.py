@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime
+
+import RNS
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+from reticulum_telemetry_hub.destinations import DestinationCache
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.subscriber import Subscriber
+from reticulum_telemetry_hub.lxmf_telemetry.storage import TelemetryStorage
+
+_SUBSCRIBERS = Subscriber.__table__
+
+
+class SubscriberStore:
+    """Clients joined to the hub, kept in memory and in the ``Subscriber`` table.
+
+    ``connections`` maps identity hashes to delivery destinations taken from
+    the shared destination cache. Joins and leaves are written through at
+    once; they are rare compared to the broadcasts that read the map.
+    """
+
+    def __init__(self, storage: TelemetryStorage, destinations: DestinationCache) -> None:
+        self.storage = storage
+        self.destinations = destinations
+        self.connections: dict[bytes, RNS.Destination] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def load(self) -> int:
+        """Restore the subscribers stored by a previous run, returns how many."""
+        with self.storage.engine.connect() as conn:
+            rows = conn.execute(select(_SUBSCRIBERS)).all()
+        for row in rows:
+            identity = RNS.Identity(create_keys=False)
+            if not identity.load_public_key(row.public_key):
+                RNS.log(
+                    f"Dropping subscriber {row.identity_hash} with an invalid key",
+                    RNS.LOG_WARNING,
+                )
+                self._delete(bytes.fromhex(row.identity_hash))
+                continue
+            with self._lock:
+                self.connections[identity.hash] = self.destinations.get(identity)
+        return len(self.connections)
+
+    def join(self, identity: RNS.Identity) -> RNS.Destination:
+        """Subscribe ``identity`` and return its delivery destination."""
+        dest = self.destinations.get(identity)
+        with self._lock:
+            self.connections[identity.hash] = dest
+        statement = insert(_SUBSCRIBERS).values(
+            identity_hash=RNS.hexrep(identity.hash, False),
+            public_key=identity.get_public_key(),
+            joined=datetime.now(),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[_SUBSCRIBERS.c.identity_hash],
+            set_={"public_key": statement.excluded.public_key},
+        )
+        with self.storage.engine.begin() as conn:
+            conn.execute(statement)
+        return dest
+
+    def leave(self, identity: RNS.Identity) -> RNS.Destination:
+        """Unsubscribe ``identity`` and return its delivery destination."""
+        with self._lock:
+            self.connections.pop(identity.hash, None)
+        self._delete(identity.hash)
+        return self.destinations.get(identity)
+
+    def snapshot(self) -> list[RNS.Destination]:
+        """Destinations of all subscribers, safe to iterate while clients join."""
+        with self._lock:
+            return list(self.connections.values())
+
+    def _delete(self, identity_hash: bytes) -> None:
+        with self.storage.engine.begin() as conn:
+            conn.execute(
+                delete(_SUBSCRIBERS).where(
+                    _SUBSCRIBERS.c.identity_hash == RNS.hexrep(identity_hash, False)
+                )
+            )
@@ -0,0 +1,129 @@
+import random
+
+import pytest
+
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig, TelemetryStorage
+from reticulum_telemetry_hub.reticulum_server.__main__ import AnnounceHandler
+from reticulum_telemetry_hub.reticulum_server.announce_scheduler import (
+    AnnouncePolicy,
+    AnnounceScheduler,
+)
+from reticulum_telemetry_hub.reticulum_server.peer_directory import PeerDirectory
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_scheduler(clock, interfaces=None, **policy):
+    sent = []
+
+    def announce():
+        sent.append(clock())
+        return 120
+
+    policy = AnnouncePolicy(**dict({"min_interval": 60, "max_interval": 480, "jitter": 0}, **policy))
+    return AnnounceScheduler(announce, policy, interfaces=interfaces, clock=clock), sent
+
+
+def run_for(scheduler, clock, seconds, step=1.0):
+    end = clock.now + seconds
+    while clock.now < end:
+        scheduler.tick()
+        clock.now += step
+
+
+def test_backs_off_while_stable():
+    clock = FakeClock()
+    scheduler, sent = make_scheduler(clock)
+    run_for(scheduler, clock, 2000)
+
+    gaps = [b - a for a, b in zip(sent, sent[1:])]
+    assert gaps[:4] == [60, 120, 240, 480]
+    assert set(gaps[4:]) == {480}
+    assert scheduler.announce_bytes == 120 * len(sent)
+    assert scheduler.stats()["last_reason"] == "periodic"
+
+
+def test_topology_change_announces_at_once_and_resets_backoff():
+    clock = FakeClock()
+    scheduler, sent = make_scheduler(clock)
+    run_for(scheduler, clock, 500)
+    count = len(sent)
+
+    scheduler.topology_changed("join")
+    scheduler.tick()
+    assert len(sent) == count + 1 and sent[-1] == clock.now
+    assert scheduler.last_reason == "join"
+    # Back to the shortest interval, and changes cannot announce more often
+    scheduler.topology_changed("leave")
+    run_for(scheduler, clock, 59)
+    assert len(sent) == count + 1
+    run_for(scheduler, clock, 2)
+    assert len(sent) == count + 2
+
+
+def test_backoff_keeps_growing_while_new_peers_announce(tmp_path):
+    clock = FakeClock()
+    scheduler, sent = make_scheduler(clock)
+    peers = PeerDirectory(
+        TelemetryStorage(StorageConfig(db_path=str(tmp_path / "telemetry.db"))), max_peers=10
+    )
+    handler = AnnounceHandler(peers)
+    end = clock.now + 2000
+    heard = 0
+    while clock.now < end:
+        # A busy mesh: a peer never heard before announces every few seconds
+        if clock.now % 5 == 0:
+            handler.received_announce(heard.to_bytes(16, "big"), None, b"peer")
+            heard += 1
+        scheduler.tick()
+        clock.now += 1
+
+    gaps = [b - a for a, b in zip(sent, sent[1:])]
+    assert gaps[:4] == [60, 120, 240, 480]
+    assert scheduler.interval == 480
+    assert heard == 400 and scheduler.stats()["last_reason"] == "periodic"
+    peers.stop()
+
+
+def test_new_interfaces_trigger_an_announce():
+    clock = FakeClock()
+    interfaces = ["LoRa"]
+    scheduler, sent = make_scheduler(clock, interfaces=lambda: interfaces)
+    run_for(scheduler, clock, 260)
+    count = len(sent)
+
+    interfaces.remove("LoRa")
+    run_for(scheduler, clock, 5)
+    assert len(sent) == count
+    interfaces.append("LoRa")
+    run_for(scheduler, clock, 1)
+    assert len(sent) == count + 1
+    assert scheduler.last_reason == "interface"
+
+
+def test_jitter_spreads_announces():
+    clock = FakeClock()
+    sent = []
+    scheduler = AnnounceScheduler(
+        lambda: sent.append(clock()),
+        AnnouncePolicy(min_interval=100, max_interval=100, jitter=0.2),
+        clock=clock,
+        rng=random.Random(3),
+    )
+    run_for(scheduler, clock, 5000)
+    gaps = [b - a for a, b in zip(sent, sent[1:])]
+    assert all(79 <= gap <= 121 for gap in gaps)
+    assert len(set(gaps)) > 1
+
+
+def test_policy_is_validated():
+    with pytest.raises(ValueError):
+        AnnouncePolicy(min_interval=60, max_interval=30)
+    with pytest.raises(ValueError):
+        AnnouncePolicy(backoff=0.5)
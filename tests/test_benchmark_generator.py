@@ -0,0 +1,26 @@
+from msgpack import unpackb
+
+from benchmarks.generator import SidebandGenerator
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import decode_stream, decode_telemetry
+
+
+def test_generator_is_deterministic_and_decodable():
+    first = [record.packed for record in SidebandGenerator(seed=1).records(20)]
+    assert first == [record.packed for record in SidebandGenerator(seed=1).records(20)]
+
+    generator = SidebandGenerator(seed=1, peers=4)
+    records = list(generator.records(8))
+    assert {record.peer_dest for record in records} == set(generator.peers)
+    for record in records:
+        tel_data = unpackb(record.packed, strict_map_key=False)
+        assert tel_data.keys() == generator.sample.keys()
+        location = decode_telemetry(tel_data)[SID_LOCATION]
+        assert abs(location["latitude"] - 44.657059) < 0.01
+
+
+def test_stream_entries_decode():
+    entries = SidebandGenerator().stream_entries(10)
+    assert len(decode_stream(entries)) == 10
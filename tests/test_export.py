@@ -0,0 +1,111 @@
+import csv
+import gzip
+from datetime import datetime, timedelta
+
+import pytest
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry import export
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUTS,
+    PARTITION_DAY,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+NOW = datetime(2024, 9, 1, 12, 0, 0)
+
+
+def sample() -> tuple[bytes, dict]:
+    with open("sample.bin", "rb") as f:
+        payload = f.read()
+    return payload, unpackb(payload, strict_map_key=False)
+
+
+def populate(controller, peers, count, step=timedelta(hours=6)):
+    payload, tel_data = sample()
+    controller.save_telemeters(
+        [
+            controller._deserialize_telemeter(tel_data, peer, payload, NOW - step * i)
+            for peer in peers
+            for i in range(count)
+        ]
+    )
+
+
+def read_csv(path) -> list[dict]:
+    with gzip.open(path, "rt", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_csv_export(tmp_path, layout):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), layout=layout)
+    )
+    populate(controller, ["aa", "bb"], 5)
+    path = tmp_path / "tracks.csv.gz"
+
+    assert export.export_telemetry(controller, path, batch_size=3) == 10
+    rows = read_csv(path)
+    assert list(rows[0]) == [column.name for column in export.COLUMNS]
+    assert [float(row["time"]) for row in rows] == sorted(float(row["time"]) for row in rows)
+    location = LOCATION_CODEC.decode(sample()[1][SID_LOCATION])
+    assert float(rows[0]["location_latitude"]) == location["latitude"]
+    assert float(rows[0]["location_accuracy"]) == location["accuracy"]
+
+    assert (
+        export.export_telemetry(
+            controller, path, start_time=NOW - timedelta(hours=6), peer_dest="bb"
+        )
+        == 2
+    )
+    assert {row["peer_dest"] for row in read_csv(path)} == {"bb"}
+    controller.shutdown()
+
+
+def test_export_spans_partitions(tmp_path):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), partition=PARTITION_DAY)
+    )
+    populate(controller, ["aa"], 12)
+    path = tmp_path / "tracks.csv"
+    args = [str(path), "--db", str(tmp_path / "telemetry.db"), "--storage_partition", "day"]
+    assert export.main(args) == 0
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 12
+    assert rows[-1]["time"] == str(NOW.timestamp())
+    controller.shutdown()
+
+
+def test_location_scaling_without_numpy(monkeypatch):
+    raw = [LOCATION_CODEC.decode_raw(sample()[1][SID_LOCATION]), None]
+    vectorized = export._scale_locations(raw)
+    monkeypatch.setattr(export, "numpy", None)
+    assert export._scale_locations(raw) == vectorized
+    assert vectorized["location_latitude"][1] is None
+
+
+def test_parquet_needs_pyarrow(tmp_path, monkeypatch):
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    monkeypatch.setattr(export, "pyarrow", None)
+    with pytest.raises(RuntimeError):
+        export.export_telemetry(controller, tmp_path / "tracks.parquet")
+
+
+def test_parquet_export(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    populate(controller, ["aa"], 4)
+    path = tmp_path / "tracks.parquet"
+    assert export.export_telemetry(controller, path) == 4
+    table = pyarrow.parquet.read_table(path)
+    assert table.num_rows == 4
+    assert table.column_names == [column.name for column in export.COLUMNS]
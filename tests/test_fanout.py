@@ -0,0 +1,96 @@
+import threading
+import time
+
+import LXMF
+import RNS
+
+from reticulum_telemetry_hub.reticulum_server.fanout import BroadcastFanout
+
+
+class FakeRouter:
+    def __init__(self, propagation_node=None, delay: float = 0.0):
+        self.sent = []
+        self.lock = threading.Lock()
+        self.propagation_node = propagation_node
+        self.delay = delay
+
+    def get_outbound_propagation_node(self):
+        return self.propagation_node
+
+    def handle_outbound(self, message):
+        time.sleep(self.delay)
+        with self.lock:
+            self.sent.append(message)
+
+
+def destination() -> RNS.Destination:
+    return RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+
+
+def test_broadcast_reaches_every_recipient_in_order():
+    router = FakeRouter()
+    recipients = [destination() for _ in range(20)]
+    fanout = BroadcastFanout(router, destination(), workers=4, has_path=lambda h: True)
+    fanout.start()
+    for i in range(3):
+        assert fanout.broadcast(f"message {i}", recipients) == 20
+    assert fanout.join(timeout=5)
+    fanout.stop()
+
+    assert len(router.sent) == 60
+    for recipient in recipients:
+        contents = [
+            m.content_as_string() for m in router.sent if m.destination_hash == recipient.hash
+        ]
+        assert contents == ["message 0", "message 1", "message 2"]
+    assert all(m.desired_method == LXMF.LXMessage.DIRECT for m in router.sent)
+    stats = fanout.stats.as_dict()
+    assert stats["sent"] == 60
+    assert stats["dropped"] == 0
+
+
+def test_full_recipient_queue_drops_oldest():
+    router = FakeRouter(delay=0.05)
+    recipient = destination()
+    fanout = BroadcastFanout(router, destination(), workers=1, queue_size=2, has_path=lambda h: True)
+    fanout.start()
+    for i in range(6):
+        fanout.broadcast(f"message {i}", [recipient])
+    fanout.stop()
+
+    contents = [m.content_as_string() for m in router.sent]
+    assert contents[-2:] == ["message 4", "message 5"]
+    assert fanout.stats.dropped == 6 - len(contents)
+    assert fanout.stats.dropped > 0
+
+
+def test_pacing_spaces_messages_per_recipient():
+    router = FakeRouter()
+    recipient = destination()
+    fanout = BroadcastFanout(router, destination(), min_interval=0.1, has_path=lambda h: True)
+    fanout.start()
+    started = time.monotonic()
+    fanout.broadcast("one", [recipient])
+    fanout.broadcast("two", [recipient])
+    fanout.broadcast("three", [recipient])
+    assert fanout.join(timeout=5)
+    assert time.monotonic() - started >= 0.2
+    fanout.stop()
+
+
+def test_recipients_without_path_are_propagated():
+    router = FakeRouter(propagation_node=b"\x01" * 16)
+    with_path, without_path = destination(), destination()
+    fanout = BroadcastFanout(
+        router, destination(), has_path=lambda h: h == with_path.hash
+    )
+    fanout.start()
+    fanout.broadcast("hello", [with_path, without_path])
+    fanout.stop()
+
+    methods = {m.destination_hash: m.desired_method for m in router.sent}
+    assert methods[with_path.hash] == LXMF.LXMessage.DIRECT
+    assert methods[without_path.hash] == LXMF.LXMessage.PROPAGATED
+    assert fanout.stats.propagated == 1
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+import RNS
+
+from reticulum_telemetry_hub.hub_log import (
+    configure_logging,
+    get_logger,
+    parse_log_levels,
+)
+
+
+class CountingRepr:
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "payload"
+
+
+@pytest.fixture(autouse=True)
+def reset_logging():
+    yield
+    configure_logging()
+
+
+def test_records_below_the_subsystem_level_are_not_formatted(tmp_path):
+    path = tmp_path / "hub.jsonl"
+    configure_logging({"delivery": RNS.LOG_WARNING}, json_path=str(path))
+    payload = CountingRepr()
+    log = get_logger("delivery")
+
+    log.debug("Telemetry data: %s", payload)
+    assert payload.calls == 0
+    assert not log.enabled(RNS.LOG_DEBUG)
+
+    log.warning("Telemetry data: %s", payload)
+    assert payload.calls == 1
+
+
+def test_json_lines_output(tmp_path):
+    path = tmp_path / "hub.jsonl"
+    configure_logging({"telemetry": RNS.LOG_DEBUG}, json_path=str(path))
+    get_logger("telemetry").debug(
+        "Saved %d telemeters", 3, peer=b"\xaa\xbb", fields={b"\x01": b"\x02"}
+    )
+    configure_logging()
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["level"] == "debug"
+    assert record["subsystem"] == "telemetry"
+    assert record["msg"] == "Saved 3 telemeters"
+    assert record["peer"] == "aabb"
+    assert "fields" in record
+
+
+def test_sampling_keeps_one_record_per_interval(tmp_path):
+    path = tmp_path / "hub.jsonl"
+    configure_logging({"delivery": RNS.LOG_DEBUG}, json_path=str(path), sample_every=5)
+    log = get_logger("delivery")
+    for i in range(12):
+        log.debug("Message %d", i, sample="delivery")
+    log.debug("Not sampled")
+    configure_logging()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["msg"] for record in records] == [
+        "Message 0",
+        "Message 5",
+        "Message 10",
+        "Not sampled",
+    ]
+    assert records[1]["suppressed"] == 4
+
+
+def test_parse_log_levels():
+    assert parse_log_levels("delivery=debug,telemetry=2") == {
+        "delivery": RNS.LOG_DEBUG,
+        "telemetry": 2,
+    }
+    with pytest.raises(ValueError):
+        parse_log_levels("delivery=loud")
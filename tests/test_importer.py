@@ -0,0 +1,153 @@
+import base64
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.importer import TelemetryImporter, main
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_COMPACT,
+    LAYOUT_JOINED,
+    LAYOUTS,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+
+def sample() -> dict:
+    with open("sample.bin", "rb") as f:
+        return unpackb(f.read(), strict_map_key=False)
+
+
+def write_capture(path, count: int) -> None:
+    """A telemetry dict, sent twice, then a stream of ``count`` entries."""
+    tel_data = sample()
+    base = tel_data[SID_TIME]
+    with open(path, "wb") as f:
+        f.write(packb(tel_data))
+        f.write(packb(tel_data))
+        entries = []
+        for i in range(count):
+            entry_data = {**tel_data, SID_TIME: base + i}
+            entries.append([bytes.fromhex(f"{i % 4:032x}"), base + i, packb(entry_data), None])
+        entries.append(["not an entry"])
+        f.write(packb(entries))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_import_capture(tmp_path, layout):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), layout=layout)
+    )
+    capture = tmp_path / "capture.bin"
+    write_capture(capture, 50)
+    reports = []
+    importer = TelemetryImporter(
+        controller, workers=0, chunk_size=7, batch_size=20, progress=reports.append
+    )
+
+    report = importer.import_files([capture], peer_dest="ab" * 16)
+    assert (report.read, report.imported, report.duplicates, report.invalid) == (53, 51, 1, 1)
+    assert len(reports) > 2
+    tels = controller.get_telemetry()
+    assert len(tels) == 51
+    assert {tel.peer_dest for tel in tels} >= {"ab" * 16, f"{3:032x}"}
+    assert all(tel.sensors for tel in tels)
+    # Imported locations are searchable like live telemetry
+    location = LOCATION_CODEC.decode(sample()[SID_LOCATION])
+    near = controller.get_telemetry_near(location["latitude"], location["longitude"], 100)
+    assert len(near) == 51
+
+    # Replaying the same capture stores nothing new
+    again = importer.import_files([capture], peer_dest="ab" * 16)
+    assert again.imported == 0 and again.duplicates == 52
+    controller.shutdown()
+
+
+def test_joined_import_rows_match_saved_telemetry(tmp_path):
+    capture = tmp_path / "capture.bin"
+    write_capture(capture, 20)
+    imported = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "imported.db"), layout=LAYOUT_JOINED)
+    )
+    TelemetryImporter(imported, workers=2, chunk_size=5).import_files(
+        [capture], peer_dest="ab" * 16
+    )
+    saved = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "saved.db"), layout=LAYOUT_JOINED)
+    )
+    saved.save_telemeters(
+        [
+            saved._deserialize_telemeter(
+                unpackb(record.packed, strict_map_key=False),
+                record.peer_dest,
+                record.packed,
+                record.time,
+            )
+            for record in imported.iter_records()
+        ]
+    )
+
+    def sensors(controller):
+        # Serialized from the sensor rows, not the stored payloads
+        return [
+            (tel.peer_dest, tel.time, controller._serialize_telemeter(tel))
+            for tel in controller.get_telemetry()
+        ]
+
+    assert len(sensors(imported)) == 21
+    assert sensors(imported) == sensors(saved)
+    (location,) = [s for s in imported.get_telemetry()[0].sensors if s.sid == SID_LOCATION]
+    assert location.last_update is not None and location.stale_time == 15
+    imported.shutdown()
+    saved.shutdown()
+
+
+def test_import_ndjson_with_workers(tmp_path):
+    db = tmp_path / "telemetry.db"
+    tel_data = sample()
+    dump = tmp_path / "dump.ndjson"
+    with open(dump, "w") as f:
+        for i in range(30):
+            packed = packb({**tel_data, SID_TIME: tel_data[SID_TIME] + i})
+            line = {"peer_dest": "cd" * 16, "time": tel_data[SID_TIME] + i}
+            if i % 2:
+                line["packed"] = base64.b64encode(packed).decode()
+            else:
+                line["telemetry"] = {str(SID_TIME): tel_data[SID_TIME] + i}
+            f.write(json.dumps(line) + "\n")
+        f.write("{broken\n")
+
+    args = [str(dump), "--db", str(db), "--storage_layout", LAYOUT_COMPACT]
+    assert main(args + ["--workers", "2", "--batch_size", "8"]) == 0
+    controller = TelemetryController(StorageConfig(db_path=str(db), layout=LAYOUT_COMPACT))
+    tels = controller.get_telemetry()
+    assert len(tels) == 30
+    assert tels[0].time == datetime.fromtimestamp(tel_data[SID_TIME])
+    controller.shutdown()
+
+
+def test_import_into_an_existing_hub_database(tmp_path):
+    db = tmp_path / "telemetry.db"
+    controller = TelemetryController(StorageConfig(db_path=str(db)))
+    controller.save_telemetry(sample(), "cd" * 16)
+    controller.shutdown()
+    with sqlite3.connect(db) as conn:
+        # The peer and time index as written before it was made unique
+        conn.execute('DROP INDEX "ix_telemeter_peer_time"')
+        conn.execute('CREATE INDEX "ix_telemeter_peer_time" ON "Telemeter" (peer_dest, time)')
+    conn.close()
+    capture = tmp_path / "capture.bin"
+    write_capture(capture, 5)
+
+    assert main([str(capture), "--db", str(db), "--peer", "ab" * 16, "--workers", "0"]) == 0
+    controller = TelemetryController(StorageConfig(db_path=str(db)))
+    assert len(controller.get_telemetry()) == 7
+    controller.shutdown()
@@ -0,0 +1,176 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import LXMF
+import pytest
+from msgpack import packb, unpackb
+from sqlalchemy import func, inspect, select
+
+from reticulum_telemetry_hub.lxmf_telemetry.bloom import BloomFilter
+from reticulum_telemetry_hub.lxmf_telemetry.importer import TelemetryImporter
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import SID_TIME
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.time import Time
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.storage import LAYOUTS, StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+BASE = 1_724_877_911
+
+
+def count(controller: TelemetryController, entity=Telemeter) -> int:
+    with controller.storage.session() as ses:
+        return ses.scalar(select(func.count()).select_from(entity))
+
+
+def stream_message(timestamps, peer=b"\x01" * 16) -> SimpleNamespace:
+    payload = SAMPLE.read_bytes()
+    entries = [[peer, ts, payload, None] for ts in timestamps]
+    return SimpleNamespace(fields={LXMF.FIELD_TELEMETRY_STREAM: entries})
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_resent_stream_entries_are_stored_once(layout):
+    controller = TelemetryController(StorageConfig(db_path=":memory:", layout=layout))
+    controller.handle_message(stream_message([BASE, BASE + 60, BASE + 60]))
+    controller.handle_message(stream_message([BASE + 60, BASE + 120]))
+
+    times = [tel.time for tel in controller.get_telemetry()]
+    assert times == [datetime.fromtimestamp(BASE + 60 * i) for i in range(3)]
+    assert controller.get_telemetry()[0].packed == SAMPLE.read_bytes()
+
+
+def test_single_telemetry_is_keyed_on_its_time_sensor():
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    payload = SAMPLE.read_bytes()
+    message = SimpleNamespace(fields={LXMF.FIELD_TELEMETRY: payload}, source_hash=b"\x02" * 16)
+    controller.handle_message(message)
+    controller.handle_message(message)
+
+    [tel] = controller.get_telemetry()
+    sent_at = unpackb(payload, strict_map_key=False)[SID_TIME]
+    assert tel.time == datetime.fromtimestamp(sent_at)
+    assert count(controller, Sensor) == len(tel.sensors)
+
+
+def test_batch_ingest_skips_duplicates():
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    controller.enable_batch_ingest(max_batch_age=0.01)
+    for _ in range(3):
+        controller.handle_message(stream_message([BASE, BASE + 1]))
+    controller.flush()
+    assert count(controller) == 2
+    controller.shutdown()
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_duplicates_missed_by_the_filter_are_still_ignored(layout):
+    controller = TelemetryController(StorageConfig(db_path=":memory:", layout=layout))
+    controller.handle_message(stream_message([BASE]))
+    # As if another writer stored the row after the filter was built
+    controller._seen = BloomFilter(100)
+    controller.handle_message(stream_message([BASE, BASE + 1]))
+    assert count(controller) == 2
+
+
+# Tables as created by the first release, before telemetry was indexed
+BASELINE_SCHEMA = """
+CREATE TABLE "Telemeter" (
+    id INTEGER NOT NULL, time DATETIME NOT NULL, peer_dest VARCHAR NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE "Sensor" (
+    id INTEGER NOT NULL, sid INTEGER NOT NULL, stale_time FLOAT, data BLOB,
+    synthesized BOOLEAN, telemeter_id INTEGER NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(telemeter_id) REFERENCES "Telemeter" (id)
+);
+CREATE TABLE "Time" (
+    id INTEGER NOT NULL, utc DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(id) REFERENCES "Sensor" (id)
+);
+"""
+
+
+def baseline_database(path, copies=(("aa", 3), ("bb", 1))) -> None:
+    """A first release database holding ``copies`` of one telemeter per peer."""
+    # Formatted as SQLAlchemy stores DateTime columns
+    stamp = datetime.fromtimestamp(BASE).strftime("%Y-%m-%d %H:%M:%S.%f")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        for peer, repeated in copies:
+            for _ in range(repeated):
+                tel_id = conn.execute(
+                    'INSERT INTO "Telemeter" (time, peer_dest) VALUES (?, ?)', (stamp, peer)
+                ).lastrowid
+                sensor_id = conn.execute(
+                    'INSERT INTO "Sensor" (sid, stale_time, synthesized, telemeter_id) '
+                    "VALUES (?, 15, 0, ?)",
+                    (SID_TIME, tel_id),
+                ).lastrowid
+                conn.execute('INSERT INTO "Time" (id, utc) VALUES (?, ?)', (sensor_id, stamp))
+    conn.close()
+
+
+def test_baseline_database_is_deduplicated_on_startup(tmp_path):
+    db_path = tmp_path / "telemetry.db"
+    baseline_database(db_path)
+
+    controller = TelemetryController(StorageConfig(db_path=str(db_path)))
+    assert sorted(tel.peer_dest for tel in controller.get_telemetry()) == ["aa", "bb"]
+    assert count(controller, Sensor) == 2
+    assert count(controller, Time) == 2
+    engine = controller.storage.engine
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("Telemeter")}
+    assert indexes["ix_telemeter_peer_time"]["unique"]
+
+    # Bulk writers rely on the unique index to skip stored telemetry
+    controller.save_telemeters(
+        [
+            controller._deserialize_telemeter(
+                {SID_TIME: ts}, "aa", None, datetime.fromtimestamp(ts)
+            )
+            for ts in (BASE, BASE + 1)
+        ]
+    )
+    assert count(controller) == 3
+    controller.shutdown()
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_non_unique_peer_time_index_is_rebuilt(tmp_path, layout):
+    db_path = tmp_path / "telemetry.db"
+    baseline_database(db_path, copies=(("aa", 1),))
+    with sqlite3.connect(db_path) as conn:
+        # As left by releases that indexed telemetry before making it unique
+        conn.execute('CREATE INDEX "ix_telemeter_peer_time" ON "Telemeter" (peer_dest, time)')
+        conn.execute(
+            'INSERT INTO "Telemeter" (time, peer_dest) SELECT time, peer_dest FROM "Telemeter"'
+        )
+    conn.close()
+
+    controller = TelemetryController(StorageConfig(db_path=str(db_path), layout=layout))
+    capture = tmp_path / "capture.bin"
+    capture.write_bytes(packb([["aa", BASE, packb({SID_TIME: BASE}), None]]))
+    importer = TelemetryImporter(controller, workers=0)
+    report = importer.import_files([capture])
+    assert (report.imported, report.duplicates) == (0, 1)
+    controller.save_telemeters(
+        [controller._deserialize_telemeter({SID_TIME: BASE + 1}, "aa", None, datetime.now())]
+    )
+    assert count(controller) == 2
+    controller.shutdown()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    keys = [f"peer|{i}".encode() for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other|{i}".encode() in bloom for i in range(10000))
+    assert false_positives < 300
+    assert not bloom.full
+    bloom.add(b"one more")
+    assert bloom.full
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from reticulum_telemetry_hub.lxmf_telemetry.ingest_queue import TelemetryIngestQueue
+
+
+def test_batches_by_size():
+    batches = []
+    q = TelemetryIngestQueue(batches.append, max_batch_size=10, max_batch_age=5)
+    q.start()
+    for i in range(25):
+        q.put(i)
+    q.stop()
+
+    assert [len(b) for b in batches] == [10, 10, 5]
+    assert [i for b in batches for i in b] == list(range(25))
+    stats = q.stats.as_dict()
+    assert stats["committed"] == 25
+    assert stats["batches"] == 3
+    assert stats["max_batch_size"] == 10
+
+
+def test_flushes_by_age():
+    batches = []
+    q = TelemetryIngestQueue(batches.append, max_batch_size=100, max_batch_age=0.05)
+    q.start()
+    q.put(1)
+    time.sleep(0.3)
+    assert batches == [[1]]
+    q.stop()
+
+
+def test_flush_waits_for_commit():
+    batches = []
+    q = TelemetryIngestQueue(batches.append, max_batch_size=100, max_batch_age=60)
+    q.start()
+    q.put(1)
+    q.put(2)
+    q.flush()
+    assert batches == [[1, 2]]
+    q.stop()
+
+
+def test_backpressure_drops_after_timeout():
+    release = threading.Event()
+    q = TelemetryIngestQueue(
+        lambda batch: release.wait(),
+        max_batch_size=1,
+        max_batch_age=0,
+        max_pending=1,
+        put_timeout=0.01,
+    )
+    q.start()
+    results = [q.put(i) for i in range(5)]
+    release.set()
+    q.stop()
+
+    assert not all(results)
+    assert q.stats.dropped == results.count(False)
+
+
+def test_failed_commit_is_counted():
+    def fail(batch):
+        raise RuntimeError("disk full")
+
+    q = TelemetryIngestQueue(fail, max_batch_size=2, max_batch_age=60)
+    q.start()
+    q.put(1)
+    q.put(2)
+    q.stop()
+
+    assert q.stats.failed == 2
+    assert q.stats.committed == 0
+    assert not q.put(3)
+
+
+def test_failed_commit_only_loses_the_bad_record():
+    committed = []
+
+    def write(batch):
+        if "bad" in batch:
+            raise ValueError("cannot store bad")
+        committed.extend(batch)
+
+    q = TelemetryIngestQueue(write, max_batch_size=8, max_batch_age=60)
+    q.start()
+    for item in (1, 2, 3, "bad", 4, 5, 6, 7):
+        q.put(item)
+    q.stop()
+
+    assert sorted(committed) == [1, 2, 3, 4, 5, 6, 7]
+    assert (q.stats.committed, q.stats.failed, q.stats.batches) == (7, 1, 1)
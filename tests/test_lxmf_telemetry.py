@@ -1,9 +1,14 @@
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.location import Location
 from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
 
 def test_deserialize_lxmf():
     with open('sample.bin', 'rb') as f:
         data = f.read()
-    
-    tel = TelemetryController()._deserialize_telemeter(data)
-    assert tel.sensors[0].latitude == 44.657059
-    assert True
\ No newline at end of file
+
+    tel = TelemetryController()._deserialize_telemeter(unpackb(data, strict_map_key=False), "aa")
+    location = next(sensor for sensor in tel.sensors if isinstance(sensor, Location))
+    assert location.latitude == 44.657059
+    serialized = TelemetryController()._serialize_telemeter(tel)
+    assert unpackb(packb(serialized), strict_map_key=False) == unpackb(data, strict_map_key=False)
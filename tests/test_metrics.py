@@ -0,0 +1,127 @@
+import threading
+import urllib.request
+from datetime import datetime
+
+import pytest
+import RNS
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import MEMORY_DB, StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import (
+    TelemetryController,
+)
+from reticulum_telemetry_hub.metrics import REGISTRY, MetricsRegistry, MetricsServer
+from reticulum_telemetry_hub.reticulum_server.fanout import BroadcastFanout
+
+
+def test_prometheus_text_rendering():
+    registry = MetricsRegistry()
+    registry.counter("messages_total", "Messages").inc(3)
+    registry.gauge("connections", "Clients", lambda: 7)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 2.0):
+        latency.observe(value)
+
+    text = registry.render_prometheus()
+    assert "# TYPE messages_total counter\nmessages_total 3\n" in text
+    assert "connections 7\n" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'latency_seconds_bucket{le="1"} 2\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "latency_seconds_count 3\n" in text
+    assert registry.snapshot()["latency_seconds"] == {"count": 3, "sum": 2.55}
+
+
+def test_registry_returns_existing_metrics_and_rejects_kind_changes():
+    registry = MetricsRegistry()
+    assert registry.counter("a", "A") is registry.counter("a", "A")
+    with pytest.raises(ValueError):
+        registry.histogram("a", "A")
+
+
+def test_http_endpoint_serves_metrics():
+    registry = MetricsRegistry()
+    registry.counter("served_total", "Served").inc()
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "served_total 1" in response.read().decode()
+    finally:
+        server.stop()
+
+
+class BlockingRouter:
+    """Holds the first message until released."""
+
+    def __init__(self):
+        self.sending = threading.Event()
+        self.release = threading.Event()
+
+    def get_outbound_propagation_node(self):
+        return None
+
+    def handle_outbound(self, message):
+        self.sending.set()
+        assert self.release.wait(5)
+
+
+def destination() -> RNS.Destination:
+    return RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+
+
+def test_http_endpoint_serves_fanout_metrics():
+    sent = REGISTRY.counter("rth_fanout_sent_total", "")
+    dropped = REGISTRY.counter("rth_fanout_dropped_total", "")
+    latency = REGISTRY.histogram("rth_fanout_latency_seconds", "")
+    sent_before, dropped_before, latency_before = sent.value, dropped.value, latency.count
+
+    router = BlockingRouter()
+    fanout = BroadcastFanout(
+        router, destination(), workers=1, queue_size=1, has_path=lambda h: True
+    )
+    recipient = destination()
+    fanout.start()
+    fanout.broadcast("first", [recipient])
+    assert router.sending.wait(5)
+    # The recipient's queue holds one message, the third replaces the second
+    fanout.broadcast("second", [recipient])
+    fanout.broadcast("third", [recipient])
+    router.release.set()
+    assert fanout.join(timeout=5)
+    fanout.stop()
+
+    assert sent.value - sent_before == 2
+    assert dropped.value - dropped_before == 1
+    assert latency.count - latency_before == 2
+    server = MetricsServer(REGISTRY, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            text = response.read().decode()
+    finally:
+        server.stop()
+    assert f"rth_fanout_sent_total {sent.value}\n" in text
+    assert f"rth_fanout_dropped_total {dropped.value}\n" in text
+    assert "# TYPE rth_fanout_latency_seconds histogram\n" in text
+    assert f"rth_fanout_latency_seconds_count {latency.count}\n" in text
+
+
+def test_controller_records_commits_and_queries():
+    controller = TelemetryController(StorageConfig(db_path=MEMORY_DB))
+    saved = REGISTRY.counter("rth_telemeters_saved_total", "")
+    rows = REGISTRY.counter("rth_telemetry_query_rows_total", "")
+    saved_before, rows_before = saved.value, rows.value
+
+    controller.save_telemetry({SID_TIME: 1724877911}, "aa")
+    controller.save_telemetry({SID_TIME: 1724877912}, "bb")
+    controller.get_telemetry(start_time=datetime.fromtimestamp(0))
+
+    assert saved.value - saved_before == 2
+    assert rows.value - rows_before == 2
+    assert REGISTRY.histogram("rth_telemetry_query_seconds", "").count >= 1
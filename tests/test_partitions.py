@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import LXMF
+import pytest
+import RNS
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.partitions import partition_bounds, partition_key
+from reticulum_telemetry_hub.lxmf_telemetry.retention import RetentionJob, RetentionPolicy
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUTS,
+    PARTITION_DAY,
+    PARTITION_WEEK,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+NOW = datetime(2024, 9, 1, 12, 0, 0)
+INCREMENTAL = {
+    TelemetryController.TELEMETRY_REQUEST: 1000000000,
+    TelemetryController.TELEMETRY_INCREMENTAL: True,
+}
+
+
+def make_controller(tmp_path, layout=LAYOUTS[0], partition=PARTITION_DAY):
+    return TelemetryController(
+        StorageConfig(
+            db_path=str(tmp_path / "telemetry.db"), layout=layout, partition=partition
+        )
+    )
+
+
+def populate(controller, peers, count, step=timedelta(hours=6), end=NOW):
+    with open("sample.bin", "rb") as f:
+        payload = f.read()
+    tel_data = unpackb(payload, strict_map_key=False)
+    tels = []
+    for peer in peers:
+        for i in range(count):
+            tels.append(
+                controller._deserialize_telemeter(tel_data, peer, payload, end - step * i)
+            )
+    controller.save_telemeters(tels)
+
+
+def test_partition_keys():
+    time = datetime(2024, 12, 30, 23, 59)
+    assert partition_key(time, PARTITION_DAY) == "2024-12-30"
+    # ISO weeks may belong to the next year
+    assert partition_key(time, PARTITION_WEEK) == "2025-W01"
+    start, end = partition_bounds("2025-W01", PARTITION_WEEK)
+    assert start <= time < end and end - start == timedelta(weeks=1)
+    with pytest.raises(ValueError):
+        StorageConfig(db_path=":memory:", partition=PARTITION_DAY)
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_queries_span_partitions(tmp_path, layout):
+    controller = make_controller(tmp_path, layout)
+    populate(controller, ["aa", "bb"], 12)
+    # Resent telemetry lands in the same partition and is skipped there
+    populate(controller, ["aa"], 12)
+    assert controller.partitions.keys() == [
+        "2024-08-29", "2024-08-30", "2024-08-31", "2024-09-01",
+    ]
+
+    tels = controller.get_telemetry()
+    assert len(tels) == 24
+    assert [tel.time for tel in tels] == sorted(tel.time for tel in tels)
+    assert all(tel.sensors for tel in tels)
+
+    ranged = controller.get_telemetry(
+        start_time=NOW - timedelta(days=1), end_time=NOW - timedelta(hours=6), peer_dest="aa"
+    )
+    assert [tel.time for tel in ranged] == [NOW - timedelta(hours=h) for h in (24, 18, 12, 6)]
+    newest = list(controller.iter_telemetry(newest_first=True, with_sensors=False))
+    assert [tel.time for tel in newest] == sorted((tel.time for tel in tels), reverse=True)
+
+    location = next(sensor for sensor in tels[0].sensors if sensor.sid == SID_LOCATION)
+    near = controller.get_telemetry_near(
+        location.latitude, location.longitude, 1000, latest_per_peer=True
+    )
+    assert {tel.peer_dest for tel in near} == {"aa", "bb"}
+    assert all(tel.time == NOW for tel in near)
+    controller.shutdown()
+
+
+def test_chunked_responses_continue_across_partitions(tmp_path):
+    controller = make_controller(tmp_path)
+    controller.max_stream_messages = 1
+    populate(controller, ["aa"], 12)
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    command = {
+        TelemetryController.TELEMETRY_REQUEST: 1000000000,
+        TelemetryController.TELEMETRY_MAX_BYTES: 2000,
+    }
+    received = []
+    while True:
+        (message,) = controller.handle_command(command, requester, hub_dest)
+        received.extend(entry[1] for entry in message.fields[LXMF.FIELD_TELEMETRY_STREAM])
+        marker = message.fields.get(LXMF.FIELD_RESULTS)
+        if marker is None:
+            break
+        command[TelemetryController.TELEMETRY_BEFORE] = marker[
+            TelemetryController.TELEMETRY_BEFORE
+        ]
+    expected = [round((NOW - timedelta(hours=6) * i).timestamp()) for i in range(12)]
+    assert received == expected
+
+    # Incremental requests keep one cursor per partition
+    first = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    for message in first:
+        message.state = LXMF.LXMessage.DELIVERED
+        message._LXMessage__delivery_callback(message)
+    # Late telemetry for an old partition is still picked up
+    populate(controller, ["bb"], 1, end=NOW - timedelta(days=3))
+    (late,) = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    entries = late.fields[LXMF.FIELD_TELEMETRY_STREAM]
+    assert [entry[0] for entry in entries] == [bytes.fromhex("bb")]
+    controller.shutdown()
+
+
+def test_retention_drops_whole_partitions(tmp_path):
+    controller = make_controller(tmp_path)
+    populate(controller, ["aa", "bb"], 12)
+    first = controller.partitions.path("2024-08-29")
+    assert first.exists()
+
+    job = RetentionJob(
+        controller, RetentionPolicy(max_age=timedelta(days=2), chunk_pause=0)
+    )
+    report = job.run_once(now=NOW + timedelta(hours=1))
+    assert not first.exists()
+    assert controller.partitions.keys() == ["2024-08-30", "2024-08-31", "2024-09-01"]
+    # The 2024-08-30 partition straddles the cutoff and loses rows instead
+    assert report.deleted["age"] == 2 + 6
+    cutoff = NOW + timedelta(hours=1) - timedelta(days=2)
+    assert min(tel.time for tel in controller.get_telemetry()) >= cutoff
+
+    # Per peer limits count across partitions, newest first
+    RetentionJob(controller, RetentionPolicy(max_rows_per_peer=3, chunk_pause=0)).run_once(
+        now=NOW
+    )
+    assert sorted(tel.time for tel in controller.get_telemetry(peer_dest="aa")) == [
+        NOW - timedelta(hours=h) for h in (12, 6, 0)
+    ]
+    controller.shutdown()
+
+
+def test_existing_telemetry_moves_into_partitions(tmp_path):
+    unpartitioned = make_controller(tmp_path, partition=None)
+    populate(unpartitioned, ["aa"], 8)
+    unpartitioned.shutdown()
+
+    controller = make_controller(tmp_path)
+    assert controller.migrate_to_partitions(batch_size=3) == 8
+    assert controller.migrate_to_partitions() == 0
+    assert len(controller.get_telemetry()) == 8
+    assert len(controller.partitions) == 3
+    controller.shutdown()
+
+
+def test_dropped_partition_forgets_sync_cursors(tmp_path):
+    controller = make_controller(tmp_path)
+    populate(controller, ["aa"], 4, step=timedelta(hours=1))
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+
+    def deliver(messages):
+        for message in messages:
+            message.state = LXMF.LXMessage.DELIVERED
+            message._LXMessage__delivery_callback(message)
+
+    def sent(messages):
+        return sum(len(m.fields[LXMF.FIELD_TELEMETRY_STREAM]) for m in messages)
+
+    deliver(controller.handle_command(INCREMENTAL, requester, hub_dest))
+    assert sent(controller.handle_command(INCREMENTAL, requester, hub_dest)) == 0
+
+    (key,) = controller.partitions.keys()
+    controller.partitions.drop(key)
+    # Late telemetry recreates the partition with ids starting over
+    populate(controller, ["bb"], 2, step=timedelta(hours=1))
+    assert len(controller.get_telemetry()) == 2
+    pending = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    assert sent(pending) == 2
+
+    # A response still in flight when its partition is dropped moves no cursor
+    controller.partitions.drop(key)
+    populate(controller, ["cc"], 2, step=timedelta(hours=1))
+    deliver(pending)
+    assert sent(controller.handle_command(INCREMENTAL, requester, hub_dest)) == 2
+    controller.shutdown()
@@ -0,0 +1,109 @@
+import msgpack
+from sqlalchemy import select
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.peer import Peer
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig, TelemetryStorage
+from reticulum_telemetry_hub.reticulum_server.peer_directory import (
+    PeerDirectory,
+    decode_display_name,
+)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_storage(tmp_path) -> TelemetryStorage:
+    return TelemetryStorage(StorageConfig(db_path=str(tmp_path / "telemetry.db")))
+
+
+def peer_hash(i: int) -> bytes:
+    return i.to_bytes(16, "big")
+
+
+def test_decodes_legacy_and_msgpack_app_data():
+    assert decode_display_name(b"Alice") == "Alice"
+    assert decode_display_name(msgpack.packb([b"Bob", None])) == "Bob"
+    assert decode_display_name(msgpack.packb([None, 3])) is None
+    assert decode_display_name(None) is None
+    assert decode_display_name(b"") is None
+    assert decode_display_name(b"\xff\xfe") is None
+
+
+def test_hot_set_is_bounded(tmp_path):
+    peers = PeerDirectory(make_storage(tmp_path), max_peers=3)
+    for i in range(5):
+        peers.record_announce(peer_hash(i), f"peer {i}".encode())
+    assert len(peers) == 3
+    # Touching the oldest kept peer protects it from the next eviction
+    assert peers.display_name(peer_hash(2)) == "peer 2"
+    peers.record_announce(peer_hash(5), b"peer 5")
+    assert peer_hash(2) in peers._hot
+    assert peer_hash(3) not in peers._hot
+
+
+def test_peers_expire_after_ttl(tmp_path):
+    clock = FakeClock()
+    peers = PeerDirectory(make_storage(tmp_path), ttl=60, clock=clock)
+    peers.record_announce(peer_hash(1), b"old")
+    clock.now += 61
+    peers.record_announce(peer_hash(2), b"new")
+    assert len(peers) == 1
+    assert peers.display_name(peer_hash(1)) is None
+
+
+def test_expired_peers_are_evicted_after_lookups(tmp_path):
+    clock = FakeClock()
+    peers = PeerDirectory(make_storage(tmp_path), ttl=60, clock=clock, max_batch_age=0.01)
+    peers.start()
+    peers.record_announce(peer_hash(1), b"old")
+    clock.now += 30
+    peers.record_announce(peer_hash(2), b"newer")
+    # Looking the old peer up makes it the most recently used, not recently heard
+    assert peers.display_name(peer_hash(1)) == "old"
+    peers.flush()
+    clock.now += 31
+    peers.record_announce(peer_hash(3), b"newest")
+    assert set(peers._hot) == {peer_hash(2), peer_hash(3)}
+    # The persisted peer is just as expired
+    assert peers.get(peer_hash(1)) is None
+    assert len(peers) == 2
+    peers.stop()
+
+
+def test_announces_persist_and_warm_load(tmp_path):
+    storage = make_storage(tmp_path)
+    peers = PeerDirectory(storage, max_batch_age=0.01)
+    peers.start()
+    peers.record_announce(peer_hash(1), b"first name")
+    peers.record_announce(peer_hash(1), msgpack.packb([b"renamed", None]))
+    peers.record_announce(peer_hash(2), b"other")
+    peers.stop()
+
+    peers_table = Peer.__table__
+    with storage.engine.connect() as conn:
+        rows = conn.execute(
+            select(peers_table).order_by(peers_table.c.destination_hash)
+        ).all()
+    assert [row.display_name for row in rows] == ["renamed", "other"]
+    assert rows[0].destination_hash == peer_hash(1).hex()
+
+    restarted = PeerDirectory(storage, max_peers=1)
+    assert restarted.start() == 1
+    assert len(restarted) == 1
+    # Peers beyond the hot set are still found in the database
+    assert restarted.display_name(peer_hash(1)) == "renamed"
+    assert restarted.display_name(peer_hash(2)) == "other"
+    assert restarted.display_name(peer_hash(3)) is None
+    restarted.stop()
+
+
+def test_malformed_app_data_is_kept_without_a_name(tmp_path):
+    peers = PeerDirectory(make_storage(tmp_path))
+    record = peers.record_announce(peer_hash(1), b"\x92\xc1")
+    assert record.display_name is None
+    assert record.app_data == b"\x92\xc1"
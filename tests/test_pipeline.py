@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from reticulum_telemetry_hub.reticulum_server.__main__ import (
+    PIPELINE_QUEUE_SIZE,
+    ReticulumTelemetryHub,
+)
+from reticulum_telemetry_hub.reticulum_server.pipeline import (
+    PipelineStage,
+    StagedPipeline,
+)
+
+
+def test_items_with_the_same_key_keep_their_order():
+    results = []
+    lock = threading.Lock()
+
+    def jitter(item):
+        time.sleep(random.random() / 1000)
+        return item
+
+    def collect(item):
+        with lock:
+            results.append(item)
+
+    pipeline = StagedPipeline(
+        [
+            PipelineStage("classify", jitter, workers=3),
+            PipelineStage("decode", jitter, workers=4),
+            PipelineStage("persist", collect, workers=2),
+        ]
+    )
+    pipeline.start()
+    for i in range(50):
+        for key in (b"a", b"b", b"c", b"d"):
+            assert pipeline.submit((key, i), key)
+    pipeline.join()
+    pipeline.stop()
+
+    assert len(results) == 200
+    for key in (b"a", b"b", b"c", b"d"):
+        assert [i for k, i in results if k == key] == list(range(50))
+
+
+def test_none_ends_processing_and_errors_are_counted():
+    seen = []
+
+    def classify(item):
+        if item == "drop":
+            return None
+        if item == "fail":
+            raise ValueError("bad message")
+        return item
+
+    pipeline = StagedPipeline(
+        [PipelineStage("classify", classify), PipelineStage("fanout", seen.append)]
+    )
+    pipeline.start()
+    for item in ("keep", "drop", "fail", "also kept"):
+        pipeline.submit(item, b"peer")
+    pipeline.stop()
+
+    assert seen == ["keep", "also kept"]
+    stats = pipeline.stats()["stages"]
+    assert stats["classify"]["processed"] == 4
+    assert stats["classify"]["errors"] == 1
+    assert stats["fanout"]["processed"] == 2
+
+
+def test_submit_drops_when_the_first_stage_is_full():
+    release = threading.Event()
+    pipeline = StagedPipeline(
+        [PipelineStage("classify", lambda item: release.wait(), queue_size=1)],
+        submit_timeout=0.01,
+    )
+    pipeline.start()
+    accepted = [pipeline.submit(i, b"peer") for i in range(4)]
+    release.set()
+    pipeline.stop()
+
+    assert accepted.count(False) == pipeline.dropped
+    assert pipeline.dropped >= 2
+
+
+def test_drops_from_concurrent_submits_are_all_counted():
+    release = threading.Event()
+    pipeline = StagedPipeline(
+        [PipelineStage("classify", lambda item: release.wait(), queue_size=1)],
+        submit_timeout=0,
+    )
+    pipeline.start()
+    rejected = []
+
+    def submit_many():
+        rejected.append(sum(not pipeline.submit(i, b"peer") for i in range(500)))
+
+    threads = [threading.Thread(target=submit_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    pipeline.stop()
+
+    assert pipeline.dropped == sum(rejected)
+    assert pipeline.dropped >= 8 * 500 - 2
+
+
+def test_submit_is_rejected_once_stopped():
+    pipeline = StagedPipeline([PipelineStage("classify", lambda item: item)])
+    assert not pipeline.submit("early", b"peer")
+    pipeline.start()
+    pipeline.stop()
+    assert not pipeline.submit("late", b"peer")
+
+
+def test_hub_delivery_callback_does_not_block_on_a_full_pipeline():
+    release = threading.Event()
+    hub = ReticulumTelemetryHub.__new__(ReticulumTelemetryHub)
+    hub.classify_message = lambda message: release.wait()
+    hub.pipeline = hub.build_pipeline({"classify": 1})
+    hub.pipeline.start()
+    message = SimpleNamespace(source_hash=b"peer")
+    capacity = PIPELINE_QUEUE_SIZE + 1  # Queued plus the one being handled
+    try:
+        for _ in range(capacity):
+            hub.enqueue_delivery(message)
+        started = time.monotonic()
+        hub.enqueue_delivery(message)
+        assert time.monotonic() - started < 1
+        assert hub.pipeline.dropped == 1
+    finally:
+        release.set()
+        hub.pipeline.stop()
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Engine, event, inspect, text
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUTS,
+    StorageConfig,
+    TelemetryStorage,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+
+@pytest.fixture(params=LAYOUTS)
+def controller(request):
+    controller = TelemetryController(StorageConfig(db_path=":memory:", layout=request.param))
+    controller.save_telemetry({SID_TIME: 1724877911}, "aa")
+    controller.save_telemetry({SID_TIME: 1724877912}, "bb")
+    yield controller
+    controller.shutdown()
+
+
+def query_plans(controller, **filters) -> list[list[str]]:
+    """Run get_telemetry and EXPLAIN every statement it issued."""
+    engine = controller.storage.engine
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        controller.get_telemetry(**filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    with engine.connect() as conn:
+        return [
+            [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params)]
+            for sql, params in statements
+        ]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {"start_time": datetime(2024, 8, 1)},
+        {"start_time": datetime(2024, 8, 1), "end_time": datetime(2024, 9, 1)},
+        {"peer_dest": "aa"},
+        {"peer_dest": ["aa", "bb"], "start_time": datetime(2024, 8, 1)},
+        {"start_time": datetime(2024, 8, 1), "sids": [SID_LOCATION]},
+    ],
+)
+def test_filtered_queries_use_indexes(controller, filters):
+    plans = query_plans(controller, **filters)
+    assert plans
+    for plan in plans:
+        scans = [step for step in plan if step.startswith("SCAN")]
+        assert not scans, plan
+
+
+def test_filters_are_applied(controller):
+    assert [tel.peer_dest for tel in controller.get_telemetry(peer_dest="bb")] == ["bb"]
+    assert len(controller.get_telemetry(peer_dest=["aa", "bb"])) == 2
+    assert controller.get_telemetry(sids=[SID_LOCATION]) == []
+    assert len(controller.get_telemetry(sids=[SID_TIME])) == 2
+
+
+def open_storage(db_path) -> tuple[TelemetryStorage, list[str]]:
+    """Initialize a storage, returning it with the statements it ran."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        storage = TelemetryStorage(StorageConfig(db_path=db_path))
+        storage.engine
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    return storage, statements
+
+
+def test_missing_indexes_are_migrated(tmp_path):
+    db_path = tmp_path / "telemetry.db"
+    storage, statements = open_storage(db_path)
+    assert "ANALYZE" not in statements
+    with storage.engine.begin() as conn:
+        for name in ("ix_telemeter_time", "ix_telemeter_peer_time", "ix_sensor_telemeter_sid"):
+            conn.execute(text(f"DROP INDEX {name}"))
+    storage.dispose()
+
+    storage, statements = open_storage(db_path)
+    # Statistics are only gathered when indexes were added
+    assert "ANALYZE" in statements
+    inspector = inspect(storage.engine)
+    telemeter_indexes = {index["name"] for index in inspector.get_indexes("Telemeter")}
+    sensor_indexes = {index["name"] for index in inspector.get_indexes("Sensor")}
+    assert {"ix_telemeter_time", "ix_telemeter_peer_time"} <= telemeter_indexes
+    assert "ix_sensor_telemeter_sid" in sensor_indexes
+    storage.dispose()
+
+    storage, statements = open_storage(db_path)
+    assert "ANALYZE" not in statements
+    storage.dispose()
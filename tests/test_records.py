@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.records import TelemetryRecord
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_JOINED,
+    LAYOUTS,
+    PARTITION_DAY,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+NOW = datetime(2024, 9, 1, 12, 0, 0)
+
+
+def populate(controller, peers, count, step=timedelta(hours=6)):
+    with open("sample.bin", "rb") as f:
+        payload = f.read()
+    tel_data = unpackb(payload, strict_map_key=False)
+    controller.save_telemeters(
+        [
+            controller._deserialize_telemeter(tel_data, peer, payload, NOW - step * i)
+            for peer in peers
+            for i in range(count)
+        ]
+    )
+    return tel_data
+
+
+@pytest.mark.parametrize("partition", [None, PARTITION_DAY])
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_records_match_telemeters(tmp_path, layout, partition):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), layout=layout, partition=partition)
+    )
+    tel_data = populate(controller, ["aa", "bb"], 8)
+
+    records = list(controller.iter_records(batch_size=3))
+    tels = controller.get_telemetry()
+    assert all(isinstance(record, TelemetryRecord) for record in records)
+    assert [(r.peer_dest, r.time) for r in records] == [(t.peer_dest, t.time) for t in tels]
+    assert records[0].tel_data == tel_data
+
+    newest = list(
+        controller.iter_records(
+            start_time=NOW - timedelta(days=1), peer_dest="bb", newest_first=True
+        )
+    )
+    assert [record.time for record in newest] == [
+        NOW - timedelta(hours=h) for h in (0, 6, 12, 18, 24)
+    ]
+    controller.shutdown()
+
+
+def test_legacy_rows_get_payloads(tmp_path):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), layout=LAYOUT_JOINED)
+    )
+    populate(controller, ["aa"], 3)
+    # Rows stored before payloads were kept only have their sensors
+    with controller.storage.session() as ses:
+        ses.execute(Telemeter.__table__.update().values(packed=None))
+        ses.commit()
+
+    records = list(controller.iter_records())
+    assert len(records) == 3
+    assert all(record.packed is not None for record in records)
+    tel = controller.get_telemetry()[0]
+    assert records[0].packed == packb(controller._serialize_telemeter(tel))
+    controller.shutdown()
@@ -0,0 +1,165 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from msgpack import unpackb
+from sqlalchemy import func, select
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.location import Location
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter_sensor import (
+    TelemeterSensor,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.retention import (
+    DownsampleTier,
+    RetentionJob,
+    RetentionPolicy,
+    parse_duration,
+    parse_tiers,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_COMPACT,
+    LAYOUTS,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+NOW = datetime(2024, 9, 1, 12, 0, 0)
+
+
+def make_controller(tmp_path, layout: str = LAYOUTS[0]) -> TelemetryController:
+    return TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), layout=layout)
+    )
+
+
+def populate(controller, peers, count, step=timedelta(minutes=1), end=NOW):
+    with open("sample.bin", "rb") as f:
+        payload = f.read()
+    tel_data = unpackb(payload, strict_map_key=False)
+    tels = []
+    for peer in peers:
+        for i in range(count):
+            tel = controller._deserialize_telemeter(tel_data, peer, payload)
+            tel.time = end - step * i
+            tels.append(tel)
+    controller.save_telemeters(tels)
+
+
+def count(controller, entity) -> int:
+    with controller.storage.session() as ses:
+        return ses.scalar(select(func.count()).select_from(entity))
+
+
+def run(controller, **policy) -> RetentionJob:
+    job = RetentionJob(controller, RetentionPolicy(chunk_pause=0, chunk_size=50, **policy))
+    job.run_once(now=NOW)
+    return job
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_age_retention_deletes_telemeters_and_their_sensors(tmp_path, layout):
+    controller = make_controller(tmp_path, layout)
+    populate(controller, ["aa"], 120)
+    job = run(controller, max_age=timedelta(minutes=30))
+
+    assert count(controller, Telemeter) == 31
+    assert job.last_report.deleted["age"] == 89
+    if layout == LAYOUT_COMPACT:
+        assert count(controller, TelemeterSensor) == 31 * 5
+    else:
+        assert count(controller, Location) == 31
+        assert count(controller, Sensor) == 31 * 5
+    assert min(tel.time for tel in controller.get_telemetry()) >= NOW - timedelta(minutes=30)
+
+
+def test_stop_waits_for_a_running_job(tmp_path):
+    controller = make_controller(tmp_path)
+    populate(controller, ["aa"], 120)
+    job = RetentionJob(
+        controller, RetentionPolicy(max_age=timedelta(minutes=30), chunk_size=10, chunk_pause=0)
+    )
+    deleting, resume = threading.Event(), threading.Event()
+    delete_telemeters = controller.delete_telemeters
+
+    def slow_delete(ids):
+        deleting.set()
+        resume.wait(5)
+        return delete_telemeters(ids)
+
+    controller.delete_telemeters = slow_delete
+    running = threading.Thread(target=job.run_once, args=(NOW,))
+    running.start()
+    assert deleting.wait(5)
+    stopping = threading.Thread(target=job.stop)
+    stopping.start()
+    stopping.join(0.1)
+    # The database stays open until the chunk being deleted is committed
+    assert stopping.is_alive()
+    resume.set()
+    stopping.join(5)
+    running.join(5)
+    assert not stopping.is_alive() and not running.is_alive()
+    assert job.last_report.deleted["age"] == 10
+
+    # A stopped job no longer reopens the database
+    controller.shutdown()
+    assert job.run_once(NOW).total_deleted == 0
+    assert not controller.storage.initialized
+
+
+def test_per_peer_row_limit_keeps_the_newest(tmp_path):
+    controller = make_controller(tmp_path)
+    populate(controller, ["aa", "bb"], 100)
+    populate(controller, ["cc"], 10)
+    run(controller, max_rows_per_peer=40)
+
+    with controller.storage.session() as ses:
+        counts = dict(
+            ses.execute(
+                select(Telemeter.peer_dest, func.count()).group_by(Telemeter.peer_dest)
+            ).all()
+        )
+    assert counts == {"aa": 40, "bb": 40, "cc": 10}
+    newest = controller.get_telemetry(peer_dest="aa")
+    assert min(tel.time for tel in newest) == NOW - timedelta(minutes=39)
+
+
+def test_downsampling_keeps_one_point_per_peer_and_interval(tmp_path):
+    controller = make_controller(tmp_path, LAYOUT_COMPACT)
+    # Two days of one point per minute
+    populate(controller, ["aa", "bb"], 2 * 24 * 60)
+    run(controller, tiers=[DownsampleTier(timedelta(hours=24), timedelta(minutes=5))])
+
+    cutoff = NOW - timedelta(hours=24)
+    recent = controller.get_telemetry(start_time=cutoff, peer_dest="aa")
+    old = controller.get_telemetry(end_time=cutoff - timedelta(seconds=1), peer_dest="aa")
+    assert len(recent) == 24 * 60 + 1
+    assert len(old) == 24 * 60 // 5
+    buckets = {int((tel.time - datetime(1970, 1, 1)).total_seconds()) // 300 for tel in old}
+    assert len(buckets) == len(old)
+
+
+def test_size_limit_reports_reclaimed_space(tmp_path):
+    controller = make_controller(tmp_path, LAYOUT_COMPACT)
+    populate(controller, ["aa"], 3000)
+    job = run(controller, max_bytes=256 * 1024)
+    report = job.last_report
+
+    assert report.deleted["size"] > 0
+    assert report.used_bytes_after <= 256 * 1024
+    assert report.reclaimed_bytes > 0
+    assert count(controller, Telemeter) == 3000 - report.deleted["size"]
+
+
+def test_parsing():
+    assert parse_duration("5m") == timedelta(minutes=5)
+    assert parse_duration("1.5h") == timedelta(minutes=90)
+    tiers = parse_tiers("7d=1h,24h=5m")
+    assert [tier.interval for tier in RetentionPolicy(tiers=tiers).tiers] == [
+        timedelta(minutes=5),
+        timedelta(hours=1),
+    ]
+    with pytest.raises(ValueError):
+        parse_duration("soon")
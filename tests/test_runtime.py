@@ -0,0 +1,98 @@
+import asyncio
+import random
+import threading
+
+import pytest
+
+from reticulum_telemetry_hub.reticulum_server.runtime import (
+    AdminConsole,
+    HubRuntime,
+    PeriodicTask,
+)
+
+
+def test_jitter_stays_within_bounds():
+    task = PeriodicTask("tick", 10, lambda: None, jitter=0.2)
+    rng = random.Random(1)
+    delays = [task.next_delay(rng) for _ in range(1000)]
+    assert 8 <= min(delays) and max(delays) <= 12
+    assert len(set(delays)) > 1
+    with pytest.raises(ValueError):
+        PeriodicTask("tick", 0, lambda: None)
+
+
+def test_periodic_tasks_run_until_shutdown():
+    runtime = HubRuntime(seed=1)
+    blocking_threads = []
+    events = []
+    blocking = runtime.add_periodic(
+        "blocking", 0.01, lambda: blocking_threads.append(threading.current_thread()), run_now=True
+    )
+
+    async def on_loop():
+        events.append("async")
+
+    runtime.add_periodic("async", 0.01, on_loop)
+    failing = runtime.add_periodic("failing", 0.01, lambda: 1 / 0)
+    runtime.add_shutdown_hook(lambda: events.append("drained"))
+
+    async def stop_later():
+        await asyncio.sleep(0.2)
+        runtime.stop()
+
+    runtime.run(stop_later())
+
+    assert blocking.runs >= 3
+    assert threading.main_thread() not in blocking_threads
+    assert failing.failures >= 3 and failing.runs == 0
+    assert events.count("async") >= 3
+    # Hooks run once the periodic tasks stopped
+    assert events[-1] == "drained"
+    assert events.count("drained") == 1
+
+
+class FakeHub:
+    def __init__(self):
+        self.announced = 0
+
+    def announce_now(self):
+        self.announced += 1
+
+    def request_telemetry(self, connection_hash):
+        return connection_hash == "abcd"
+
+    def status(self):
+        return {"connections": 1}
+
+
+def test_admin_console_commands():
+    hub = FakeHub()
+    runtime = HubRuntime()
+    output = []
+
+    async def console():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"announce\ntelemetry abcd\ntelemetry ffff\nstatus\nbogus\nexit\n")
+        await AdminConsole(hub, runtime, reader=reader, write=output.append).run()
+
+    runtime.run(console())
+    text = "".join(output)
+    assert hub.announced == 1
+    assert "Telemetry requested" in text
+    assert "Connection not found" in text
+    assert "connections: 1" in text and "tasks: {}" in text
+    assert "Unknown command 'bogus'" in text
+
+
+def test_console_end_of_input_stops_the_runtime():
+    runtime = HubRuntime()
+    drained = []
+    runtime.add_shutdown_hook(lambda: drained.append(True))
+
+    async def console():
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+        await AdminConsole(FakeHub(), runtime, reader=reader, write=lambda text: None).run()
+
+    runtime.run(console())
+    assert drained == [True]
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import pytest
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import *
+from reticulum_telemetry_hub.lxmf_telemetry import sensor_codec
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import (
+    CODECS,
+    LOCATION_CODEC,
+    decode_stream,
+    decode_telemetry,
+    encode_telemetry,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+
+WIRE_VALUES = {
+    SID_TIME: 1724877911,
+    SID_LOCATION: [b"\x02\xa9i\xa3", b"\xfc5\x98\xfa", b"\x00\x00\x0f\x8b", b"\x00\x00\x00\x00",
+                   b"\x00\x00\x00\x00", b"\x08\xa6", 1724877903],
+    SID_PRESSURE: 1013.25,
+    SID_BATTERY: [87.5, True, 31.2],
+    SID_PHYSICAL_LINK: [-92, 7.25, 99.0],
+    SID_ACCELERATION: [-0.051446, 0.058026, 9.793225],
+    SID_TEMPERATURE: 21.5,
+    SID_HUMIDITY: 40.0,
+    SID_MAGNETIC_FIELD: [12.0, -3.5, 40.25],
+    SID_AMBIENT_LIGHT: 350.0,
+    SID_GRAVITY: [0.0, 0.0, 9.81],
+    SID_ANGULAR_VELOCITY: [0.0, 0.0, -0.000153],
+    SID_PROXIMITY: False,
+    SID_INFORMATION: "Hello",
+    SID_RECEIVED: [b"\x01" * 16, b"\x02" * 16, 1200.5, 1199.0],
+    SID_POWER_CONSUMPTION: [["Radio", 1.2, None], ["Lights", 6.0, "lightbulb"]],
+    SID_POWER_PRODUCTION: [["Solar", 20.0, None]],
+    SID_PROCESSOR: [[0.25, [0.1, 0.2, 0.3], 1800, "CPU"]],
+    SID_RAM: [[8192, 2048, "RAM"]],
+    SID_NVM: [[65536, 1024, "SD"]],
+    SID_TANK: [[100, 42, "L", "Water", None]],
+    SID_FUEL: [[60, 30, "L", "Diesel", None]],
+    SID_CUSTOM: [["Counter", 3, None]],
+}
+
+
+def test_every_sid_has_a_codec():
+    assert set(CODECS) == set(WIRE_VALUES)
+
+
+@pytest.mark.parametrize("sid", sorted(WIRE_VALUES))
+def test_round_trip(sid):
+    values = CODECS[sid].decode(WIRE_VALUES[sid])
+    assert values is not None
+    assert CODECS[sid].encode(values) == WIRE_VALUES[sid]
+
+
+def test_sample_payload():
+    tel_data = unpackb(SAMPLE.read_bytes(), strict_map_key=False)
+    decoded = decode_telemetry(tel_data)
+
+    assert decoded[SID_LOCATION]["latitude"] == 44.657059
+    assert decoded[SID_LOCATION]["longitude"] == -63.596294
+    assert decoded[SID_LOCATION]["altitude"] == 39.79
+    assert decoded[SID_ACCELERATION]["z"] == 9.793225
+    assert decoded[SID_PROXIMITY] == {"triggered": False}
+    assert encode_telemetry(decoded) == tel_data
+
+
+def test_malformed_location_is_rejected():
+    assert LOCATION_CODEC.decode([b"\x00", b"\x00"]) is None
+    assert LOCATION_CODEC.encode({"latitude": 1.0}) is None
+
+
+def test_decode_stream(monkeypatch):
+    payload = SAMPLE.read_bytes()
+    entries = [
+        [b"\xaa" * 16, 1724877911, payload, None],
+        [b"\xbb"],
+        [b"\xcc" * 16, 1, b"\xc1"],
+        ["dd" * 16, 1, payload],
+        [None, 1, payload],
+    ]
+    calls = []
+    monkeypatch.setattr(
+        sensor_codec, "decode_telemetry", lambda tel_data: calls.append(tel_data) or {}
+    )
+    decoded = decode_stream(entries)
+    # Sensors are only decoded when asked for, storing an entry does not need them
+    assert calls == []
+    monkeypatch.undo()
+
+    assert len(decoded) == 1
+    assert decoded[0].peer_dest == "aa" * 16
+    assert decoded[0].packed is payload
+    assert decoded[0].sensors[SID_LOCATION]["latitude"] == 44.657059
+
+
+def test_all_sensor_types_are_stored():
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    controller.save_telemetry(dict(WIRE_VALUES), "aa")
+
+    tel = controller.get_telemetry()[0]
+    assert {sensor.sid for sensor in tel.sensors} == set(WIRE_VALUES)
+    stored = controller._serialize_telemeter(tel)
+    assert unpackb(packb(stored), strict_map_key=False) == WIRE_VALUES
+    battery = next(sensor for sensor in tel.sensors if sensor.sid == SID_BATTERY)
+    assert battery.decode() == {"charge_percent": 87.5, "charging": True, "temperature": 31.2}
+    controller.shutdown()
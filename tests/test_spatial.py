@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import LXMF
+import pytest
+import RNS
+from msgpack import unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_LOCATION,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.sensor_codec import LOCATION_CODEC
+from reticulum_telemetry_hub.lxmf_telemetry.spatial import SPATIAL_TABLE, distance
+from reticulum_telemetry_hub.lxmf_telemetry.storage import LAYOUTS, PARTITION_DAY, StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+NOW = datetime(2024, 9, 1, 12, 0, 0)
+HALIFAX = (44.657059, -63.596294)
+
+
+def tel_data(latitude: float, longitude: float) -> dict:
+    with open("sample.bin", "rb") as f:
+        data = unpackb(f.read(), strict_map_key=False)
+    location = LOCATION_CODEC.decode(data[SID_LOCATION])
+    location.update(latitude=latitude, longitude=longitude)
+    data[SID_LOCATION] = LOCATION_CODEC.encode(location)
+    return data
+
+
+def save(controller, peer, latitude, longitude, minutes_ago=0):
+    tel = controller._deserialize_telemeter(tel_data(latitude, longitude), peer)
+    tel.time = NOW - timedelta(minutes=minutes_ago)
+    controller.save_telemeters([tel])
+
+
+@pytest.fixture(params=LAYOUTS)
+def controller(request):
+    controller = TelemetryController(
+        StorageConfig(db_path=":memory:", layout=request.param)
+    )
+    save(controller, "aa", *HALIFAX, minutes_ago=30)
+    save(controller, "aa", 44.66, -63.59, minutes_ago=5)
+    save(controller, "bb", 44.65, -63.60, minutes_ago=1)
+    save(controller, "cc", 45.5, -73.6)  # Montreal
+    controller.save_telemetry({SID_TIME: 1724877911}, "dd")  # no location
+    return controller
+
+
+def test_bounding_box(controller):
+    tels = controller.get_telemetry_in_area(44.6, -63.7, 44.7, -63.5)
+    assert [tel.peer_dest for tel in tels] == ["bb", "aa", "aa"]
+    assert tels[0].sensors
+
+    recent = controller.get_telemetry_in_area(
+        44.6, -63.7, 44.7, -63.5, start_time=NOW - timedelta(minutes=10)
+    )
+    assert [tel.peer_dest for tel in recent] == ["bb", "aa"]
+
+    latest = controller.get_telemetry_in_area(44.6, -63.7, 44.7, -63.5, latest_per_peer=True)
+    assert [(tel.peer_dest, tel.time) for tel in latest] == [
+        ("bb", NOW - timedelta(minutes=1)),
+        ("aa", NOW - timedelta(minutes=5)),
+    ]
+
+
+def test_radius(controller):
+    near = controller.get_telemetry_near(*HALIFAX, radius=1000)
+    assert {tel.peer_dest for tel in near} == {"aa", "bb"}
+    assert len(near) == 3
+    assert distance(*HALIFAX, 44.66, -63.59) < 1000
+
+    tight = controller.get_telemetry_near(*HALIFAX, radius=10)
+    assert len(tight) == 1
+    wide = controller.get_telemetry_near(*HALIFAX, radius=1_000_000)
+    assert {tel.peer_dest for tel in wide} == {"aa", "bb", "cc"}
+
+
+def test_antimeridian_box():
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    save(controller, "east", -17.0, 179.5)
+    save(controller, "west", -17.0, -179.5)
+    save(controller, "far", -17.0, 0.0)
+    tels = controller.get_telemetry_in_area(-18, 179, -16, -179)
+    assert {tel.peer_dest for tel in tels} == {"east", "west"}
+
+
+def test_deleted_telemeters_leave_the_index(controller):
+    ids = [tel.id for tel in controller.get_telemetry(peer_dest="aa")]
+    controller.delete_telemeters(ids)
+    assert {tel.peer_dest for tel in controller.get_telemetry_near(*HALIFAX, 1000)} == {"bb"}
+
+
+def test_backfill_indexes_existing_telemetry(controller):
+    with controller.storage.engine.begin() as conn:
+        conn.exec_driver_sql(f'DELETE FROM "{SPATIAL_TABLE}"')
+    assert controller.get_telemetry_near(*HALIFAX, 1000) == []
+    assert controller.backfill_spatial_index(batch_size=2) == 4
+    assert len(controller.get_telemetry_near(*HALIFAX, 1000)) == 3
+    assert controller.backfill_spatial_index() == 0
+
+
+def test_area_command(controller):
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    messages = controller.handle_command(
+        {
+            TelemetryController.TELEMETRY_AREA: {
+                "center": list(HALIFAX),
+                "radius": 1000,
+                "latest": True,
+            }
+        },
+        requester,
+        hub_dest,
+    )
+    entries = messages[0].fields[LXMF.FIELD_TELEMETRY_STREAM]
+    assert [entry[0].hex() for entry in entries] == ["bb", "aa"]
+
+    [error] = controller.handle_command(
+        {TelemetryController.TELEMETRY_AREA: {"radius": 1}}, requester, hub_dest
+    )
+    assert error.fields[LXMF.FIELD_RESULTS] == {
+        TelemetryController.TELEMETRY_ERROR: "expected a bbox, or a center and a radius"
+    }
+
+
+def area_pages(controller, area):
+    """Entries of every page of an area request, following continuation markers."""
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    area = dict(area, max_bytes=400)
+    pages = []
+    while True:
+        messages = controller.handle_command(
+            {TelemetryController.TELEMETRY_AREA: area}, requester, hub_dest
+        )
+        assert len(messages) <= controller.max_stream_messages
+        pages.append(
+            [entry for m in messages for entry in m.fields[LXMF.FIELD_TELEMETRY_STREAM]]
+        )
+        marker = messages[-1].fields.get(LXMF.FIELD_RESULTS)
+        if marker is None:
+            return pages
+        area[TelemetryController.TELEMETRY_BEFORE] = marker[TelemetryController.TELEMETRY_BEFORE]
+
+
+@pytest.mark.parametrize("partition", [None, PARTITION_DAY])
+def test_area_command_continues_past_the_message_limit(tmp_path, partition):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db"), partition=partition),
+        max_stream_messages=2,
+    )
+    for i in range(30):
+        save(controller, f"{i % 10:02x}", *HALIFAX, minutes_ago=i * 90)
+    save(controller, "ff", 45.5, -73.6)  # Montreal
+
+    pages = area_pages(controller, {"center": list(HALIFAX), "radius": 1000})
+    assert len(pages) > 1
+    times = [entry[1] for page in pages for entry in page]
+    expected = [round((NOW - timedelta(minutes=i * 90)).timestamp()) for i in range(30)]
+    assert times == expected
+
+    # Later pages do not repeat the peers of earlier ones
+    latest = area_pages(controller, {"bbox": [44.6, -63.7, 44.7, -63.5], "latest": True})
+    assert len(latest) > 1
+    assert [entry[0].hex() for page in latest for entry in page] == [
+        f"{i:02x}" for i in range(10)
+    ]
+    controller.shutdown()
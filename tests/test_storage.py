@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig, TelemetryStorage
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+
+def test_engine_is_created_lazily(tmp_path):
+    db_path = tmp_path / "nested" / "telemetry.db"
+    storage = TelemetryStorage(StorageConfig(db_path=db_path))
+    assert not storage.initialized
+    assert not db_path.exists()
+
+    with storage.session() as ses:
+        ses.execute(text("SELECT 1"))
+
+    assert storage.initialized
+    assert db_path.exists()
+    assert storage.startup_seconds is not None
+    storage.dispose()
+
+
+def test_pragmas_are_applied(tmp_path):
+    storage = TelemetryStorage(
+        StorageConfig(db_path=tmp_path / "telemetry.db", synchronous="NORMAL", cache_size=-2000)
+    )
+    with storage.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -2000
+    storage.dispose()
+
+
+def test_controller_round_trip_in_memory():
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    location = [
+        b"\x02\xa9i\xa3",
+        b"\xfc5\x98\xfa",
+        b"\x00\x00\x0f\x8b",
+        b"\x00\x00\x00\x00",
+        b"\x00\x00\x00\x00",
+        b"\x08\xa6",
+        1724877903,
+    ]
+    controller.save_telemetry({1: 1724877911, 2: location}, "abcd")
+
+    tels = controller.get_telemetry()
+    assert len(tels) == 1
+    assert tels[0].peer_dest == "abcd"
+    assert {sensor.sid for sensor in tels[0].sensors} == {1, 2}
+    assert tels[0].time == datetime.fromtimestamp(1724877911)
+    controller.shutdown()
+
+
+def test_missing_columns_are_migrated(tmp_path):
+    db_path = tmp_path / "telemetry.db"
+    storage = TelemetryStorage(StorageConfig(db_path=db_path))
+    with storage.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE "Telemeter" DROP COLUMN packed'))
+    storage.dispose()
+
+    storage = TelemetryStorage(StorageConfig(db_path=db_path))
+    with storage.engine.connect() as conn:
+        columns = [row[1] for row in conn.execute(text('PRAGMA table_info("Telemeter")'))]
+    assert "packed" in columns
+    storage.dispose()
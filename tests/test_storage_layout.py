@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+from msgpack import unpackb
+from sqlalchemy import func, select
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.location import Location
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor import Sensor
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import (
+    SID_ACCELERATION,
+    SID_ANGULAR_VELOCITY,
+    SID_LOCATION,
+    SID_PROXIMITY,
+    SID_MAGNETIC_FIELD,
+    SID_TIME,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter_sensor import (
+    TelemeterSensor,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.storage import (
+    LAYOUT_COMPACT,
+    LAYOUT_JOINED,
+    StorageConfig,
+)
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.bin"
+
+
+def count(controller: TelemetryController, column) -> int:
+    with controller.storage.session() as ses:
+        return ses.scalar(select(func.count(column)))
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        StorageConfig(layout="columnar")
+
+
+def test_compact_layout_round_trip():
+    payload = SAMPLE.read_bytes()
+    controller = TelemetryController(StorageConfig(db_path=":memory:", layout=LAYOUT_COMPACT))
+    controller.save_telemetry(unpackb(payload, strict_map_key=False), "aa", payload)
+
+    assert count(controller, Sensor.id) == 0
+    assert count(controller, TelemeterSensor.sid) == len(unpackb(payload, strict_map_key=False))
+
+    tels = controller.get_telemetry(sids=[SID_LOCATION])
+    assert len(tels) == 1
+    location = next(s for s in tels[0].sensors if isinstance(s, Location))
+    assert location.latitude == 44.657059
+    assert tels[0].packed == payload
+    assert controller.get_telemetry(sids=[SID_MAGNETIC_FIELD]) == []
+
+    streamed = list(controller.iter_telemetry())
+    assert {sensor.sid for sensor in streamed[0].sensors} == {
+        SID_TIME,
+        SID_LOCATION,
+        SID_ACCELERATION,
+        SID_ANGULAR_VELOCITY,
+        SID_PROXIMITY,
+    }
+    controller.shutdown()
+
+
+def test_migrate_joined_to_compact(tmp_path):
+    db_path = tmp_path / "telemetry.db"
+    payload = SAMPLE.read_bytes()
+    tel_data = unpackb(payload, strict_map_key=False)
+
+    joined = TelemetryController(StorageConfig(db_path=db_path, layout=LAYOUT_JOINED))
+    joined.save_telemetry(tel_data, "aa", payload)
+    legacy = joined._deserialize_telemeter(tel_data, "bb")
+    legacy.packed = None
+    joined.save_telemeters([legacy])
+    joined.shutdown()
+
+    compact = TelemetryController(StorageConfig(db_path=db_path, layout=LAYOUT_COMPACT))
+    assert compact.migrate_to_compact(batch_size=1) == 2
+    assert compact.migrate_to_compact() == 0
+    assert count(compact, Sensor.id) == 0
+
+    tels = compact.get_telemetry(sids=[SID_LOCATION])
+    assert sorted(tel.peer_dest for tel in tels) == ["aa", "bb"]
+    for tel in tels:
+        location = next(s for s in tel.sensors if isinstance(s, Location))
+        assert location.latitude == 44.657059
+    compact.shutdown()
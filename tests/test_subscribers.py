@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import RNS
+
+from reticulum_telemetry_hub.destinations import DestinationCache
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig, TelemetryStorage
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+from reticulum_telemetry_hub.reticulum_server.subscribers import SubscriberStore
+
+
+def make_storage(tmp_path) -> TelemetryStorage:
+    return TelemetryStorage(StorageConfig(db_path=str(tmp_path / "telemetry.db")))
+
+
+def test_destinations_are_reused_and_bounded():
+    cache = DestinationCache(max_size=2)
+    first, second, third = RNS.Identity(), RNS.Identity(), RNS.Identity()
+
+    dest = cache.get(first)
+    assert cache.get(first) is dest
+    assert dest.hash == RNS.Destination.hash(first, "lxmf", "delivery")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get(second)
+    cache.get(first)
+    cache.get(third)
+    assert len(cache) == 2
+    # The least recently used destination was evicted and is built again
+    assert cache.get(second) is not None
+    assert cache.misses == 4
+
+
+def test_controller_replies_through_the_cache():
+    cache = DestinationCache()
+    controller = TelemetryController(
+        StorageConfig(db_path=":memory:"), destinations=cache
+    )
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    command = {TelemetryController.TELEMETRY_REQUEST: 1000000000}
+    replies = [controller.handle_command(command, requester, hub_dest) for _ in range(3)]
+    assert replies[0][0].destination is replies[2][0].destination
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_subscribers_survive_a_restart(tmp_path):
+    storage = make_storage(tmp_path)
+    staying, leaving = RNS.Identity(), RNS.Identity()
+    subscribers = SubscriberStore(storage, DestinationCache())
+    joined = subscribers.join(staying)
+    subscribers.join(leaving)
+    subscribers.join(staying)
+    subscribers.leave(leaving)
+    assert len(subscribers) == 1
+
+    restarted = SubscriberStore(storage, DestinationCache())
+    assert restarted.load() == 1
+    [dest] = restarted.snapshot()
+    assert dest.hash == joined.hash
+    assert dest.identity.get_public_key() == staying.get_public_key()
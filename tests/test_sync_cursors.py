@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import LXMF
+import RNS
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import SID_TIME
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+BASE_TIME = datetime(2024, 8, 28, 12, 0, 0)
+INCREMENTAL = {
+    TelemetryController.TELEMETRY_REQUEST: 1000000000,
+    TelemetryController.TELEMETRY_INCREMENTAL: True,
+}
+
+
+def add_telemetry(controller: TelemetryController, start: int, count: int) -> None:
+    tels = []
+    for i in range(start, start + count):
+        time = BASE_TIME + timedelta(minutes=i)
+        tel = controller._deserialize_telemeter(
+            {SID_TIME: int(time.timestamp())}, f"{i:032x}", time=time
+        )
+        tels.append(tel)
+    controller.save_telemeters(tels)
+
+
+def deliver(message: LXMF.LXMessage) -> None:
+    message.state = LXMF.LXMessage.DELIVERED
+    message._LXMessage__delivery_callback(message)
+
+
+def sent_times(messages) -> list[int]:
+    return [
+        entry[1]
+        for message in messages
+        for entry in message.fields[LXMF.FIELD_TELEMETRY_STREAM]
+    ]
+
+
+def setup(tmp_path, **kwargs):
+    controller = TelemetryController(
+        StorageConfig(db_path=str(tmp_path / "telemetry.db")), **kwargs
+    )
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    return controller, requester, hub_dest
+
+
+def test_incremental_requests_only_send_new_telemetry(tmp_path):
+    controller, requester, hub_dest = setup(tmp_path)
+    add_telemetry(controller, 0, 5)
+
+    first = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    assert len(sent_times(first)) == 5
+    # Not acknowledged yet, so the same telemetry is offered again
+    assert len(sent_times(controller.handle_command(INCREMENTAL, requester, hub_dest))) == 5
+    for message in first:
+        deliver(message)
+
+    add_telemetry(controller, 5, 2)
+    second = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    assert sent_times(second) == [
+        int((BASE_TIME + timedelta(minutes=i)).timestamp()) for i in (5, 6)
+    ]
+    # Other requesters have their own cursor
+    other = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    assert len(sent_times(controller.handle_command(INCREMENTAL, other, hub_dest))) == 7
+
+
+def test_cursor_only_passes_delivered_prefix(tmp_path):
+    controller, requester, hub_dest = setup(
+        tmp_path, stream_chunk_bytes=200, max_stream_messages=100
+    )
+    add_telemetry(controller, 0, 20)
+    messages = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    assert len(messages) > 2
+    assert sent_times(messages) == sorted(sent_times(messages))
+
+    # A later message arriving first must not skip the lost one before it
+    deliver(messages[1])
+    assert len(sent_times(controller.handle_command(INCREMENTAL, requester, hub_dest))) == 20
+    deliver(messages[0])
+    remaining = controller.handle_command(INCREMENTAL, requester, hub_dest)
+    assert sent_times(remaining) == sent_times(messages[2:])
+
+
+def test_limited_responses_continue_where_they_stopped(tmp_path):
+    controller, requester, hub_dest = setup(
+        tmp_path, stream_chunk_bytes=200, max_stream_messages=2
+    )
+    add_telemetry(controller, 0, 20)
+    sent = []
+    while True:
+        messages = controller.handle_command(INCREMENTAL, requester, hub_dest)
+        if not sent_times(messages):
+            break
+        assert len(messages) <= 2
+        sent.extend(sent_times(messages))
+        for message in messages:
+            deliver(message)
+
+    assert sent == [int((BASE_TIME + timedelta(minutes=i)).timestamp()) for i in range(20)]
+
+
+def test_cursors_persist_and_can_be_reset(tmp_path):
+    controller, requester, hub_dest = setup(tmp_path)
+    add_telemetry(controller, 0, 3)
+    for message in controller.handle_command(INCREMENTAL, requester, hub_dest):
+        deliver(message)
+
+    restarted = TelemetryController(StorageConfig(db_path=str(tmp_path / "telemetry.db")))
+    assert sent_times(restarted.handle_command(INCREMENTAL, requester, hub_dest)) == []
+    reset = dict(INCREMENTAL, **{TelemetryController.TELEMETRY_RESET: True})
+    assert len(sent_times(restarted.handle_command(reset, requester, hub_dest))) == 3
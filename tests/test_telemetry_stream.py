@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import LXMF
+import pytest
+import RNS
+from msgpack import packb, unpackb
+
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import SID_TIME
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.telemeter import Telemeter
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+
+BASE_TIME = datetime(2024, 8, 28, 12, 0, 0)
+
+
+def make_controller(count: int, **kwargs) -> TelemetryController:
+    controller = TelemetryController(StorageConfig(db_path=":memory:"), **kwargs)
+    tels = []
+    for i in range(count):
+        tel = controller._deserialize_telemeter(
+            {SID_TIME: int((BASE_TIME + timedelta(minutes=i)).timestamp())}, f"{i:032x}"
+        )
+        tel.time = BASE_TIME + timedelta(minutes=i)
+        tels.append(tel)
+    controller.save_telemeters(tels)
+    return controller
+
+
+@pytest.fixture
+def destinations():
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    return requester, hub_dest
+
+
+def stream_times(message: LXMF.LXMessage) -> list[int]:
+    return [entry[1] for entry in message.fields[LXMF.FIELD_TELEMETRY_STREAM]]
+
+
+def test_single_message_without_chunking(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(5)
+    messages = controller.handle_command(
+        {TelemetryController.TELEMETRY_REQUEST: 1000000000}, requester, hub_dest
+    )
+    assert len(messages) == 1
+    assert len(messages[0].fields[LXMF.FIELD_TELEMETRY_STREAM]) == 5
+
+
+def test_chunks_respect_byte_budget_newest_first(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(20, stream_chunk_bytes=200, max_stream_messages=100)
+    messages = controller.handle_command(
+        {TelemetryController.TELEMETRY_REQUEST: 1000000000}, requester, hub_dest
+    )
+
+    assert len(messages) > 1
+    times = [t for message in messages for t in stream_times(message)]
+    assert len(times) == 20
+    assert times == sorted(times, reverse=True)
+    for message in messages:
+        entries = message.fields[LXMF.FIELD_TELEMETRY_STREAM]
+        assert sum(len(packb(entry)) for entry in entries) <= 200
+        assert LXMF.FIELD_RESULTS not in message.fields
+
+
+def test_continuation_marker_resumes_stream(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(20, stream_chunk_bytes=200, max_stream_messages=2)
+    command = {TelemetryController.TELEMETRY_REQUEST: 1000000000}
+
+    received = []
+    for _ in range(20):
+        messages = controller.handle_command(command, requester, hub_dest)
+        assert len(messages) <= 2
+        received.extend(t for message in messages for t in stream_times(message))
+        results = messages[-1].fields.get(LXMF.FIELD_RESULTS)
+        if results is None:
+            break
+        command = {
+            TelemetryController.TELEMETRY_REQUEST: 1000000000,
+            TelemetryController.TELEMETRY_BEFORE: results[TelemetryController.TELEMETRY_BEFORE],
+        }
+
+    assert received == sorted(received, reverse=True)
+    assert len(received) == 20
+    assert len(set(received)) == 20
+
+
+def test_client_byte_budget_is_clamped(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(20, max_stream_messages=100)
+    messages = controller.handle_command(
+        {
+            TelemetryController.TELEMETRY_REQUEST: 1000000000,
+            TelemetryController.TELEMETRY_MAX_BYTES: 1,
+        },
+        requester,
+        hub_dest,
+    )
+
+    assert 1 < len(messages) < 20
+    for message in messages:
+        entries = message.fields[LXMF.FIELD_TELEMETRY_STREAM]
+        assert sum(len(packb(entry)) for entry in entries) <= TelemetryController.MIN_CHUNK_BYTES
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {TelemetryController.TELEMETRY_REQUEST: "yesterday"},
+        {TelemetryController.TELEMETRY_REQUEST: 10**20},
+        {TelemetryController.TELEMETRY_MAX_BYTES: "1024"},
+        {TelemetryController.TELEMETRY_MAX_BYTES: 2.5},
+        {TelemetryController.TELEMETRY_BEFORE: 1724846400},
+        {TelemetryController.TELEMETRY_BEFORE: [1724846400]},
+        {TelemetryController.TELEMETRY_BEFORE: [1724846400, "7"]},
+        {TelemetryController.TELEMETRY_BEFORE: [None, 7]},
+    ],
+)
+def test_invalid_request_is_answered_with_an_error(destinations, params):
+    requester, hub_dest = destinations
+    controller = make_controller(3)
+    command = {TelemetryController.TELEMETRY_REQUEST: 1000000000, **params}
+
+    [message] = controller.handle_command(command, requester, hub_dest)
+
+    assert LXMF.FIELD_TELEMETRY_STREAM not in message.fields
+    assert TelemetryController.TELEMETRY_ERROR in message.fields[LXMF.FIELD_RESULTS]
+
+
+def test_stream_entries_can_be_ingested_again(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(3, stream_chunk_bytes=1024)
+    message = controller.handle_command(
+        {TelemetryController.TELEMETRY_REQUEST: 1000000000}, requester, hub_dest
+    )[0]
+
+    other = TelemetryController(StorageConfig(db_path=":memory:"))
+    assert other.handle_message(SimpleNamespace(fields=message.fields))
+    tels: list[Telemeter] = other.get_telemetry()
+    assert sorted(tel.peer_dest for tel in tels) == [f"{i:032x}" for i in range(3)]
+    assert all(
+        unpackb(entry[2], strict_map_key=False).keys() == {SID_TIME}
+        for entry in message.fields[LXMF.FIELD_TELEMETRY_STREAM]
+    )
+
+
+def test_received_payload_is_sent_unchanged(destinations):
+    requester, hub_dest = destinations
+    with open("sample.bin", "rb") as f:
+        payload = f.read()
+    controller = TelemetryController(StorageConfig(db_path=":memory:"))
+    controller.handle_message(
+        SimpleNamespace(fields={LXMF.FIELD_TELEMETRY: payload}, source_hash=b"\x01" * 16)
+    )
+
+    message = controller.handle_command(
+        {TelemetryController.TELEMETRY_REQUEST: 1000000000}, requester, hub_dest
+    )[0]
+    assert message.fields[LXMF.FIELD_TELEMETRY_STREAM][0][2] == payload
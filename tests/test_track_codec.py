@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import LXMF
+import pytest
+import RNS
+from msgpack import packb
+
+from benchmarks.generator import SidebandGenerator
+from reticulum_telemetry_hub.lxmf_telemetry.model.persistance.sensors.sensor_enum import SID_TIME
+from reticulum_telemetry_hub.lxmf_telemetry.storage import StorageConfig
+from reticulum_telemetry_hub.lxmf_telemetry.telemetry_controller import TelemetryController
+from reticulum_telemetry_hub.lxmf_telemetry.track_codec import (
+    TRACK_CUSTOM_TYPE,
+    TRACK_ENCODING,
+    decode_track,
+    encode_track,
+)
+
+
+@pytest.fixture
+def destinations():
+    requester = SimpleNamespace(source=SimpleNamespace(identity=RNS.Identity()))
+    hub_dest = RNS.Destination(
+        RNS.Identity(), RNS.Destination.OUT, RNS.Destination.SINGLE, "lxmf", "delivery"
+    )
+    return requester, hub_dest
+
+
+def make_controller(count: int, **kwargs) -> TelemetryController:
+    controller = TelemetryController(StorageConfig(db_path=":memory:"), **kwargs)
+    tels = []
+    for record in SidebandGenerator(peers=5).records(count):
+        tel = controller._deserialize_telemeter(record.tel_data, record.peer_dest, record.packed)
+        tel.time = record.time
+        tels.append(tel)
+    controller.save_telemeters(tels)
+    return controller
+
+
+def test_round_trip_is_lossless_and_smaller():
+    entries = SidebandGenerator().stream_entries(500)
+    # Payloads the codec cannot take apart are carried whole
+    entries.append([b"\x01" * 16, 1724877911, packb({SID_TIME: 1.5}), entries[0][3]])
+    entries.append([b"\x01" * 16, 1724877912, packb([1, 2]), entries[0][3]])
+    entries.append(
+        [b"\x01" * 16, 1724877913, packb({SID_TIME: 0.5}, use_single_float=True), entries[0][3]]
+    )
+
+    track = encode_track(entries)
+    assert decode_track(track) == entries
+    assert len(track) * 4 < len(packb(entries))
+
+
+@pytest.mark.parametrize("data", [b"", b"\x02", b"\x01\x05", b"\x01\x00\x10abc"])
+def test_malformed_tracks_raise(data):
+    with pytest.raises(ValueError):
+        decode_track(data)
+
+
+def test_track_responses_are_negotiated(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(40)
+    command = {TelemetryController.TELEMETRY_REQUEST: 1000000000}
+    (plain,) = controller.handle_command(command, requester, hub_dest)
+    assert LXMF.FIELD_CUSTOM_TYPE not in plain.fields
+
+    command[TelemetryController.TELEMETRY_ENCODING] = TRACK_ENCODING
+    (track,) = controller.handle_command(command, requester, hub_dest)
+    assert LXMF.FIELD_TELEMETRY_STREAM not in track.fields
+    assert track.fields[LXMF.FIELD_CUSTOM_TYPE] == TRACK_CUSTOM_TYPE
+    assert decode_track(track.fields[LXMF.FIELD_CUSTOM_DATA]) == (
+        plain.fields[LXMF.FIELD_TELEMETRY_STREAM]
+    )
+
+    # Another hub stores the track like a plain stream
+    receiver = TelemetryController(StorageConfig(db_path=":memory:"))
+    track.source_hash = bytes(16)
+    assert receiver.handle_message(track)
+    assert [(tel.peer_dest, tel.time, tel.packed) for tel in receiver.get_telemetry()] == [
+        (tel.peer_dest, tel.time, tel.packed) for tel in controller.get_telemetry()
+    ]
+
+
+def test_track_chunks_respect_byte_budget(destinations):
+    requester, hub_dest = destinations
+    controller = make_controller(200, max_stream_messages=100)
+    command = {
+        TelemetryController.TELEMETRY_REQUEST: 1000000000,
+        TelemetryController.TELEMETRY_MAX_BYTES: 1000,
+        TelemetryController.TELEMETRY_ENCODING: TRACK_ENCODING,
+    }
+    messages = controller.handle_command(command, requester, hub_dest)
+    plain = controller.handle_command(
+        {
+            TelemetryController.TELEMETRY_REQUEST: 1000000000,
+            TelemetryController.TELEMETRY_MAX_BYTES: 1000,
+        },
+        requester,
+        hub_dest,
+    )
+    assert 1 < len(messages) < len(plain)
+    times = []
+    for message in messages:
+        data = message.fields[LXMF.FIELD_CUSTOM_DATA]
+        assert len(data) <= 1000
+        times.extend(entry[1] for entry in decode_track(data))
+    assert len(times) == 200
+    assert times == sorted(times, reverse=True)